@@ -1,10 +1,13 @@
+import os
+import shutil
+import tempfile
+
 from aws_cdk import (
     Stack,
     Duration,
     RemovalPolicy,
     Fn,
     CfnOutput,
-    Size,
     aws_ec2 as ec2,
     aws_rds as rds,
     aws_ecs as ecs,
@@ -18,7 +21,8 @@ from aws_cdk import (
     aws_iam as iam,
     aws_dynamodb as dynamodb,
     aws_sqs as sqs,
-    aws_lambda_event_sources as lambda_events
+    aws_lambda_event_sources as lambda_events,
+    aws_cloudwatch as cloudwatch,
 )
 from constructs import Construct
 
@@ -108,6 +112,30 @@ class LandslideStack(Stack):
             backup_retention=Duration.days(7),
         )
 
+        # Optional read replica (`-c read_replica=true`): Martin tiles and
+        # count jobs read from it, exports / selection cache / details stay on
+        # the primary. Workers fall back to the primary when the replica lags
+        # more than replica_max_lag_seconds.
+        use_read_replica = str(self.node.try_get_context("read_replica") or "").lower() in ("1", "true", "yes")
+        replica_max_lag_seconds = int(self.node.try_get_context("replica_max_lag_seconds") or 30)
+        db_replica = None
+        if use_read_replica:
+            db_replica = rds.DatabaseInstanceReadReplica(
+                self, "PostgresReplica",
+                source_database_instance=db,
+                vpc=vpc,
+                vpc_subnets=ec2.SubnetSelection(
+                    subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
+                ),
+                instance_type=ec2.InstanceType.of(
+                    ec2.InstanceClass.BURSTABLE3,
+                    ec2.InstanceSize.SMALL
+                ),
+                security_groups=[db_sg],
+                removal_policy=RemovalPolicy.DESTROY,
+                deletion_protection=False,
+            )
+
         # ---------- ECS Cluster ----------
         cluster = ecs.Cluster(
             self, "EcsCluster",
@@ -125,21 +153,49 @@ class LandslideStack(Stack):
         )
 
         # Full DATABASE_URL with *placeholder* that CloudFormation resolves at runtime
+        # (tiles are read-only: the replica when there is one)
+        tiles_db_host = (db_replica or db).db_instance_endpoint_address
         database_url = (
             f"postgresql://postgres:{password_dynamic_ref}"
-            f"@{db.db_instance_endpoint_address}/gis?sslmode=require"
-        )
+            f"@{tiles_db_host}/gis?sslmode=require"
+        )
+
+        # Task size, Martin's worker / DB pool sizes and the autoscaling range
+        # are context values (`-c martin_max_tasks=8`). Every task holds up to
+        # martin_pool_size DB connections, so martin_max_tasks * pool size must
+        # stay well under the instance's max_connections (~200 on a t3.small)
+        # next to the Lambdas. martin-server/load/ measures tiles/s per task.
+        def _context_int(key: str, default: int) -> int:
+            value = self.node.try_get_context(key)
+            return int(value) if value is not None else default
+
+        martin_cpu = _context_int("martin_cpu", 512)
+        martin_memory_mib = _context_int("martin_memory_mib", 1024)
+        martin_workers = _context_int("martin_workers", max(1, martin_cpu // 256))
+        martin_pool_size = _context_int("martin_pool_size", 10)
+        martin_min_tasks = _context_int("martin_min_tasks", 1)
+        martin_max_tasks = _context_int("martin_max_tasks", 6)
+        martin_requests_per_task = _context_int("martin_requests_per_task", 3000)
 
         martin_service = ecs_patterns.ApplicationLoadBalancedFargateService(
             self, "MartinService",
             cluster=cluster,
-            cpu=256,
-            memory_limit_mib=512,
-            desired_count=1,
+            cpu=martin_cpu,
+            memory_limit_mib=martin_memory_mib,
+            desired_count=martin_min_tasks,
             public_load_balancer=True,
             task_image_options=ecs_patterns.ApplicationLoadBalancedTaskImageOptions(
                 image=ecs.ContainerImage.from_ecr_repository(martin_repo, "latest"),
                 container_port=3000,
+                # The command replaces the image's CMD, so it repeats its
+                # --config (martin-server/config.yaml, baked in at the same
+                # path as in docker-compose.yml); the sizing flags are the
+                # only source of worker / pool sizes, config.yaml has none
+                command=[
+                    "--config", "/config/config.yaml",
+                    "--workers", str(martin_workers),
+                    "--pool-size", str(martin_pool_size),
+                ],
                 environment={
                     "DATABASE_URL": database_url,
                     "RUST_LOG": "info",
@@ -148,6 +204,26 @@ class LandslideStack(Stack):
             health_check_grace_period=Duration.seconds(60),
         )
 
+        # Scale out on tile traffic (ALB requests per task per minute) or CPU,
+        # whichever asks for more tasks; scale in slowly after a spike
+        martin_scaling = martin_service.service.auto_scale_task_count(
+            min_capacity=martin_min_tasks,
+            max_capacity=martin_max_tasks,
+        )
+        martin_scaling.scale_on_request_count(
+            "MartinRequestScaling",
+            requests_per_target=martin_requests_per_task,
+            target_group=martin_service.target_group,
+            scale_out_cooldown=Duration.seconds(60),
+            scale_in_cooldown=Duration.minutes(5),
+        )
+        martin_scaling.scale_on_cpu_utilization(
+            "MartinCpuScaling",
+            target_utilization_percent=60,
+            scale_out_cooldown=Duration.seconds(60),
+            scale_in_cooldown=Duration.minutes(5),
+        )
+
         martin_service.target_group.configure_health_check(
             path="/health",
             interval=Duration.seconds(60),
@@ -191,32 +267,116 @@ class LandslideStack(Stack):
             time_to_live_attribute="ttl",  # optional but handy
         )
 
-        # ---------- Async job queue (SQS) ----------
+        # ---------- Async job queues (SQS), one per priority lane ----------
+        # interactive: count jobs, short and latency sensitive
+        # export:      filtered downloads (default queue)
+        # bulk:        unfiltered / oversized downloads
+        #
+        # Exports that time out are re-delivered and resume from their
+        # checkpoint; a message that keeps failing ends up in the DLQ.
+        jobs_dlq = sqs.Queue(
+            self, "JobsDeadLetterQueue",
+            retention_period=Duration.days(4),
+        )
+
+        # A count is retried once; a count that fails twice would only hold
+        # one of the lane's few workers again on every re-delivery
+        count_jobs_queue = sqs.Queue(
+            self, "CountJobsQueue",
+            visibility_timeout=Duration.minutes(2),
+            retention_period=Duration.hours(1),
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=2,
+                queue=jobs_dlq,
+            ),
+        )
+
         jobs_queue = sqs.Queue(
             self, "JobsQueue",
             visibility_timeout=Duration.minutes(15),
             retention_period=Duration.days(1),
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=3,
+                queue=jobs_dlq,
+            ),
+        )
+
+        bulk_jobs_queue = sqs.Queue(
+            self, "BulkJobsQueue",
+            visibility_timeout=Duration.minutes(15),
+            retention_period=Duration.days(1),
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=3,
+                queue=jobs_dlq,
+            ),
+        )
+
+        # ---------- Shared code layer ----------
+
+        # landslide_core (filters, SQL, DB access, tracing) is used by every
+        # Lambda. Layers are unpacked under /opt and /opt/python is on the
+        # runtime's sys.path, so the package is staged as python/landslide_core.
+        core_layer_root = tempfile.mkdtemp(prefix="landslide-core-layer-")
+        shutil.copytree(
+            "../landslide_core",
+            os.path.join(core_layer_root, "python", "landslide_core"),
+            ignore=shutil.ignore_patterns("__pycache__"),
+        )
+        core_layer = _lambda.LayerVersion(
+            self, "CoreLayer",
+            code=_lambda.Code.from_asset(core_layer_root),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_12],
+            description="landslide_core: filters, SQL statements, DB access, tracing",
         )
 
         # ---------- Lambda for /api/count and /api/download ----------
 
+        # download_api/ holds both handlers, the local FastAPI app (main.py) and,
+        # on deploy, the vendored worker dependencies; each Lambda only ships
+        # what it imports. The API needs no third-party packages (boto3 comes
+        # with the runtime), so its bundle is two modules plus the core layer.
+        api_code = _lambda.Code.from_asset(
+            "../download_api",
+            exclude=[
+                "*",
+                "!lambda_main.py",
+                "!export_formats.py",
+            ],
+        )
+        worker_code = _lambda.Code.from_asset(
+            "../download_api",
+            exclude=[
+                "lambda_main.py",
+                "main.py",
+                ".env*",
+                "requirements*.txt",
+                "**/__pycache__",
+                "*.dist-info",
+                "bin",
+            ],
+        )
+
         # ----------  (API layer only) ----------
         download_api_lambda = _lambda.Function(
             self, "DownloadApiLambdaV2",
             runtime=_lambda.Runtime.PYTHON_3_12,
             handler="lambda_main.lambda_handler",
-            code=_lambda.Code.from_asset("../download_api"),
+            code=api_code,
+            layers=[core_layer],
             timeout=Duration.seconds(10),
             memory_size=256,
             environment={
                 "JOBS_TABLE_NAME": jobs_table.table_name,
                 "JOBS_QUEUE_URL": jobs_queue.queue_url,
+                "COUNT_JOBS_QUEUE_URL": count_jobs_queue.queue_url,
+                "BULK_JOBS_QUEUE_URL": bulk_jobs_queue.queue_url,
                 "EXPORT_BUCKET": export_bucket.bucket_name,
             },
         )
 
         jobs_table.grant_read_write_data(download_api_lambda)
-        jobs_queue.grant_send_messages(download_api_lambda)
+        for queue in (count_jobs_queue, jobs_queue, bulk_jobs_queue):
+            queue.grant_send_messages(download_api_lambda)
 
         #------------- lambda worker
 
@@ -232,39 +392,172 @@ class LandslideStack(Stack):
             "Allow download Worker Lambda to access Postgres"
         )
 
-        download_worker_lambda = _lambda.Function(
-            self, "DownloadWorkerLambdaV2",
-            runtime=_lambda.Runtime.PYTHON_3_12,
-            handler="worker_main.lambda_handler",
-            code=_lambda.Code.from_asset("../download_api"),
-            vpc=vpc,
-            vpc_subnets=ec2.SubnetSelection(
-                subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
-            ),
-            security_groups=[download_lambda_sg],
-            timeout=Duration.minutes(15),   # long-running allowed
-            memory_size=1024,
-            ephemeral_storage_size=Size.gibibytes(2), # allowing to write "big" tmp files
-            environment={
-                "PGHOST": db.db_instance_endpoint_address,
-                "PGDATABASE": "gis",
-                "PGUSER": "postgres",
-                "DB_SECRET_ARN": db_secret.secret_arn,
-                "EXPORT_BUCKET": export_bucket.bucket_name,
-                "JOBS_TABLE_NAME": jobs_table.table_name,
-            },
-        )
-
-        db_secret.grant_read(download_worker_lambda)
-        export_bucket.grant_read_write(download_worker_lambda)
-        jobs_table.grant_read_write_data(download_worker_lambda)
-        jobs_queue.grant_consume_messages(download_worker_lambda)
+        # Exports over `-c export_bulk_features=...` [50000] are deferred to the
+        # bulk lane and fanned out there; the export lane writes smaller ones in
+        # one worker (see download_api/worker_main.py)
+        export_bulk_features = str(self.node.try_get_context("export_bulk_features") or 50000)
+
+        worker_environment = {
+            "PGHOST": db.db_instance_endpoint_address,
+            "PGDATABASE": "gis",
+            "PGUSER": "postgres",
+            "DB_SECRET_ARN": db_secret.secret_arn,
+            "EXPORT_BUCKET": export_bucket.bucket_name,
+            "JOBS_TABLE_NAME": jobs_table.table_name,
+            "BULK_JOBS_QUEUE_URL": bulk_jobs_queue.queue_url,
+            "EXPORT_MAX_FEATURES": "200000",
+            "EXPORT_BULK_FEATURES": export_bulk_features,
+            "EXPORT_PARALLEL_MIN_FEATURES": export_bulk_features,
+        }
+        if db_replica is not None:
+            worker_environment["PGHOST_REPLICA"] = db_replica.db_instance_endpoint_address
+            worker_environment["REPLICA_MAX_LAG_SECONDS"] = str(replica_max_lag_seconds)
+
+        # Plan choice of the prepared count / export / details statements
+        # (`-c db_plan_cache_mode=force_custom_plan`, see landslide_core/db.py);
+        # Postgres' default (auto) when unset
+        db_plan_cache_mode = self.node.try_get_context("db_plan_cache_mode")
+        if db_plan_cache_mode:
+            worker_environment["DB_PLAN_CACHE_MODE"] = db_plan_cache_mode
+
+        # Slow query plan capture (`-c query_profile_ms=2000`, see
+        # landslide_core/profile.py): plans go on the job items; off when unset
+        query_profile_ms = self.node.try_get_context("query_profile_ms")
+        if query_profile_ms:
+            worker_environment["QUERY_PROFILE_MS"] = str(query_profile_ms)
+
+        # GeoParquet exports need pyarrow, which is too large for the worker
+        # asset; pass a layer that provides it (e.g. the AWS SDK for pandas
+        # layer) with `-c pyarrow_layer_arn=arn:aws:lambda:...`.
+        pyarrow_layer_arn = self.node.try_get_context("pyarrow_layer_arn")
+        export_layers = (
+            [_lambda.LayerVersion.from_layer_version_arn(self, "PyarrowLayer", pyarrow_layer_arn)]
+            if pyarrow_layer_arn
+            else []
+        )
+
+        def _job_worker(construct_id, lane, queue, timeout, memory_size, max_concurrency):
+            """One worker Lambda per lane, with its own SQS concurrency cap."""
+            worker = _lambda.Function(
+                self, construct_id,
+                runtime=_lambda.Runtime.PYTHON_3_12,
+                handler="worker_main.lambda_handler",
+                code=worker_code,
+                vpc=vpc,
+                vpc_subnets=ec2.SubnetSelection(
+                    subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
+                ),
+                security_groups=[download_lambda_sg],
+                timeout=timeout,
+                memory_size=memory_size,
+                layers=[core_layer] + (export_layers if lane != "interactive" else []),
+                environment={
+                    **worker_environment,
+                    "JOB_LANE": lane,
+                    # checkpointed exports re-enqueue themselves on their own lane
+                    "JOB_QUEUE_URL": queue.queue_url,
+                },
+            )
 
-        download_worker_lambda.add_event_source(
-            lambda_events.SqsEventSource(
-                jobs_queue,
-                batch_size=1,
+            db_secret.grant_read(worker)
+            export_bucket.grant_read_write(worker)
+            jobs_table.grant_read_write_data(worker)
+            queue.grant_consume_messages(worker)
+            queue.grant_send_messages(worker)
+
+            worker.add_event_source(
+                lambda_events.SqsEventSource(
+                    queue,
+                    batch_size=1,
+                    max_concurrency=max_concurrency,
+                )
+            )
+            return worker
+
+        # Counts get the most concurrency; exports are capped so they cannot
+        # starve the single RDS instance of connections.
+        _job_worker(
+            "CountWorkerLambda", "interactive", count_jobs_queue,
+            timeout=Duration.minutes(1), memory_size=512, max_concurrency=10,
+        )
+        # Large exports fan out into partitions on their own lane, so the
+        # export wall-clock time scales down with these concurrency limits.
+        download_worker_lambda = _job_worker(
+            "DownloadWorkerLambdaV2", "export", jobs_queue,
+            timeout=Duration.minutes(15), memory_size=1024, max_concurrency=4,
+        )
+        _job_worker(
+            "BulkWorkerLambda", "bulk", bulk_jobs_queue,
+            timeout=Duration.minutes(15), memory_size=1024, max_concurrency=4,
+        )
+
+        # Oversized exports are moved from the export lane to the bulk lane
+        bulk_jobs_queue.grant_send_messages(download_worker_lambda)
+
+        # ---------- Queue-age metrics per lane ----------
+        lane_queues = {
+            "interactive": count_jobs_queue,
+            "export": jobs_queue,
+            "bulk": bulk_jobs_queue,
+        }
+
+        lanes_dashboard = cloudwatch.Dashboard(
+            self, "JobLanesDashboard",
+            widgets=[[
+                cloudwatch.GraphWidget(
+                    title="Oldest message age per lane (s)",
+                    left=[
+                        queue.metric_approximate_age_of_oldest_message(
+                            label=lane, period=Duration.minutes(1),
+                        )
+                        for lane, queue in lane_queues.items()
+                    ],
+                ),
+                cloudwatch.GraphWidget(
+                    title="Visible messages per lane",
+                    left=[
+                        queue.metric_approximate_number_of_messages_visible(
+                            label=lane, period=Duration.minutes(1),
+                        )
+                        for lane, queue in lane_queues.items()
+                    ],
+                ),
+            ]],
+        )
+
+        if db_replica is not None:
+            replica_lag = db_replica.metric(
+                "ReplicaLag", statistic="Maximum", period=Duration.minutes(1),
             )
+            lanes_dashboard.add_widgets(
+                cloudwatch.GraphWidget(
+                    title="Read replica lag (s)",
+                    left=[replica_lag],
+                    left_annotations=[
+                        cloudwatch.HorizontalAnnotation(
+                            value=replica_max_lag_seconds,
+                            label="worker fallback to primary",
+                        ),
+                    ],
+                ),
+            )
+            replica_lag.create_alarm(
+                self, "ReplicaLagAlarm",
+                threshold=replica_max_lag_seconds,
+                evaluation_periods=5,
+                alarm_description=(
+                    "Read replica lag above the worker bound: counts run on the "
+                    "primary, Martin tiles are served from stale data"
+                ),
+            )
+
+        count_jobs_queue.metric_approximate_age_of_oldest_message(
+            period=Duration.minutes(1),
+        ).create_alarm(
+            self, "CountLaneQueueAgeAlarm",
+            threshold=10,
+            evaluation_periods=3,
+            alarm_description="Count jobs waiting more than 10s in the interactive lane",
         )
 
         # --------- Lambda for full summary of landslide ----------
@@ -284,7 +577,11 @@ class LandslideStack(Stack):
             self, "LandslideDetailsLambda",
             runtime=_lambda.Runtime.PYTHON_3_12,
             handler="lambda_main.lambda_handler",
-            code=_lambda.Code.from_asset("../gf_details_api"),
+            code=_lambda.Code.from_asset(
+                "../gf_details_api",
+                exclude=["requirements*.txt", "**/__pycache__", "*.dist-info", "bin"],
+            ),
+            layers=[core_layer],
             vpc=vpc,
             vpc_subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS),
             security_groups=[details_lambda_sg],
@@ -295,6 +592,7 @@ class LandslideStack(Stack):
                 "PGDATABASE": "gis",
                 "PGUSER": "postgres",
                 "DB_SECRET_ARN": db_secret.secret_arn,
+                **({"DB_PLAN_CACHE_MODE": db_plan_cache_mode} if db_plan_cache_mode else {}),
             },
         )
         db_secret.grant_read(landslide_details_lambda)
@@ -346,6 +644,40 @@ class LandslideStack(Stack):
             ],
         )
 
+        # /api/stats (statistics jobs, interactive lane like counts)
+        stats_resource = api_root.add_resource("stats")
+        stats_resource.add_method(
+            "POST",
+            apigw.LambdaIntegration(download_api_lambda),
+            method_responses=[
+                apigw.MethodResponse(
+                    status_code="202",
+                    response_parameters={
+                        "method.response.header.Access-Control-Allow-Origin": True,
+                    },
+                )
+            ],
+        )
+        stats_resource.add_cors_preflight(
+            allow_origins=["*"],
+            allow_methods=["POST", "OPTIONS", "GET"],
+        )
+
+        # /api/stats/{jobId} for polling
+        stats_status_resource = stats_resource.add_resource("{jobId}")
+        stats_status_resource.add_method(
+            "GET",
+            apigw.LambdaIntegration(download_api_lambda),
+            method_responses=[
+                apigw.MethodResponse(
+                    status_code="200",
+                    response_parameters={
+                        "method.response.header.Access-Control-Allow-Origin": True,
+                    },
+                )
+            ],
+        )
+
         # /api/download
         download_resource = api_root.add_resource("download")
         download_resource.add_method(
@@ -399,6 +731,25 @@ class LandslideStack(Stack):
             allow_methods=["GET", "OPTIONS"],
         )
 
+        # /api/histograms: precomputed slider histograms (cached by CloudFront)
+        histograms_resource = api_root.add_resource("histograms")
+        histograms_resource.add_method(
+            "GET",
+            apigw.LambdaIntegration(landslide_details_lambda),
+            method_responses=[
+                apigw.MethodResponse(
+                    status_code="200",
+                    response_parameters={
+                        "method.response.header.Access-Control-Allow-Origin": True,
+                    },
+                )
+            ],
+        )
+        histograms_resource.add_cors_preflight(
+            allow_origins=["*"],
+            allow_methods=["GET", "OPTIONS"],
+        )
+
         # ---------- S3 bucket for Vite app ----------
 
         site_bucket = s3.Bucket.from_bucket_name(
@@ -416,13 +767,32 @@ class LandslideStack(Stack):
             origin_path="/landslide-viewer",
         )
 
+        # Filtered tiles are cached on their query string. The frontend (and
+        # landslide_core/filter_query.py) emit one canonical query per filter
+        # (sorted keys and lists, rounded numbers, defaults dropped), so the
+        # whole query string is the cache key - an explicit allow-list would
+        # exceed CloudFront's 10 query strings per cache policy. The `v`
+        # param (VITE_TILE_VERSION) moves clients to new keys after a reload.
+        tiles_cache_policy = cloudfront.CachePolicy(
+            self, "FilteredTilesCachePolicy",
+            comment="Martin tiles keyed on the canonical filter query",
+            default_ttl=Duration.hours(1),
+            max_ttl=Duration.days(1),
+            min_ttl=Duration.seconds(0),
+            query_string_behavior=cloudfront.CacheQueryStringBehavior.all(),
+            header_behavior=cloudfront.CacheHeaderBehavior.none(),
+            cookie_behavior=cloudfront.CacheCookieBehavior.none(),
+            enable_accept_encoding_gzip=True,
+            enable_accept_encoding_brotli=True,
+        )
+
         tiles_behavior = cloudfront.BehaviorOptions(
             origin=origins.HttpOrigin(
                 domain_name=martin_service.load_balancer.load_balancer_dns_name,
                 protocol_policy=cloudfront.OriginProtocolPolicy.HTTP_ONLY,
             ),
             viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
-            cache_policy=cloudfront.CachePolicy.CACHING_DISABLED,
+            cache_policy=tiles_cache_policy,
             origin_request_policy=cloudfront.OriginRequestPolicy.ALL_VIEWER,
             allowed_methods=cloudfront.AllowedMethods.ALLOW_GET_HEAD,
             compress=True,
@@ -441,6 +811,32 @@ class LandslideStack(Stack):
             compress=True,
         )
 
+        # Histograms only depend on the categorical filters (and the data
+        # version); the Lambda's Cache-Control sets the TTL
+        histograms_cache_policy = cloudfront.CachePolicy(
+            self, "HistogramsCachePolicy",
+            comment="Slider histograms keyed on the categorical filters",
+            default_ttl=Duration.hours(1),
+            max_ttl=Duration.days(1),
+            min_ttl=Duration.seconds(0),
+            query_string_behavior=cloudfront.CacheQueryStringBehavior.allow_list(
+                "materials", "movements", "confidences", "v",
+            ),
+            header_behavior=cloudfront.CacheHeaderBehavior.none(),
+            cookie_behavior=cloudfront.CacheCookieBehavior.none(),
+            enable_accept_encoding_gzip=True,
+            enable_accept_encoding_brotli=True,
+        )
+
+        histograms_behavior = cloudfront.BehaviorOptions(
+            origin=api_behavior.origin,
+            viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+            cache_policy=histograms_cache_policy,
+            origin_request_policy=cloudfront.OriginRequestPolicy.ALL_VIEWER_EXCEPT_HOST_HEADER,
+            allowed_methods=cloudfront.AllowedMethods.ALLOW_GET_HEAD,
+            compress=True,
+        )
+
         exports_behavior = cloudfront.BehaviorOptions(
             origin=export_origin,
             viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
@@ -459,6 +855,7 @@ class LandslideStack(Stack):
             ),
             additional_behaviors={
                 "/ls_*": tiles_behavior,
+                "/api/histograms": histograms_behavior,
                 "/api/*": api_behavior,
                 "/exports/*": exports_behavior,
             },
@@ -466,6 +863,55 @@ class LandslideStack(Stack):
             comment="Landslide Viewer - Research Project",
         )
 
+        # ---------- Tile cache hit ratio ----------
+        # CacheHitRate is one of CloudFront's additional metrics, billed per
+        # distribution per month: only with `-c cloudfront_additional_metrics=true`.
+        # CloudFront publishes its metrics in us-east-1 only.
+        additional_metrics = str(
+            self.node.try_get_context("cloudfront_additional_metrics") or ""
+        ).lower() in ("1", "true", "yes")
+        if additional_metrics:
+            cloudfront.CfnMonitoringSubscription(
+                self, "LandslideViewerDistMetrics",
+                distribution_id=distribution.distribution_id,
+                monitoring_subscription=cloudfront.CfnMonitoringSubscription.MonitoringSubscriptionProperty(
+                    realtime_metrics_subscription_config=cloudfront.CfnMonitoringSubscription.RealtimeMetricsSubscriptionConfigProperty(
+                        realtime_metrics_subscription_status="Enabled",
+                    ),
+                ),
+            )
+
+        def _distribution_metric(metric_name: str, statistic: str) -> cloudwatch.Metric:
+            return cloudwatch.Metric(
+                namespace="AWS/CloudFront",
+                metric_name=metric_name,
+                dimensions_map={
+                    "DistributionId": distribution.distribution_id,
+                    "Region": "Global",
+                },
+                region="us-east-1",
+                statistic=statistic,
+                period=Duration.minutes(5),
+            )
+
+        tile_cache_widgets = [
+            cloudwatch.GraphWidget(
+                title="CloudFront requests",
+                left=[_distribution_metric("Requests", "Sum")],
+            ),
+        ]
+        if additional_metrics:
+            tile_cache_widgets.insert(0, cloudwatch.GraphWidget(
+                title="CloudFront cache hit rate (%)",
+                left=[_distribution_metric("CacheHitRate", "Average")],
+                left_y_axis=cloudwatch.YAxisProps(min=0, max=100),
+            ))
+
+        cloudwatch.Dashboard(
+            self, "TileCacheDashboard",
+            widgets=[tile_cache_widgets],
+        )
+
 
         #######  Policy management  ##########
 
@@ -0,0 +1,155 @@
+"""
+Cold start benchmark of the Lambda handlers.
+
+Locally, imports each handler module in a fresh interpreter (what the Lambda
+init phase does) and prints the median import time. With --function, forces
+cold starts of deployed functions instead - each round changes an
+environment variable, which makes Lambda drop its warm containers - and
+prints the median "Init Duration" and "Duration" of the REPORT log lines.
+The environment variable is removed again at the end.
+
+Run it on two checkouts (or before and after a deploy) to compare.
+
+Usage:
+
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py --rounds 20
+    python benchmarks/cold_start.py --function LandslideStack-DownloadApiLambdaV2... --rounds 5
+"""
+
+import argparse
+import base64
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from uuid import uuid4
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# (label, asset directory, handler module)
+HANDLERS = [
+    ("api", "download_api", "lambda_main"),
+    ("worker", "download_api", "worker_main"),
+    ("details", "gf_details_api", "lambda_main"),
+]
+
+# Import-time settings of the handlers; nothing is called
+HANDLER_ENV = {
+    "JOBS_TABLE_NAME": "cold-start",
+    "JOBS_QUEUE_URL": "https://sqs.us-east-1.amazonaws.com/000000000000/cold-start",
+    "AWS_DEFAULT_REGION": "us-east-1",
+}
+
+IMPORT_SNIPPET = """
+import time
+started = time.perf_counter()
+import {module}
+print((time.perf_counter() - started) * 1000)
+"""
+
+# Harmless for every handler: an OPTIONS request for the API / details
+# Lambdas, an empty SQS batch for the worker
+PROBE_EVENT = {"httpMethod": "OPTIONS", "path": "/cold-start", "Records": []}
+
+NONCE_VAR = "COLD_START_NONCE"
+
+
+def _import_ms(directory, module):
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET.format(module=module)],
+        cwd=os.path.join(ROOT, directory),
+        # the repository root stands in for the landslide_core layer
+        env={**os.environ, **HANDLER_ENV, "PYTHONPATH": ROOT},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return float(result.stdout.strip())
+
+
+def local(rounds):
+    print(f"{'handler':<10} {'module':<28} {'import ms (median)':>19} {'min':>8}")
+    for label, directory, module in HANDLERS:
+        try:
+            times = [_import_ms(directory, module) for _ in range(rounds)]
+        except RuntimeError as e:
+            print(f"{label:<10} {directory + '/' + module:<28} failed: {e}")
+            continue
+        print(f"{label:<10} {directory + '/' + module:<28} "
+              f"{statistics.median(times):>19.1f} {min(times):>8.1f}")
+
+
+def _set_nonce(lam, function_name, nonce):
+    config = lam.get_function_configuration(FunctionName=function_name)
+    variables = dict((config.get("Environment") or {}).get("Variables") or {})
+    if nonce is None:
+        variables.pop(NONCE_VAR, None)
+    else:
+        variables[NONCE_VAR] = nonce
+    lam.update_function_configuration(
+        FunctionName=function_name,
+        Environment={"Variables": variables},
+    )
+    lam.get_waiter("function_updated").wait(FunctionName=function_name)
+
+
+def _report(log_tail):
+    text = base64.b64decode(log_tail).decode("utf-8", "replace")
+    init = re.search(r"Init Duration: ([\d.]+) ms", text)
+    duration = re.search(r"\tDuration: ([\d.]+) ms", text)
+    return (
+        float(init.group(1)) if init else None,
+        float(duration.group(1)) if duration else None,
+    )
+
+
+def deployed(function_name, rounds):
+    import boto3
+
+    lam = boto3.client("lambda")
+    inits, durations = [], []
+    try:
+        for i in range(rounds):
+            _set_nonce(lam, function_name, uuid4().hex)
+            resp = lam.invoke(
+                FunctionName=function_name,
+                Payload=json.dumps(PROBE_EVENT).encode(),
+                LogType="Tail",
+            )
+            init, duration = _report(resp["LogResult"])
+            print(f"round {i + 1}: init {init} ms, duration {duration} ms")
+            if init is not None:
+                inits.append(init)
+            if duration is not None:
+                durations.append(duration)
+            time.sleep(1)
+    finally:
+        _set_nonce(lam, function_name, None)
+
+    if not inits:
+        print("no cold starts observed")
+        return
+    print(f"{function_name}: init {statistics.median(inits):.1f} ms median "
+          f"(min {min(inits):.1f}), first invoke {statistics.median(durations):.1f} ms median")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--function", action="append", default=[],
+                        help="deployed function name or ARN (repeatable)")
+    args = parser.parse_args()
+
+    if not args.function:
+        local(args.rounds)
+    for function_name in args.function:
+        deployed(function_name, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
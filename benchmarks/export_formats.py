@@ -0,0 +1,135 @@
+"""
+Size / time benchmark of the export formats for one filter.
+
+Stages the filter once in landslide_v2.export_staging (like the worker),
+then writes GeoJSON, gzipped GeoJSON, GeoParquet and FlatGeobuf to a local
+directory with the same writers the worker uses, and prints a table. The
+attribute-only CSV export is staged separately (its own SQL function), so
+its row includes the staging time.
+
+Usage (PG* env vars as for the worker, e.g. from download_api/.env.local):
+
+    python benchmarks/export_formats.py --filters '{"materials": ["rock"]}'
+    python benchmarks/export_formats.py --filters-file filters.json --out /tmp/exports
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "download_api"))
+
+import worker_main  # noqa: E402
+from export_formats import (  # noqa: E402
+    ATTRIBUTE_COLUMNS,
+    CENTROID_COLUMNS,
+    CSVRows,
+    export_filename,
+    geoparquet_available,
+    write_flatgeobuf,
+    write_geojson,
+    write_geoparquet,
+    write_rows,
+)
+from landslide_core.db import get_db_conn  # noqa: E402
+from landslide_core.filters import Filters  # noqa: E402
+
+
+def _run(name, path, write):
+    started = time.perf_counter()
+    with open(path, "wb") as f:
+        write(f)
+    seconds = time.perf_counter() - started
+    return name, os.path.getsize(path), seconds
+
+
+def _write_gzipped_geojson(cur, job_id, staged, f):
+    with gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6) as gz:
+        write_geojson(cur, job_id, staged, gz)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filters", default="{}", help="filters JSON (same shape as the API)")
+    parser.add_argument("--filters-file", help="read the filters JSON from a file")
+    parser.add_argument("--max-features", type=int, default=200_000)
+    parser.add_argument("--out", default=None, help="output directory (default: temp dir)")
+    args = parser.parse_args()
+
+    if args.filters_file:
+        with open(args.filters_file, encoding="utf-8") as f:
+            filters = json.load(f)
+    else:
+        filters = json.loads(args.filters)
+    filters = Filters.from_dict(filters)
+    out_dir = args.out or tempfile.mkdtemp(prefix="ls-export-bench-")
+    os.makedirs(out_dir, exist_ok=True)
+
+    job_id = f"bench-{uuid4()}"
+    started = time.perf_counter()
+    staged = worker_main.stage_export(job_id, filters, max_features=args.max_features)
+    stage_seconds = time.perf_counter() - started
+
+    results = []
+    try:
+        with get_db_conn() as conn, conn.cursor() as cur:
+            results.append(_run(
+                "geojson", os.path.join(out_dir, export_filename("geojson")),
+                lambda f: write_geojson(cur, job_id, staged, f),
+            ))
+            results.append(_run(
+                "geojson.gz", os.path.join(out_dir, export_filename("geojson", compress=True)),
+                lambda f: _write_gzipped_geojson(cur, job_id, staged, f),
+            ))
+            if geoparquet_available():
+                results.append(_run(
+                    "geoparquet", os.path.join(out_dir, export_filename("geoparquet")),
+                    lambda f: write_geoparquet(cur, job_id, staged, f),
+                ))
+            else:
+                print("pyarrow not installed, skipping GeoParquet")
+            results.append(_run(
+                "flatgeobuf", os.path.join(out_dir, export_filename("flatgeobuf")),
+                lambda f: write_flatgeobuf(cur, job_id, f),
+            ))
+            conn.commit()
+    finally:
+        worker_main.drop_staged_export(job_id)
+
+    csv_job_id = f"bench-{uuid4()}"
+    started = time.perf_counter()
+    try:
+        csv_staged = worker_main.stage_export(
+            csv_job_id,
+            filters,
+            max_features=args.max_features,
+            attributes={"columns": list(ATTRIBUTE_COLUMNS), "centroid": True},
+        )
+        with get_db_conn() as conn, conn.cursor() as cur:
+            name, size, seconds = _run(
+                "csv", os.path.join(out_dir, export_filename("csv")),
+                lambda f: write_rows(
+                    cur, csv_job_id, csv_staged, f,
+                    CSVRows(ATTRIBUTE_COLUMNS + CENTROID_COLUMNS),
+                ),
+            )
+        results.append((name, size, time.perf_counter() - started))
+    finally:
+        worker_main.drop_staged_export(csv_job_id)
+
+    print()
+    print(f"features: {staged:,}   staging: {stage_seconds:.2f}s   files: {out_dir}")
+    print(f"{'format':<12} {'bytes':>14} {'vs geojson':>11} {'seconds':>9}")
+    baseline = results[0][1] or 1
+    for name, size, seconds in results:
+        print(f"{name:<12} {size:>14,} {size / baseline:>10.1%} {seconds:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
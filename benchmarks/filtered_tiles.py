@@ -0,0 +1,161 @@
+"""
+Filtered cluster tile benchmark: dictionary-coded tile_cells vs tile functions.
+
+Renders the 3 x 3 tiles around a point at z5-z8 for a few categorical
+filters, once through landslide_v2.ls_cluster_coded(...) (sql/tile_cells.sql)
+and once through ls_points_q + ls_polygons_q, and prints the median time per
+tile for each. --explain also prints the plan node and heap fetches of the
+tile_cells scan, which should be an Index Only Scan with ~0 heap fetches.
+
+Usage (PG* env vars as for the worker, e.g. from download_api/.env.local):
+
+    python benchmarks/filtered_tiles.py --refresh
+    python benchmarks/filtered_tiles.py --lon -122.7 --lat 45.5 --explain
+"""
+
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from landslide_core.db import get_db_conn  # noqa: E402
+from landslide_core.filter_query import canonical_filters  # noqa: E402
+
+FILTERS = [
+    {"materials": ["Rock"]},
+    {"movements": ["Flow", "Slide"]},
+    {"materials": ["Debris", "Earth"], "confidences": ["High"]},
+]
+
+CODED_SQL = """
+    SELECT length(landslide_v2.ls_cluster_coded(%s, %s, %s, %s, %s, %s))
+"""
+
+FUNCTIONS_SQL = """
+    SELECT length(
+        coalesce(landslide_v2.ls_points_q(%s, %s, %s, %s::json), ''::bytea)
+        || coalesce(landslide_v2.ls_polygons_q(%s, %s, %s, %s::json), ''::bytea)
+    )
+"""
+
+# The scan inside ls_cluster_coded(...) for one tile, for EXPLAIN
+SCAN_SQL = """
+    EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)
+    SELECT count(*)
+    FROM landslide_v2.tile_cells c
+    WHERE c.cx BETWEEN %s AND %s
+      AND c.cy BETWEEN %s AND %s
+      AND (%s::smallint[] IS NULL OR c.material_code   = ANY (%s::smallint[]))
+      AND (%s::smallint[] IS NULL OR c.movement_code   = ANY (%s::smallint[]))
+      AND (%s::smallint[] IS NULL OR c.confidence_code = ANY (%s::smallint[]))
+"""
+
+
+def _tiles_around(lon, lat, z):
+    n = 2 ** z
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return [
+        (z, tx, ty)
+        for tx in range(x - 1, x + 2)
+        for ty in range(y - 1, y + 2)
+        if 0 <= tx < n and 0 <= ty < n
+    ]
+
+
+def _time_tiles(cur, sql, tiles, args_for):
+    seconds = []
+    for tile in tiles:
+        started = time.perf_counter()
+        cur.execute(sql, args_for(tile))
+        cur.fetchone()
+        seconds.append(time.perf_counter() - started)
+    return statistics.median(seconds)
+
+
+def _plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def _explain_scan(cur, tile, filters):
+    z, x, y = tile
+    span = 11 - z
+    codes = []
+    for attribute, key in (("material", "materials"), ("movement", "movements"), ("confidence", "confidences")):
+        cur.execute(
+            "SELECT landslide_v2.category_codes_for(%s, %s)",
+            (attribute, filters.get(key)),
+        )
+        codes.append(cur.fetchone()[0])
+    cur.execute(SCAN_SQL, (
+        x << span, ((x + 1) << span) - 1,
+        y << span, ((y + 1) << span) - 1,
+        codes[0], codes[0], codes[1], codes[1], codes[2], codes[2],
+    ))
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    for node in _plan_nodes(plan[0]["Plan"]):
+        if "Relation Name" in node or "Index Name" in node:
+            return node["Node Type"], node.get("Heap Fetches")
+    return "?", None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lon", type=float, default=-123.0)
+    parser.add_argument("--lat", type=float, default=44.0)
+    parser.add_argument("--refresh", action="store_true",
+                        help="rebuild landslide_v2.tile_cells (and VACUUM it) first")
+    parser.add_argument("--explain", action="store_true",
+                        help="show the plan node / heap fetches of the tile_cells scan")
+    args = parser.parse_args()
+
+    with get_db_conn() as conn:
+        if args.refresh:
+            started = time.perf_counter()
+            cur = conn.cursor()
+            cur.execute("SELECT landslide_v2.refresh_tile_cells()")
+            rows = cur.fetchone()[0]
+            conn.commit()
+            conn.autocommit = True
+            cur.execute("VACUUM (ANALYZE) landslide_v2.tile_cells")
+            conn.autocommit = False
+            print(f"tile_cells: {rows:,} rows in {time.perf_counter() - started:.1f}s")
+
+        cur = conn.cursor()
+        print(f"{'filter':<48} {'z':>2} {'coded ms':>9} {'functions ms':>13} {'speed-up':>9}"
+              + (f"  {'scan':<18} {'heap':>5}" if args.explain else ""))
+        for filters in FILTERS:
+            canonical = canonical_filters(filters)
+            query_params = json.dumps({
+                "mode": "cluster",
+                **{k: ",".join(v) for k, v in canonical.items()},
+            })
+            for z in range(5, 9):
+                tiles = _tiles_around(args.lon, args.lat, z)
+                coded = _time_tiles(cur, CODED_SQL, tiles, lambda t: (
+                    *t, canonical.get("materials"), canonical.get("movements"),
+                    canonical.get("confidences"),
+                ))
+                functions = _time_tiles(cur, FUNCTIONS_SQL, tiles, lambda t: (
+                    *t, query_params, *t, query_params,
+                ))
+                line = (f"{json.dumps(canonical):<48} {z:>2} {coded * 1000:>9.1f}"
+                        f" {functions * 1000:>13.1f} {functions / max(coded, 1e-9):>8.1f}x")
+                if args.explain:
+                    node, heap = _explain_scan(cur, tiles[len(tiles) // 2], canonical)
+                    line += f"  {node:<18} {heap if heap is not None else '-':>5}"
+                print(line)
+        conn.rollback()
+
+
+if __name__ == "__main__":
+    main()
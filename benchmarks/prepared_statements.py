@@ -0,0 +1,135 @@
+"""
+Prepared statement benchmark of the count and landslide details queries.
+
+Per query: runs the registered "count" statement (a few filters) and
+"landslide_props" (a sample of landslides) on one connection, as plain
+parameterised SQL and as prepared statements under each plan_cache_mode,
+and prints the median / p95 time per execution. The first execution of a
+prepared statement (PREPARE + first plan) is reported separately.
+
+Per request: the whole /api/count and /api/landslide database path
+(get_db_conn + execute + fetch), connecting per request vs reusing the warm
+connection (DB_CONN_REUSE).
+
+Usage (PG* env vars as for the worker, e.g. from download_api/.env.local):
+
+    python benchmarks/prepared_statements.py
+    python benchmarks/prepared_statements.py --rounds 200 --samples 50
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from landslide_core import db, sql  # noqa: E402
+from landslide_core.db import count_matching_filters, get_db_conn  # noqa: E402
+from landslide_core.filters import Filters  # noqa: E402
+
+FILTERS = [
+    {},
+    {"materials": ["Rock"]},
+    {"materials": ["Debris", "Earth"], "pga_min": 0.2, "mmi_min": 6},
+]
+
+SAMPLE_SQL = f"""
+    SELECT f.source::text, f.viewer_id::text
+    FROM landslide_v2.lsviewer_filtered_ids({sql.FILTER_ARGS}
+    ) AS f
+    LIMIT %s;
+"""
+
+# (label, PREPARED_STATEMENTS, plan_cache_mode)
+MODES = [
+    ("plain", False, None),
+    ("prepared auto", True, "auto"),
+    ("prepared generic", True, "force_generic_plan"),
+    ("prepared custom", True, "force_custom_plan"),
+]
+
+
+def _p95(values):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * 0.95))]
+
+
+def _time(conn, name, args_list, rounds):
+    first = None
+    seconds = []
+    for i in range(rounds):
+        args = args_list[i % len(args_list)]
+        started = time.perf_counter()
+        sql.execute(conn, name, args)
+        elapsed = time.perf_counter() - started
+        if first is None:
+            first = elapsed
+        else:
+            seconds.append(elapsed)
+    return first, seconds
+
+
+def per_query(conn, statements, rounds):
+    print(f"{'statement':<18} {'mode':<18} {'first ms':>9} {'median ms':>10} {'p95 ms':>8}")
+    for name, args_list in statements:
+        for label, prepared, plan_cache_mode in MODES:
+            sql.PREPARED_STATEMENTS = prepared
+            sql.deallocate(conn)
+            if plan_cache_mode:
+                conn.run(f"SET plan_cache_mode = {plan_cache_mode}")
+            first, seconds = _time(conn, name, args_list, rounds)
+            conn.rollback()
+            print(f"{name:<18} {label:<18} {first * 1000:>9.2f} "
+                  f"{statistics.median(seconds) * 1000:>10.2f} {_p95(seconds) * 1000:>8.2f}")
+
+
+def _props(source, viewer_id):
+    with get_db_conn() as conn:
+        return sql.execute(conn, "landslide_props", (source, viewer_id, False))[0]
+
+
+def per_request(filters, ids, rounds):
+    print(f"\n{'request':<18} {'connection':<18} {'median ms':>10} {'p95 ms':>8}")
+    sql.PREPARED_STATEMENTS = True
+    requests = [
+        ("/api/count", lambda i: count_matching_filters(filters[i % len(filters)])),
+        ("/api/landslide", lambda i: _props(*ids[i % len(ids)])),
+    ]
+    for label, request in requests:
+        for reuse in (False, True):
+            db.DB_CONN_REUSE = reuse
+            request(0)  # warm-up (secret, first connection)
+            seconds = []
+            for i in range(rounds):
+                started = time.perf_counter()
+                request(i)
+                seconds.append(time.perf_counter() - started)
+            print(f"{label:<18} {'reused' if reuse else 'per request':<18} "
+                  f"{statistics.median(seconds) * 1000:>10.2f} {_p95(seconds) * 1000:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--samples", type=int, default=20,
+                        help="landslides to fetch details of")
+    args = parser.parse_args()
+
+    filters = [Filters.from_dict(f) for f in FILTERS]
+    with get_db_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(SAMPLE_SQL, (*Filters().sql_args(), args.samples))
+            ids = cur.fetchall()
+        conn.rollback()
+        per_query(conn, [
+            ("count", [f.sql_args() for f in filters]),
+            ("landslide_props", [(source, viewer_id, False) for source, viewer_id in ids]),
+        ], args.rounds)
+
+    per_request(filters, ids, args.rounds // 4 or 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,483 @@
+"""
+Export writers for staged download jobs.
+
+Every writer reads the rows of one job from landslide_v2.export_staging in
+ordered seq batches and writes a single file to a binary ``sink`` (anything
+with ``write(bytes)`` and ``tell()``), so the worker can stream to S3 and the benchmark
+script can write to a local file with the same code.
+
+Formats:
+  geojson    - FeatureCollection text
+  csv        - attribute table only (no geometry, optional centroid lon/lat)
+  geoparquet - GeoParquet 1.0, WKB geometry, one row group per batch
+               (needs pyarrow)
+  flatgeobuf - FlatGeobuf with packed Hilbert R-tree index, built inside
+               PostGIS with ST_AsFlatGeobuf (at most FLATGEOBUF_MAX_FEATURES)
+
+geojson and csv are line formats: they are written by a row encoder
+(GeoJSONRows / CSVRows) whose output can be cut at any row, which is what
+the worker's chunked, resumable and partitioned exports rely on.
+"""
+
+import csv
+import io
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from landslide_core.tracing import span
+
+
+EXPORT_FORMATS = {
+    # format: (file extension, content type)
+    "geojson": ("geojson", "application/geo+json"),
+    "geoparquet": ("parquet", "application/vnd.apache.parquet"),
+    "flatgeobuf": ("fgb", "application/flatgeobuf"),
+    "csv": ("csv", "text/csv"),
+}
+DEFAULT_EXPORT_FORMAT = "geojson"
+# Formats written row by row (gzip-able, resumable, partitionable)
+LINE_FORMATS = ("geojson", "csv")
+
+# A FlatGeobuf file is built as one bytea in the database backend, which
+# holds the whole file (and, while building, the index) in memory and can't
+# exceed 1 GB. At ~1.5 KB per feature, 100k features take ~150 MB of backend
+# memory per export; larger FlatGeobuf exports are refused.
+FLATGEOBUF_MAX_FEATURES = int(os.getenv("FLATGEOBUF_MAX_FEATURES", "100000"))
+# Per-format feature limits below the general export limit
+FORMAT_MAX_FEATURES = {"flatgeobuf": FLATGEOBUF_MAX_FEATURES}
+
+# Attribute-only (csv) exports: allowed columns, in output order
+ATTRIBUTE_COLUMNS = [
+    "source",
+    "viewer_id",
+    "material",
+    "movement",
+    "confidence",
+    "pga",
+    "pgv",
+    "psa03",
+    "mmi",
+    "rain",
+    "reference",
+]
+CENTROID_COLUMNS = ["lon", "lat"]
+
+# Feature projection (geometry formats): property allowlist size and the
+# coordinate precision range (decimal places) accepted from clients
+MAX_EXPORT_PROPERTIES = 100
+MAX_COORD_PRECISION = 15
+
+
+def normalize_export_format(value: Optional[str]) -> str:
+    fmt = (value or DEFAULT_EXPORT_FORMAT).strip().lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(
+            f"Unsupported export format {value!r}; "
+            f"expected one of {', '.join(EXPORT_FORMATS)}"
+        )
+    return fmt
+
+
+def normalize_attribute_columns(columns: Optional[List[str]]) -> List[str]:
+    """Requested csv columns in ATTRIBUTE_COLUMNS order; all of them when empty."""
+    if not columns:
+        return list(ATTRIBUTE_COLUMNS)
+    requested = {str(c).strip().lower() for c in columns}
+    unknown = requested - set(ATTRIBUTE_COLUMNS)
+    if unknown:
+        raise ValueError(
+            f"Unsupported export columns {sorted(unknown)}; "
+            f"expected any of {', '.join(ATTRIBUTE_COLUMNS)}"
+        )
+    return [c for c in ATTRIBUTE_COLUMNS if c in requested]
+
+
+def normalize_projection(
+    properties: Optional[List[str]] = None,
+    precision: Optional[Any] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Validate the property allowlist / coordinate precision of a download.
+
+    Returns {"properties": [lower-case names] | None, "precision": int | None},
+    or None when neither is set (export every property at full precision).
+    """
+    names = None
+    if properties:
+        if not isinstance(properties, list) or len(properties) > MAX_EXPORT_PROPERTIES:
+            raise ValueError(f"properties must be a list of at most {MAX_EXPORT_PROPERTIES} names")
+        names = sorted({str(p).strip().lower() for p in properties if str(p).strip()})
+
+    digits = None
+    if precision is not None and precision != "":
+        try:
+            digits = int(precision)
+        except (TypeError, ValueError):
+            raise ValueError("precision must be an integer number of decimal places")
+        if not 0 <= digits <= MAX_COORD_PRECISION:
+            raise ValueError(f"precision must be between 0 and {MAX_COORD_PRECISION}")
+
+    if names is None and digits is None:
+        return None
+    return {"properties": names, "precision": digits}
+
+
+def export_filename(fmt: str, compress: bool = False) -> str:
+    """Download filename; only line formats are gzipped (the others compress internally)."""
+    ext, _ = EXPORT_FORMATS[fmt]
+    if fmt in LINE_FORMATS and compress:
+        return f"landslides.{ext}.gz"
+    return f"landslides.{ext}"
+
+
+def export_content_type(fmt: str, compress: bool = False) -> str:
+    if fmt in LINE_FORMATS and compress:
+        return "application/gzip"
+    return EXPORT_FORMATS[fmt][1]
+
+
+# ---------- Row encoders (line formats) ----------
+
+class GeoJSONRows:
+    """FeatureCollection: staged features joined by commas."""
+
+    select = "feature::text"
+
+    def header(self) -> bytes:
+        return b'{"type":"FeatureCollection","features":['
+
+    def row(self, seq: int, value: str) -> bytes:
+        # Separator depends only on seq, so resumed parts / partitions join cleanly
+        return b"," + value.encode() if seq > 1 else value.encode()
+
+    def footer(self) -> bytes:
+        return b"]}"
+
+
+class CSVRows:
+    """CSV with a header line; staged rows are flat jsonb attribute objects."""
+
+    select = "feature"
+
+    def __init__(self, columns: List[str]):
+        self.columns = columns
+        self._buf = io.StringIO()
+        self._writer = csv.writer(self._buf, lineterminator="\n")
+
+    def _line(self, values: List[Any]) -> bytes:
+        self._buf.seek(0)
+        self._buf.truncate()
+        self._writer.writerow(values)
+        return self._buf.getvalue().encode()
+
+    def header(self) -> bytes:
+        return self._line(self.columns)
+
+    def row(self, seq: int, value: Any) -> bytes:
+        if isinstance(value, str):
+            value = json.loads(value)
+        # Source tables differ in key case (viewer_id / VIEWER_ID)
+        attrs = {k.lower(): v for k, v in (value or {}).items()}
+        values = []
+        for column in self.columns:
+            v = attrs.get(column)
+            if isinstance(v, (dict, list)):
+                v = json.dumps(v, separators=(",", ":"))
+            values.append("" if v is None else v)
+        return self._line(values)
+
+    def footer(self) -> bytes:
+        return b""
+
+
+def row_encoder(fmt: str, columns: Optional[List[str]] = None):
+    """Encoder for a line format; columns is the csv header (incl. centroid)."""
+    if fmt == "csv":
+        return CSVRows(columns or ATTRIBUTE_COLUMNS)
+    return GeoJSONRows()
+
+
+# ---------- Staged rows ----------
+
+def iter_staged_chunks(
+    cur,
+    job_id: str,
+    after_seq: int,
+    until_seq: int,
+    chunk_size: int,
+    columns: str = "feature::text",
+):
+    """
+    Yield the staged rows of a job with after_seq < seq <= until_seq, in
+    order, chunk_size at a time. Each row is (seq, <columns>...).
+
+    ``columns`` is trusted SQL over the staging row (``feature`` is jsonb).
+    """
+    sql = f"""
+        SELECT seq, {columns}
+        FROM landslide_v2.export_staging
+        WHERE job_id = %s AND seq > %s AND seq <= %s
+        ORDER BY seq
+        LIMIT %s;
+    """
+    while after_seq < until_seq:
+        with span("db.fetch"):
+            cur.execute(sql, (job_id, after_seq, until_seq, chunk_size))
+            rows = cur.fetchall()
+        if not rows:
+            return
+        yield rows
+        after_seq = rows[-1][0]
+
+
+def staged_property_schema(cur, job_id: str) -> List[Tuple[str, str]]:
+    """
+    Infer a flat column schema from the properties of a staged export.
+
+    Returns [(name, kind)] sorted by name, kind being "integer", "number",
+    "boolean" or "string". Keys with mixed or nested JSON types become
+    strings (nested values keep their JSON text).
+    """
+    cur.execute(
+        """
+        SELECT
+            p.key,
+            array_agg(DISTINCT jsonb_typeof(p.value))
+                FILTER (WHERE jsonb_typeof(p.value) <> 'null'),
+            bool_and(
+                jsonb_typeof(p.value) <> 'number'
+                OR (p.value::text::numeric %% 1) = 0
+            )
+        FROM landslide_v2.export_staging s,
+             jsonb_each(s.feature -> 'properties') AS p
+        WHERE s.job_id = %s
+        GROUP BY p.key
+        ORDER BY p.key;
+        """,
+        (job_id,),
+    )
+
+    schema = []
+    for key, json_types, integral in cur.fetchall():
+        json_types = set(json_types or [])
+        if json_types == {"number"}:
+            kind = "integer" if integral else "number"
+        elif json_types == {"boolean"}:
+            kind = "boolean"
+        else:
+            kind = "string"
+        schema.append((key, kind))
+    return schema
+
+
+def _coerce(value: Any, kind: str) -> Any:
+    if value is None:
+        return None
+    if kind == "integer":
+        return int(value)
+    if kind == "number":
+        return float(value)
+    if kind == "boolean":
+        return bool(value)
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, separators=(",", ":"))
+
+
+# ---------- Writers ----------
+
+def write_rows(
+    cur,
+    job_id: str,
+    staged: int,
+    sink,
+    encoder,
+    chunk_size: int = 5000,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> int:
+    """Whole line-format file in one pass. Returns the number of bytes written."""
+    written = 0
+
+    def out(data: bytes):
+        nonlocal written
+        sink.write(data)
+        written += len(data)
+
+    out(encoder.header())
+    for rows in iter_staged_chunks(cur, job_id, 0, staged, chunk_size, encoder.select):
+        for seq, value in rows:
+            out(encoder.row(seq, value))
+        if on_progress:
+            on_progress(rows[-1][0], written)
+    out(encoder.footer())
+    return written
+
+
+def write_geojson(
+    cur,
+    job_id: str,
+    staged: int,
+    sink,
+    chunk_size: int = 5000,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> int:
+    """Plain FeatureCollection. Returns the number of bytes written."""
+    return write_rows(cur, job_id, staged, sink, GeoJSONRows(), chunk_size, on_progress)
+
+
+def _pyarrow():
+    """
+    (pyarrow, pyarrow.parquet), or (None, None) without pyarrow. Imported on
+    first use: pyarrow takes hundreds of ms to import and only GeoParquet
+    exports need it, so it stays out of every other cold start.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:  # GeoParquet exports are disabled without pyarrow
+        return None, None
+    return pa, pq
+
+
+def geoparquet_available() -> bool:
+    return _pyarrow()[0] is not None
+
+
+def write_geoparquet(
+    cur,
+    job_id: str,
+    staged: int,
+    sink,
+    chunk_size: int = 5000,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> int:
+    """
+    GeoParquet 1.0 with a WKB "geometry" column and one column per property.
+
+    Each staged batch becomes one row group, so memory stays bounded by the
+    batch size and the file is written to ``sink`` as it grows. Returns the
+    number of features written.
+    """
+    pa, pq = _pyarrow()
+    if pa is None:
+        raise RuntimeError("GeoParquet exports need pyarrow installed in the worker.")
+
+    props = staged_property_schema(cur, job_id)
+    arrow_types = {
+        "integer": pa.int64(),
+        "number": pa.float64(),
+        "boolean": pa.bool_(),
+        "string": pa.string(),
+    }
+
+    cur.execute(
+        """
+        SELECT array_agg(DISTINCT ST_GeometryType(ST_GeomFromGeoJSON(feature ->> 'geometry')))
+        FROM landslide_v2.export_staging
+        WHERE job_id = %s AND feature -> 'geometry' <> 'null'::jsonb;
+        """,
+        (job_id,),
+    )
+    # ST_GeometryType gives "ST_Point", "ST_MultiPolygon", ...
+    geometry_types = sorted(t[3:] for t in (cur.fetchone()[0] or []))
+
+    geo_metadata = {
+        "version": "1.0.0",
+        "primary_column": "geometry",
+        "columns": {
+            # No "crs" key: GeoJSON coordinates are OGC:CRS84 (lon/lat)
+            "geometry": {"encoding": "WKB", "geometry_types": geometry_types},
+        },
+    }
+    schema = pa.schema(
+        [pa.field(name, arrow_types[kind]) for name, kind in props]
+        + [pa.field("geometry", pa.binary())],
+        metadata={"geo": json.dumps(geo_metadata)},
+    )
+
+    columns = (
+        "ST_AsBinary(ST_GeomFromGeoJSON(feature ->> 'geometry')), "
+        "feature -> 'properties'"
+    )
+
+    features = 0
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for rows in iter_staged_chunks(cur, job_id, 0, staged, chunk_size, columns):
+            data: Dict[str, list] = {name: [] for name, _ in props}
+            data["geometry"] = []
+            for _, wkb, properties in rows:
+                if isinstance(properties, str):
+                    properties = json.loads(properties)
+                properties = properties or {}
+                for name, kind in props:
+                    data[name].append(_coerce(properties.get(name), kind))
+                data["geometry"].append(bytes(wkb) if wkb is not None else None)
+
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            features = rows[-1][0]
+            if on_progress:
+                on_progress(features, sink.tell())
+    finally:
+        writer.close()
+
+    return features
+
+
+def write_flatgeobuf(
+    cur,
+    job_id: str,
+    sink,
+    read_bytes: int = 8 * 1024 * 1024,
+) -> int:
+    """
+    FlatGeobuf with a spatial index, built by PostGIS from the staged rows.
+
+    The index needs every feature before the first one can be written, so
+    the file is assembled inside Postgres (ST_AsFlatGeobuf) into a temp
+    table and streamed out in read_bytes slices; callers keep the staged
+    rows under FLATGEOBUF_MAX_FEATURES. Returns the file size.
+    """
+    props = staged_property_schema(cur, job_id)
+    pg_types = {
+        "integer": "bigint",
+        "number": "double precision",
+        "boolean": "boolean",
+        "string": "text",
+    }
+
+    select_list = ["ST_GeomFromGeoJSON(feature ->> 'geometry') AS geom"]
+    args: List[Any] = []
+    for name, kind in props:
+        ident = '"' + name.replace('"', '""') + '"'
+        select_list.append(f"(feature -> 'properties' ->> %s)::{pg_types[kind]} AS {ident}")
+        args.append(name)
+    args.append(job_id)
+
+    cur.execute("DROP TABLE IF EXISTS pg_temp.export_fgb;")
+    cur.execute(
+        f"""
+        CREATE TEMP TABLE export_fgb AS
+        SELECT ST_AsFlatGeobuf(q, true, 'geom') AS fgb
+        FROM (
+            SELECT {", ".join(select_list)}
+            FROM landslide_v2.export_staging
+            WHERE job_id = %s
+            ORDER BY seq
+        ) AS q;
+        """,
+        tuple(args),
+    )
+    cur.execute("SELECT coalesce(octet_length(fgb), 0) FROM export_fgb;")
+    size = int(cur.fetchone()[0])
+
+    for offset in range(0, size, read_bytes):
+        cur.execute(
+            "SELECT substring(fgb FROM %s FOR %s) FROM export_fgb;",
+            (offset + 1, read_bytes),
+        )
+        sink.write(bytes(cur.fetchone()[0]))
+
+    cur.execute("DROP TABLE export_fgb;")
+    return size
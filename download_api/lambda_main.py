@@ -2,11 +2,20 @@ import os
 import json
 import time
 from uuid import uuid4
+from functools import lru_cache
 from typing import Any, Dict, Optional
 
-import boto3
 from decimal import Decimal
 
+from export_formats import (
+    normalize_attribute_columns,
+    normalize_export_format,
+    normalize_projection,
+)
+from landslide_core.filter_query import canonical_filter_query, canonical_filters
+from landslide_core.filters import job_item_filters
+from landslide_core.tracing import annotate, log, span, trace
+
 
 # ---------- Globals ----------
 
@@ -17,9 +26,6 @@ ALLOWED_CORS_ORIGINS = {
     # "https://d29ujemz317kys.cloudfront.net",
 }
 
-dynamodb = boto3.resource("dynamodb")
-sqs = boto3.client("sqs")
-
 JOBS_TABLE_NAME = os.getenv("JOBS_TABLE_NAME")
 JOBS_QUEUE_URL = os.getenv("JOBS_QUEUE_URL")
 
@@ -28,7 +34,45 @@ if not JOBS_TABLE_NAME:
 if not JOBS_QUEUE_URL:
     raise RuntimeError("JOBS_QUEUE_URL env var is required for API Lambda")
 
-jobs_table = dynamodb.Table(JOBS_TABLE_NAME)
+# Priority lanes: one SQS queue (and one worker pool) per lane, so a burst of
+# big exports never sits in front of the interactive counts.
+# Lanes without a dedicated queue fall back to the default JOBS_QUEUE_URL.
+JOB_LANE_QUEUES = {
+    "interactive": os.getenv("COUNT_JOBS_QUEUE_URL") or JOBS_QUEUE_URL,
+    "export": JOBS_QUEUE_URL,
+    "bulk": os.getenv("BULK_JOBS_QUEUE_URL") or JOBS_QUEUE_URL,
+}
+
+# Filter keys that narrow the result set; a download with none of them set
+# exports the whole inventory and goes to the bulk lane.
+NARROWING_FILTER_KEYS = (
+    "materials", "movements", "confidences",
+    "pga_min", "pga_max", "pgv_min", "pgv_max",
+    "psa03_min", "psa03_max", "mmi_min", "mmi_max",
+    "rain_min", "rain_max",
+    "selection_geojson",
+)
+
+# What a status poll (GET .../{jobId}) reads of the job item. The filters,
+# checkpoint and partition plan are only for the worker; polls every few
+# seconds don't need to transfer and decode them each time.
+JOB_STATUS_ATTRIBUTES = ("jobId", "jobType", "status", "format", "result", "progress", "error")
+
+
+# boto3 is imported, and its clients created, by the first request that needs
+# them and then reused by the container; init only loads this module and the
+# small helpers above (see benchmarks/cold_start.py).
+
+@lru_cache(maxsize=None)
+def _sqs():
+    import boto3
+    return boto3.client("sqs")
+
+
+@lru_cache(maxsize=None)
+def _jobs_table():
+    import boto3
+    return boto3.resource("dynamodb").Table(JOBS_TABLE_NAME)
 
 
 # ---------- Helpers ----------
@@ -62,41 +106,83 @@ def _json_default(obj):
     return str(obj)
 
 
-def _create_job(job_type: str, filters: Dict[str, Any], compress: bool) -> str:
+def _route_job(job_type: str, filters: Dict[str, Any]) -> str:
+    """
+    Pick the priority lane for a job from its type and a cheap cost estimate.
+
+      count, stats                -> "interactive"
+      download with any filter    -> "export"
+      download of everything      -> "bulk"
+    """
+    if job_type in ("count", "stats"):
+        return "interactive"
+
+    is_unbounded = not any(
+        filters.get(key) not in (None, [], "") for key in NARROWING_FILTER_KEYS
+    )
+    return "bulk" if is_unbounded else "export"
+
+
+def _create_job(
+    job_type: str,
+    filters: Dict[str, Any],
+    compress: bool,
+    export_format: Optional[str] = None,
+    export_options: Optional[Dict[str, Any]] = None,
+) -> str:
     job_id = str(uuid4())
     now = int(time.time())
-
-    # Store filters as JSON string to avoid Dynamo float issues
-    filters_json = json.dumps(filters)
+    # Same encoding as the tile URLs: equivalent filters store identically
+    filters = canonical_filters(filters)
+    lane = _route_job(job_type, filters)
 
     item = {
         "jobId": job_id,
         "jobType": job_type,
         "status": "QUEUED",
-        "filters": filters_json,        # <-- JSON string, safe for Dynamo
+        # JSON string (no Dynamo float issues), compressed when large
+        **job_item_filters(filters),
+        "filtersKey": canonical_filter_query(filters),
         "compress": bool(compress),
+        "lane": lane,
         "createdAt": now,
         "ttl": now + 6 * 3600,
     }
+    if export_format:
+        item["format"] = export_format
+    if export_options:
+        item.update(export_options)
 
-    print("Creating job:", json.dumps(item, default=str))
-    jobs_table.put_item(Item=item)
+    log("Creating job", job_id=job_id, job_type=job_type, lane=lane)
+    with span("dynamo.put"):
+        _jobs_table().put_item(Item=item)
 
     msg = {
             "jobId": job_id,
             "jobType": job_type,
+            "lane": lane,
         }
-    print(f"Sending job to SQS: {msg}")
-    sqs.send_message(
-        QueueUrl=JOBS_QUEUE_URL,
-        MessageBody=json.dumps(msg),
-    )
+    with span("sqs.send"):
+        _sqs().send_message(
+            QueueUrl=JOB_LANE_QUEUES[lane],
+            MessageBody=json.dumps(msg),
+        )
+    annotate(job_id=job_id, lane=lane)
 
     return job_id
 
 
 def _get_job(job_id: str) -> Optional[Dict[str, Any]]:
-    resp = jobs_table.get_item(Key={"jobId": job_id})
+    """The JOB_STATUS_ATTRIBUTES of a job item, or None."""
+    # Placeholders for every name: status, result, error are reserved words
+    names = {f"#a{i}": attr for i, attr in enumerate(JOB_STATUS_ATTRIBUTES)}
+    with span("dynamo.get"):
+        resp = _jobs_table().get_item(
+            Key={"jobId": job_id},
+            ProjectionExpression=", ".join(names),
+            ExpressionAttributeNames=names,
+        )
+    annotate(job_id=job_id)
     return resp.get("Item")
 
 
@@ -109,12 +195,24 @@ def lambda_handler(event, context):
     Handles:
       POST /api/count         -> create count job
       GET  /api/count/{jobId} -> get status/result
+      POST /api/stats         -> create statistics job
+      GET  /api/stats/{jobId} -> get status/result
       POST /api/download      -> create download job
       GET  /api/download/{jobId} -> get status/result
+
+    Each request is traced (tracing.py) under its route template, e.g.
+    "GET /api/count/{jobId}".
     """
-    print("API Lambda event:", json.dumps(event, default=_json_default))
-    print("simple log")
+    resource = event.get("resource", "") or ""
+    method = event.get("httpMethod", "GET")
+
+    with trace("api", f"{method} {resource}".strip()):
+        response = _dispatch(event)
+        annotate(status_code=response["statusCode"])
+        return response
 
+
+def _dispatch(event) -> Dict[str, Any]:
     path = event.get("path", "") or ""
     resource = event.get("resource", "") or ""
     method = event.get("httpMethod", "GET")
@@ -169,18 +267,70 @@ def lambda_handler(event, context):
             )
         return _lambda_response(200, job, cors_origin)
 
+    # Stats POST (create job): per-region statistics, same filters as counts
+    if method == "POST" and (resource == "/api/stats" or path.endswith("/api/stats")):
+        filters = body_data.get("filters", body_data or {})
+        filters = filters or {}
+        job_id = _create_job("stats", filters, compress=False)
+        return _lambda_response(
+            202,
+            {
+                "jobId": job_id,
+                "status": "QUEUED",
+                "jobType": "stats",
+            },
+            cors_origin,
+        )
+
+    # Stats GET (status)
+    if method == "GET" and (resource == "/api/stats/{jobId}" or "/api/stats/" in path):
+        job_id = job_id_param or path.rsplit("/", 1)[-1]
+        job = _get_job(job_id)
+        if not job:
+            return _lambda_response(
+                404,
+                {"error": "Job not found", "jobId": job_id},
+                cors_origin,
+            )
+        return _lambda_response(200, job, cors_origin)
+
     # Download POST (create job)
     if method == "POST" and (resource == "/api/download" or path.endswith("/api/download")):
         filters = body_data.get("filters", {})
         filters = filters or {}
         compress = bool(body_data.get("compress", False))
-        job_id = _create_job("download", filters, compress=compress)
+        export_options = None
+        try:
+            export_format = normalize_export_format(body_data.get("format"))
+            if export_format == "csv":
+                # Attribute-only export: {columns: [...], centroid: bool}
+                export_options = {
+                    "columns": normalize_attribute_columns(body_data.get("columns")),
+                    "centroid": bool(body_data.get("centroid", False)),
+                }
+            else:
+                # Optional {properties: [...], precision: n}
+                projection = normalize_projection(
+                    body_data.get("properties"), body_data.get("precision")
+                )
+                if projection:
+                    export_options = {"projection": projection}
+        except ValueError as e:
+            return _lambda_response(400, {"error": str(e)}, cors_origin)
+        job_id = _create_job(
+            "download",
+            filters,
+            compress=compress,
+            export_format=export_format,
+            export_options=export_options,
+        )
         return _lambda_response(
             202,
             {
                 "jobId": job_id,
                 "status": "QUEUED",
                 "jobType": "download",
+                "format": export_format,
             },
             cors_origin,
         )
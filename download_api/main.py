@@ -1,34 +1,83 @@
 import os
+import gzip
 import json
+import shutil
+import sys
 import tempfile
 import zipfile
-from typing import List, Optional, Tuple, Dict, Any
+import zlib
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Tuple, Dict, Any
 from uuid import uuid4
 
-import os
+BASE_DIR = Path(__file__).resolve().parent
+# landslide_core lives at the repository root (a Lambda layer when deployed)
+sys.path.insert(0, str(BASE_DIR.parent))
+
 try:
     from dotenv import load_dotenv
-    from pathlib import Path
 
-    BASE_DIR = Path(__file__).resolve().parent
     load_dotenv(BASE_DIR / ".env.local")
 except ImportError:
     pass
 
 
-import pg8000
+import anyio
+from asyncpg import PostgresError
 from pg8000.dbapi import DatabaseError
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
 
 import boto3
-from botocore.exceptions import ClientError
 
-# ---------- FastAPI app (local dev) ----------
+from export_formats import (
+    CENTROID_COLUMNS,
+    FORMAT_MAX_FEATURES,
+    LINE_FORMATS,
+    CSVRows,
+    GeoJSONRows,
+    export_content_type,
+    export_filename,
+    normalize_attribute_columns,
+    normalize_export_format,
+    normalize_projection,
+    write_flatgeobuf,
+    write_geoparquet,
+    write_rows,
+)
+from landslide_core import aio
+from landslide_core.db import (
+    HISTOGRAM_CACHE_SECONDS,
+    count_matching_filters,
+    get_db_conn,
+    summarize_matching_filters,
+)
+from landslide_core.filter_query import canonical_filters
+from landslide_core.filters import Filters
+from landslide_core.sql import execute, prepare_selection, stage_filtered
+from landslide_core.tracing import log
+
+
+# ---------- FastAPI app (local dev / export service) ----------
+
+EXPORT_MAX_FEATURES = int(os.getenv("EXPORT_MAX_FEATURES", "200000"))
+# Streamed exports: rows per cursor fetch and bytes per response chunk
+EXPORT_STREAM_BATCH_ROWS = int(os.getenv("EXPORT_STREAM_BATCH_ROWS", "1000"))
+EXPORT_STREAM_CHUNK_BYTES = 256 * 1024
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await aio.close_pools()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:5173",
@@ -44,220 +93,47 @@ app.add_middleware(
 )
 
 
-# ---------- DB helper ----------
-
-def _get_db_credentials_from_env() -> Dict[str, Any]:
-    """
-    Resolve DB connection params from env and Secrets Manager.
-
-    Used by Lambda & FastAPI. Returns components instead of DSN.
-    """
-    host = os.getenv("PGHOST")
-    database = os.getenv("PGDATABASE")
-    user = os.getenv("PGUSER")
-
-    if not (host and database and user):
-        raise RuntimeError(
-            "Missing PGHOST / PGDATABASE / PGUSER env vars and no DATABASE_URL set."
-        )
-
-    password = os.getenv("PGPASSWORD")
-    if not password:
-        secret_arn = os.getenv("DB_SECRET_ARN")
-        if not secret_arn:
-            raise RuntimeError("Neither PGPASSWORD nor DB_SECRET_ARN is set.")
-        sm = boto3.client("secretsmanager")
-        try:
-            resp = sm.get_secret_value(SecretId=secret_arn)
-            secret_str = resp.get("SecretString")
-            secret_dict = json.loads(secret_str)
-            password = secret_dict.get("password")
-        except ClientError as e:
-            raise RuntimeError(f"Failed to fetch DB secret: {e}")
-
-    port = int(os.getenv("PGPORT", "5432"))
-    return {
-        "host": host,
-        "database": database,
-        "user": user,
-        "password": password,
-        "port": port,
-    }
-
-
-def get_db_conn():
-    """
-    Connection helper using pg8000 (pure Python – Lambda friendly).
-    """
-    creds = _get_db_credentials_from_env()
-    print(
-        "Connecting to Postgres:",
-        f"{creds['user']}@{creds['host']}:{creds['port']}/{creds['database']}",
-    )
-    return pg8000.connect(
-        host=creds["host"],
-        database=creds["database"],
-        user=creds["user"],
-        password=creds["password"],
-        port=creds["port"],
-    )
-
-
 # ---- Request models ----
 
-class Filters(BaseModel):
-    # Categorical filters
-    materials: Optional[List[str]] = None
-    movements: Optional[List[str]] = None
-    confidences: Optional[List[str]] = None
-
-    # Numeric filters
-    pga_min: Optional[float] = None
-    pga_max: Optional[float] = None
-    pgv_min: Optional[float] = None
-    pgv_max: Optional[float] = None
-    psa03_min: Optional[float] = None
-    psa03_max: Optional[float] = None
-    mmi_min: Optional[float] = None
-    mmi_max: Optional[float] = None
-    rain_min: Optional[float] = None
-    rain_max: Optional[float] = None
-
-    # Tolerances
-    tol_pga: float = 0.0
-    tol_pgv: float = 0.0
-    tol_psa03: float = 0.0
-    tol_mmi: float = 0.0
-    tol_rain: float = 0.0
-
-    # Optional selection geometry (GeoJSON, EPSG:4326)
-    selection_geojson: Optional[Dict[str, Any]] = None
-
-
 class DownloadRequest(BaseModel):
-    filters: Filters
+    # see landslide_core.filters.Filters
+    filters: Dict[str, Any] = {}
     compress: Optional[bool] = False
+    # geojson | geoparquet | flatgeobuf | csv
+    format: Optional[str] = "geojson"
+    # csv only: attribute columns (default all) and centroid lon/lat
+    columns: Optional[List[str]] = None
+    centroid: Optional[bool] = False
+    # other formats: property allowlist and coordinate decimal places
+    properties: Optional[List[str]] = None
+    precision: Optional[int] = None
 
 class CountRequest(BaseModel):
-    filters: Filters
+    filters: Dict[str, Any] = {}
 
 
 
-# ---- Internal helpers ----
-
-def _filters_to_dict(filters: Filters) -> Dict[str, Any]:
-    """Support both Pydantic v1 and v2 for debug logging."""
-    try:
-        return filters.dict()
-    except AttributeError:
-        return filters.model_dump()
-
-
-def _debug_log_filters(prefix: str, filters: Filters):
-    """Uniform debug logging for filters payloads."""
-    try:
-        filters_dict = _filters_to_dict(filters)
-        print(f"=== {prefix} called with filters ===")
-        print(json.dumps(filters_dict, indent=2, default=str))
-    except Exception as exc:
-        print(f"[{prefix}] Failed to log filters: {exc}")
-
-
-def _build_sql_params(filters: Filters, max_features: Optional[int] = None) -> Dict[str, Any]:
-    """
-    Map Filters -> SQL parameters used by export_original_from_filters(...)
-    """
-    materials = filters.materials or []
-    movements = filters.movements or []
-    confidences = filters.confidences or []
+# ---- Exports ----
 
-    selection_geojson_str = (
-        json.dumps(filters.selection_geojson) if filters.selection_geojson else None
+def _geojson_statement(
+        filters: Filters, max_features: int, projection: Optional[Dict[str, Any]],
+) -> Tuple[str, tuple]:
+    """(statement name, arguments) streaming the features of `filters`."""
+    if not projection:
+        return "stream_original", (*filters.sql_args(), max_features)
+    return "stream_projected", (
+        *filters.sql_args(),
+        max_features,
+        projection.get("properties"),
+        projection.get("precision"),
     )
 
-    params: Dict[str, Any] = {
-        "materials": materials,
-        "movements": movements,
-        "confidences": confidences,
-        "pga_min": filters.pga_min,
-        "pga_max": filters.pga_max,
-        "pgv_min": filters.pgv_min,
-        "pgv_max": filters.pgv_max,
-        "psa03_min": filters.psa03_min,
-        "psa03_max": filters.psa03_max,
-        "mmi_min": filters.mmi_min,
-        "mmi_max": filters.mmi_max,
-        "tol_pga": filters.tol_pga,
-        "tol_pgv": filters.tol_pgv,
-        "tol_psa03": filters.tol_psa03,
-        "tol_mmi": filters.tol_mmi,
-        "rain_min": filters.rain_min,
-        "rain_max": filters.rain_max,
-        "tol_rain": filters.tol_rain,
-        "selection_geojson": selection_geojson_str,
-    }
-
-    if max_features is not None:
-        params["max_features"] = max_features
-
-    return params
-
-
-# ---- Core DB logic ----
-
-def count_matching_filters(filters: Filters, max_features: int = 200_000) -> int:
-    _debug_log_filters("count_matching_filters", filters)
-    params = _build_sql_params(filters, max_features=max_features)
-
-    sql = """
-      SELECT COUNT(*) AS count
-      FROM landslide_v2.export_original_from_filters(
-          %(materials)s,
-          %(movements)s,
-          %(confidences)s,
-          %(pga_min)s,
-          %(pga_max)s,
-          %(pgv_min)s,
-          %(pgv_max)s,
-          %(psa03_min)s,
-          %(psa03_max)s,
-          %(mmi_min)s,
-          %(mmi_max)s,
-          %(tol_pga)s,
-          %(tol_pgv)s,
-          %(tol_psa03)s,
-          %(tol_mmi)s,
-          %(rain_min)s,
-          %(rain_max)s,
-          %(tol_rain)s,
-          CASE
-          WHEN %(selection_geojson)s IS NULL THEN NULL
-          ELSE ST_Transform(
-          ST_SetSRID(
-          ST_GeomFromGeoJSON(%(selection_geojson)s),
-          4326
-          ),
-          3857
-          )
-          END,
-          %(max_features)s
-          );
-    """
-
-    with get_db_conn() as conn, conn.cursor() as cur:
-        print("Executing COUNT(*) via export_original_from_filters...")
-        cur.execute(sql, params)
-        row = cur.fetchone()
-
-    count = row[0]
-    print(f"count_matching_filters result: {count}")
-    return count
-
 
 def generate_geojson_export(
         filters: Filters,
         compress: bool = False,
         max_features: int = 200_000,
+        projection: Optional[Dict[str, Any]] = None,
 ) -> Tuple[str, str]:
     """
     Generate a GeoJSON file (optionally zipped) in a temp directory
@@ -266,55 +142,17 @@ def generate_geojson_export(
     Returns:
       (file_path, download_filename)
     """
-    _debug_log_filters("generate_geojson_export", filters)
-    print("compress:", compress)
-    print("max_features:", max_features)
-
-    params = _build_sql_params(filters, max_features=max_features)
-
-    # --- DEBUG: log params sent to SQL ---
-    print("SQL params going to export_original_from_filters:")
-    print(json.dumps(params, indent=2, default=str))
-
-    sql = """
-        SELECT landslide_v2.export_original_from_filters(
-            %(materials)s,
-            %(movements)s,
-            %(confidences)s,
-            %(pga_min)s,
-            %(pga_max)s,
-            %(pgv_min)s,
-            %(pgv_max)s,
-            %(psa03_min)s,
-            %(psa03_max)s,
-            %(mmi_min)s,
-            %(mmi_max)s,
-            %(tol_pga)s,
-            %(tol_pgv)s,
-            %(tol_psa03)s,
-            %(tol_mmi)s,
-            %(rain_min)s,
-            %(rain_max)s,
-            %(tol_rain)s,
-            CASE
-                WHEN %(selection_geojson)s IS NULL THEN NULL
-                ELSE ST_Transform(
-                    ST_SetSRID(
-                        ST_GeomFromGeoJSON(%(selection_geojson)s),
-                        4326
-                    ),
-                    3857
-                )
-            END,
-            %(max_features)s
-        ) AS feature;
-    """
+    log(
+        "generate_geojson_export", level="DEBUG",
+        filters=filters.log_fields(), compress=compress, max_features=max_features,
+    )
+
+    name, args = _geojson_statement(filters, max_features, projection)
 
     # Query + stream results to temp GeoJSON file
-    with get_db_conn() as conn, conn.cursor() as cur:
-        print("Executing export_original_from_filters SQL...")
-        cur.execute(sql, params)
-        print("SQL executed successfully, streaming results...")
+    with get_db_conn() as conn:
+        prepare_selection(conn, filters)
+        rows = execute(conn, name, args, filters)
 
         tmp_dir = tempfile.mkdtemp()
         geojson_path = os.path.join(tmp_dir, "landslides.geojson")
@@ -323,7 +161,7 @@ def generate_geojson_export(
         with open(geojson_path, "w", encoding="utf-8") as f:
             f.write('{"type":"FeatureCollection","features":[')
             first = True
-            for (feature,) in cur:
+            for (feature,) in rows:
                 feature_count += 1
 
                 if not first:
@@ -335,9 +173,7 @@ def generate_geojson_export(
 
             f.write("]}")
 
-    print(f"generate_geojson_export complete. feature_count={feature_count}")
-    print(f"GeoJSON path: {geojson_path}")
-    print("======================================")
+    log("GeoJSON export written", features=feature_count, path=geojson_path)
 
     if not compress:
         return geojson_path, "landslides.geojson"
@@ -346,10 +182,91 @@ def generate_geojson_export(
     with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
         zf.write(geojson_path, arcname="landslides.geojson")
 
-    print(f"Zipped file path: {zip_path}")
+    log("GeoJSON export zipped", level="DEBUG", path=zip_path)
     return zip_path, "landslides.geojson.zip"
 
 
+def generate_staged_export(
+        filters: Filters,
+        fmt: str,
+        compress: bool = False,
+        columns: Optional[List[str]] = None,
+        centroid: bool = False,
+        max_features: int = 200_000,
+        projection: Optional[Dict[str, Any]] = None,
+) -> Tuple[str, str]:
+    """
+    Generate a GeoParquet, FlatGeobuf or CSV (attributes only) file in a
+    temp directory.
+
+    The filtered rows are staged in landslide_v2.export_staging under a
+    throwaway job id, written by the same export_formats writers the worker
+    uses, and the staged rows are rolled back again.
+
+    Returns:
+      (file_path, download_filename)
+    """
+    log("generate_staged_export", level="DEBUG", format=fmt, filters=filters.log_fields())
+    job_id = f"local-{uuid4()}"
+    # FlatGeobuf is built in the database's memory: capped like max_features
+    max_features = min(max_features, FORMAT_MAX_FEATURES.get(fmt, max_features))
+    attributes = None
+    if fmt == "csv":
+        attributes = {
+            "columns": normalize_attribute_columns(columns),
+            "centroid": bool(centroid),
+        }
+
+    filename = export_filename(fmt, compress)
+    file_path = os.path.join(tempfile.mkdtemp(), filename)
+
+    with get_db_conn() as conn, conn.cursor() as cur:
+        prepare_selection(conn, filters)
+        try:
+            staged = stage_filtered(
+                conn, job_id, filters, max_features,
+                attributes=attributes, projection=projection,
+            )
+            with open(file_path, "wb") as f:
+                if fmt == "geoparquet":
+                    write_geoparquet(cur, job_id, staged, f)
+                elif fmt == "flatgeobuf":
+                    write_flatgeobuf(cur, job_id, f)
+                else:
+                    header = attributes["columns"] + (CENTROID_COLUMNS if centroid else [])
+                    if compress:
+                        with gzip.GzipFile(fileobj=f, mode="wb") as gz:
+                            write_rows(cur, job_id, staged, gz, CSVRows(header))
+                    else:
+                        write_rows(cur, job_id, staged, f, CSVRows(header))
+        finally:
+            # Staged rows were never committed; roll them back
+            conn.rollback()
+
+    log("Staged export written", format=fmt, staged=staged, path=file_path)
+    return file_path, filename
+
+
+def _export(req: DownloadRequest) -> Tuple[str, str]:
+    fmt = normalize_export_format(req.format)
+    projection = normalize_projection(req.properties, req.precision)
+    filters = Filters.from_dict(req.filters)
+    if fmt == "geojson":
+        return generate_geojson_export(
+            filters=filters,
+            compress=req.compress or False,
+            projection=projection,
+        )
+    return generate_staged_export(
+        filters=filters,
+        fmt=fmt,
+        compress=req.compress or False,
+        columns=req.columns,
+        centroid=req.centroid or False,
+        projection=projection,
+    )
+
+
 # ---- S3 helper for Lambda ----
 
 def upload_to_s3_and_presign(local_path: str, filename: str) -> str:
@@ -360,7 +277,7 @@ def upload_to_s3_and_presign(local_path: str, filename: str) -> str:
     s3 = boto3.client("s3")
     key = f"exports/{uuid4()}/{filename}"
 
-    print(f"Uploading {local_path} to s3://{bucket}/{key}")
+    log("Uploading export", level="DEBUG", path=local_path, bucket=bucket, key=key)
     s3.upload_file(local_path, bucket, key)
 
     # Presigned URL for download
@@ -369,46 +286,178 @@ def upload_to_s3_and_presign(local_path: str, filename: str) -> str:
         Params={"Bucket": bucket, "Key": key},
         ExpiresIn=3600,  # 1 hour
     )
-    print(f"Presigned URL: {url}")
+    log("Export uploaded", key=key)
     return url
 
 
-# ---- FastAPI endpoints (local dev only) ----
+# ---- Streamed exports (FastAPI) ----
+
+def _line_export(req: DownloadRequest, fmt: str, filters: Filters):
+    """(row encoder, statement name, arguments) of a geojson / csv export."""
+    if fmt == "csv":
+        columns = normalize_attribute_columns(req.columns)
+        header = columns + (CENTROID_COLUMNS if req.centroid else [])
+        args = (*filters.sql_args(), EXPORT_MAX_FEATURES, columns, bool(req.centroid))
+        return CSVRows(header), "stream_attributes", args
+
+    projection = normalize_projection(req.properties, req.precision)
+    return GeoJSONRows(), *_geojson_statement(filters, EXPORT_MAX_FEATURES, projection)
+
+
+async def stream_line_export(
+        rows: AsyncIterator[Any],
+        encoder,
+        compress: bool = False,
+) -> AsyncIterator[bytes]:
+    """
+    Encode rows as they arrive from the cursor, in chunks of about
+    EXPORT_STREAM_CHUNK_BYTES (one gzip stream across the chunks when
+    compressed): memory holds one cursor batch and one chunk, whatever the
+    size of the export. `rows` is closed when this generator is.
+    """
+    try:
+        # wbits=31: gzip container, same as the worker's .gz exports
+        gz = zlib.compressobj(wbits=31) if compress else None
+        buf = bytearray(encoder.header())
+        seq = 0
+        async for value in rows:
+            seq += 1
+            buf += encoder.row(seq, value)
+            if len(buf) >= EXPORT_STREAM_CHUNK_BYTES:
+                chunk = gz.compress(bytes(buf)) if gz else bytes(buf)
+                buf.clear()
+                if chunk:
+                    yield chunk
+        buf += encoder.footer()
+        yield gz.compress(bytes(buf)) + gz.flush() if gz else bytes(buf)
+    finally:
+        await _aclose(rows)
+
+
+async def _aclose(gen):
+    # Close an async generator now rather than at garbage collection: an
+    # aio.stream() holds a pooled connection and an open transaction. The
+    # close must also run when the response task was cancelled (client gone).
+    with anyio.CancelScope(shield=True):
+        await gen.aclose()
+
+
+async def _after_first(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # Pull the first chunk before the response starts, so that bad filters
+    # or database errors still become a 400 instead of a truncated body
+    try:
+        first = await chunks.__anext__()
+    except BaseException:
+        await _aclose(chunks)
+        raise
+
+    async def body():
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await _aclose(chunks)
+
+    return body()
+
+
+# ---- FastAPI endpoints ----
 
 @app.post("/download")
-def download(req: DownloadRequest):
+async def download(req: DownloadRequest):
+    """
+    geojson / csv: streamed as the rows arrive (gzipped with compress=true),
+    no temp files. geoparquet / flatgeobuf: written to a temp file by the
+    staged export writers, removed once sent.
+    """
     try:
-        file_path, filename = generate_geojson_export(
-            filters=req.filters,
-            compress=req.compress or False,
+        fmt = normalize_export_format(req.format)
+        filters = Filters.from_dict(req.filters)
+        compress = req.compress or False
+        headers = {"Content-Disposition": f'attachment; filename="{export_filename(fmt, compress)}"'}
+
+        if fmt in LINE_FORMATS:
+            encoder, name, args = _line_export(req, fmt, filters)
+            rows = aio.stream(name, args, filters=filters, batch_size=EXPORT_STREAM_BATCH_ROWS)
+            body = await _after_first(stream_line_export(rows, encoder, compress))
+            return StreamingResponse(
+                body,
+                media_type=export_content_type(fmt, compress),
+                headers=headers,
+                # A disconnect cancelled while sending leaves the body
+                # suspended at a yield: close it (and its cursor) right after
+                background=BackgroundTask(body.aclose),
+            )
+
+        file_path, filename = await run_in_threadpool(
+            generate_staged_export,
+            filters=filters,
+            fmt=fmt,
+            compress=compress,
+            max_features=EXPORT_MAX_FEATURES,
+            projection=normalize_projection(req.properties, req.precision),
         )
-    except DatabaseError as e:
-        msg = str(e)
-        raise HTTPException(status_code=400, detail=f"Database error: {msg}")
-    except RuntimeError as e:
+    except (DatabaseError, PostgresError) as e:
+        raise HTTPException(status_code=400, detail=f"Database error: {e}")
+    except (RuntimeError, ValueError) as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Export failed: {e}")
 
     return FileResponse(
         file_path,
-        media_type="application/zip" if filename.endswith(".zip") else "application/geo+json",
+        media_type=export_content_type(fmt, compress),
         filename=filename,
+        background=BackgroundTask(shutil.rmtree, os.path.dirname(file_path), ignore_errors=True),
     )
 
 
 @app.post("/count")
-def count_landslides(req: CountRequest):
+async def count_landslides(req: CountRequest):
     try:
-        filters = req.filters
-        count = count_matching_filters(filters)
+        count = await aio.count_matching_filters(Filters.from_dict(req.filters))
         return {"count": count}
-    except DatabaseError as e:
-        return _lambda_response(400, {"error": f"Database error: {e}"}, cors_origin)
+    except PostgresError as e:
+        raise HTTPException(status_code=400, detail=f"Database error: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Count failed: {e}")
 
 
+@app.post("/stats")
+async def landslide_stats(req: CountRequest):
+    """Statistics of the matching landslides (see sql/summary_stats.sql)."""
+    try:
+        return await aio.summarize_matching_filters(Filters.from_dict(req.filters))
+    except PostgresError as e:
+        raise HTTPException(status_code=400, detail=f"Database error: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Statistics failed: {e}")
+
+
+@app.get("/histograms")
+async def histograms(
+    response: Response,
+    materials: Optional[str] = None,
+    movements: Optional[str] = None,
+    confidences: Optional[str] = None,
+):
+    """Slider histograms for the categorical filters (comma-separated lists)."""
+    filters = Filters.from_dict(canonical_filters(
+        {"materials": materials, "movements": movements, "confidences": confidences}
+    ))
+    try:
+        result = await aio.attribute_histograms(filters)
+    except PostgresError as e:
+        raise HTTPException(status_code=400, detail=f"Database error: {e}")
+    response.headers["Cache-Control"] = f"public, max-age={int(HISTOGRAM_CACHE_SECONDS)}"
+    return result
+
+
 # ---- Lambda handler (for API Gateway) ----
 
 ALLOWED_CORS_ORIGINS = set(origins)  # reuse same allowed origins
@@ -439,9 +488,8 @@ def lambda_handler(event, context):
       - event["body"] -> JSON string
     """
 
-    print("Lambda event:", json.dumps(event))
-
     path = event.get("path", "")
+    log("Lambda request", level="DEBUG", path=path, method=event.get("httpMethod"))
     try:
         raw_body = event.get("body") or "{}"
         body = json.loads(raw_body)
@@ -457,21 +505,25 @@ def lambda_handler(event, context):
         if path.endswith("/count"):
             # Allow either {filters: {...}} or {...} directly
             if "filters" in body:
-                filters = Filters(**body["filters"])
+                filters = Filters.from_dict(body["filters"])
             else:
-                filters = Filters(**body)
+                filters = Filters.from_dict(body)
 
             count = count_matching_filters(filters)
             return _lambda_response(200, {"count": count}, cors_origin)
 
+        elif path.endswith("/stats"):
+            filters = Filters.from_dict(body.get("filters", body))
+            return _lambda_response(200, summarize_matching_filters(filters), cors_origin)
+
         elif path.endswith("/download"):
-            # Expect {filters: {...}, compress: bool}
+            # Expect {filters: {...}, compress: bool, format: str}
             req = DownloadRequest(**body)
-            file_path, filename = generate_geojson_export(
-                filters=req.filters,
-                compress=req.compress or False,
-            )
-            url = upload_to_s3_and_presign(file_path, filename)
+            file_path, filename = _export(req)
+            try:
+                url = upload_to_s3_and_presign(file_path, filename)
+            finally:
+                shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
             return _lambda_response(
                 200,
                 {"url": url, "filename": filename},
@@ -483,9 +535,9 @@ def lambda_handler(event, context):
 
     except DatabaseError as e:
         return _lambda_response(400, {"error": f"Database error: {e}"}, cors_origin)
-    except RuntimeError as e:
+    except (RuntimeError, ValueError) as e:
         return _lambda_response(400, {"error": str(e)}, cors_origin)
     except Exception as e:
         # Don't leak full trace in prod, but log it
-        print("Unhandled error:", repr(e))
+        log("Unhandled error", level="ERROR", error=repr(e))
         return _lambda_response(500, {"error": f"Internal server error: {e}"}, cors_origin)
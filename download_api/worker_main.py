@@ -1,380 +1,825 @@
 import os
+import io
 import json
-import tempfile
-import zipfile
 import time
-from typing import Dict, Any, Optional, Tuple, List
+import zlib
+from decimal import Decimal
+from functools import lru_cache
+from typing import Callable, Dict, Any, Optional, List
 from uuid import uuid4
 
-import pg8000
 from pg8000.dbapi import DatabaseError
 
 import boto3
 from botocore.exceptions import ClientError
 
+from export_formats import (
+    CENTROID_COLUMNS,
+    FORMAT_MAX_FEATURES,
+    LINE_FORMATS,
+    export_content_type,
+    export_filename,
+    geoparquet_available,
+    iter_staged_chunks,
+    normalize_attribute_columns,
+    normalize_export_format,
+    normalize_projection,
+    row_encoder,
+    write_flatgeobuf,
+    write_geoparquet,
+)
+from landslide_core.db import count_matching_filters, get_db_conn, summarize_matching_filters
+from landslide_core.filters import Filters, job_filters
+from landslide_core.profile import collected_plans, start_collecting
+from landslide_core.sql import execute, prepare_selection, stage_filtered
+from landslide_core.tracing import annotate, fail, log, record, span, trace
+
 
 # ---------- Globals ----------
 
-dynamodb = boto3.resource("dynamodb")
 JOBS_TABLE_NAME = os.getenv("JOBS_TABLE_NAME")
-if not JOBS_TABLE_NAME:
-    raise RuntimeError("JOBS_TABLE_NAME env var is required for worker")
 
-jobs_table = dynamodb.Table(JOBS_TABLE_NAME)
+# Priority lane served by this worker ("interactive" | "export" | "bulk")
+JOB_LANE = os.getenv("JOB_LANE", "export")
+BULK_JOBS_QUEUE_URL = os.getenv("BULK_JOBS_QUEUE_URL")
+
+# Export admission control: every download is pre-counted, and the estimate
+# decides whether it runs here, is moved to the bulk lane, or is rejected.
+EXPORT_MAX_FEATURES = int(os.getenv("EXPORT_MAX_FEATURES", "200000"))
+EXPORT_BULK_FEATURES = int(os.getenv("EXPORT_BULK_FEATURES", "50000"))
+EXPORT_BYTES_PER_FEATURE = int(os.getenv("EXPORT_BYTES_PER_FEATURE", "2500"))
+EXPORT_ZIP_RATIO = float(os.getenv("EXPORT_ZIP_RATIO", "0.15"))
+EXPORT_FEATURES_PER_SECOND = int(os.getenv("EXPORT_FEATURES_PER_SECOND", "2000"))
+# Output size relative to uncompressed GeoJSON, per export format
+EXPORT_FORMAT_SIZE_RATIO = {"geojson": 1.0, "geoparquet": 0.25, "flatgeobuf": 0.6, "csv": 0.05}
+
+# Export progress is written to the job item at most once per interval,
+# or after this many new features, whichever comes first.
+PROGRESS_INTERVAL_SECONDS = float(os.getenv("PROGRESS_INTERVAL_SECONDS", "5"))
+PROGRESS_EVERY_FEATURES = int(os.getenv("PROGRESS_EVERY_FEATURES", "25000"))
+
+# Chunked / resumable exports: staged rows are read EXPORT_CHUNK_FEATURES at a
+# time and uploaded as S3 multipart parts of at least EXPORT_PART_BYTES.
+# When less than EXPORT_TIME_MARGIN_MS is left, the worker stops after the
+# current part and re-enqueues the job on JOB_QUEUE_URL (its own lane).
+EXPORT_CHUNK_FEATURES = int(os.getenv("EXPORT_CHUNK_FEATURES", "5000"))
+EXPORT_PART_BYTES = int(os.getenv("EXPORT_PART_BYTES", str(8 * 1024 * 1024)))
+EXPORT_TIME_MARGIN_MS = int(os.getenv("EXPORT_TIME_MARGIN_MS", "120000"))
+JOB_QUEUE_URL = os.getenv("JOB_QUEUE_URL")
+
+# Parallel exports: staged exports of more than EXPORT_PARALLEL_MIN_FEATURES
+# are split into partitions written by several workers of the lane at once,
+# then assembled into one S3 object via multipart copy. It defaults to
+# EXPORT_BULK_FEATURES, so the two lanes don't overlap: the export lane
+# writes everything it admits (up to EXPORT_BULK_FEATURES) serially, and
+# larger exports are deferred to the bulk lane and fanned out there. Without
+# a bulk queue nothing is deferred and the export lane fans out above the
+# same threshold.
+EXPORT_PARALLEL_MIN_FEATURES = int(
+    os.getenv("EXPORT_PARALLEL_MIN_FEATURES") or EXPORT_BULK_FEATURES
+)
+EXPORT_PARTITION_FEATURES = int(os.getenv("EXPORT_PARTITION_FEATURES", "20000"))
+EXPORT_MAX_PARTITIONS = int(os.getenv("EXPORT_MAX_PARTITIONS", "16"))
+S3_MIN_PART_BYTES = 5 * 1024 * 1024
+
+# A worker leases the job it runs until its invocation's deadline
+# (leaseUntil, epoch seconds; JOB_LEASE_SECONDS without a Lambda context),
+# so a message SQS re-delivers meanwhile is dropped instead of running the
+# job twice. Continuations and deferrals hand the lease back.
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "900"))
+
+# Plans of the job's slow queries (QUERY_PROFILE_MS, landslide_core/profile.py)
+# are stored on its item as zlib-compressed JSON, "slowPlansZ" - unless they
+# would crowd the 400 KB item limit even compressed.
+QUERY_PLANS_MAX_BYTES = 256 * 1024
+
+# ---------- AWS clients ----------
+# Created on first use and reused by later invocations of the same container:
+# a boto3 client costs tens of ms (service model loading), and imports of
+# the module (benchmarks, the local app) need no AWS setup at all.
+
+@lru_cache(maxsize=None)
+def _client(service: str):
+    return boto3.client(service)
+
+
+@lru_cache(maxsize=None)
+def _jobs_table():
+    if not JOBS_TABLE_NAME:
+        raise RuntimeError("JOBS_TABLE_NAME env var is required for worker")
+    return boto3.resource("dynamodb").Table(JOBS_TABLE_NAME)
 
 
-# ---------- DB helpers (Lambda only, no Pydantic) ----------
+# ---------- Core DB logic ----------
 
-def _get_db_credentials_from_env() -> Dict[str, Any]:
+def stage_export(
+    job_id: str,
+    filters: Filters,
+    max_features: int = 200_000,
+    attributes: Optional[Dict[str, Any]] = None,
+    projection: Optional[Dict[str, Any]] = None,
+) -> int:
     """
-    Resolve DB connection params from env and Secrets Manager.
+    Run export_original_from_filters(...) once, inside Postgres, into
+    landslide_v2.export_staging keyed by (job_id, seq) (see
+    landslide_core.sql.stage_filtered).
+
+    With projection={"properties": [...], "precision": n} the features come
+    from export_projected_from_filters(...), built with only those properties
+    and coordinate digits, so the rest is never staged or serialized.
+
+    With attributes={"columns": [...], "centroid": bool} (csv exports) the
+    rows come from export_attributes_from_filters(...) instead: flat
+    attribute objects, no geometry.
 
-    Env vars:
-      PGHOST, PGDATABASE, PGUSER, optional PGPASSWORD or DB_SECRET_ARN
+    The export is then read back in ordered seq ranges, so it can be written
+    chunk by chunk and resumed from any checkpoint without re-running the
+    filter query. Returns the number of staged features.
     """
-    host = os.getenv("PGHOST")
-    database = os.getenv("PGDATABASE")
-    user = os.getenv("PGUSER")
+    log("stage_export", level="DEBUG", job_id=job_id, filters=filters.log_fields())
 
-    if not (host and database and user):
-        raise RuntimeError("Missing PGHOST / PGDATABASE / PGUSER env vars.")
+    with get_db_conn() as conn:
+        prepare_selection(conn, filters)
+        execute(conn, "clear_staged", (job_id,))
+        staged = stage_filtered(
+            conn, job_id, filters, max_features,
+            attributes=attributes, projection=projection,
+        )
+        conn.commit()
 
-    password = os.getenv("PGPASSWORD")
-    if not password:
-        secret_arn = os.getenv("DB_SECRET_ARN")
-        if not secret_arn:
-            raise RuntimeError("Neither PGPASSWORD nor DB_SECRET_ARN is set.")
-        sm = boto3.client("secretsmanager")
-        try:
-            resp = sm.get_secret_value(SecretId=secret_arn)
-            secret_str = resp.get("SecretString")
-            secret_dict = json.loads(secret_str)
-            password = secret_dict.get("password")
-        except ClientError as e:
-            raise RuntimeError(f"Failed to fetch DB secret: {e}")
+    annotate(staged=staged)
+    return staged
 
-    port = int(os.getenv("PGPORT", "5432"))
-    return {
-        "host": host,
-        "database": database,
-        "user": user,
-        "password": password,
-        "port": port,
-    }
 
+def drop_staged_export(job_id: str):
+    with get_db_conn() as conn:
+        execute(conn, "drop_staged", (job_id,))
+        conn.commit()
 
-def get_db_conn():
-    creds = _get_db_credentials_from_env()
-    print(
-        "Connecting to Postgres:",
-        f"{creds['user']}@{creds['host']}:{creds['port']}/{creds['database']}",
-    )
-    return pg8000.connect(
-        host=creds["host"],
-        database=creds["database"],
-        user=creds["user"],
-        password=creds["password"],
-        port=creds["port"],
-    )
 
+def _iter_staged_chunks(cur, job_id: str, after_seq: int, until_seq: int, select: str = "feature::text"):
+    """
+    Yield the staged (seq, value) rows of a job with
+    after_seq < seq <= until_seq, in order, EXPORT_CHUNK_FEATURES at a time.
+    """
+    return iter_staged_chunks(cur, job_id, after_seq, until_seq, EXPORT_CHUNK_FEATURES, select)
 
-# ---------- Filters / params helpers (dict-based) ----------
 
-def _normalize_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
+class _PartBuffer:
     """
-    Take a raw filters dict and normalize keys / defaults.
-    This replaces the Pydantic Filters model in Lambda.
+    In-memory buffer for one S3 multipart part.
+
+    With compress=True every part is its own gzip member; concatenated
+    members are a valid .gz file, so parts can be written independently.
     """
-    f = filters or {}
 
-    def get_list(key: str) -> List[str]:
-        val = f.get(key)
-        if val is None:
-            return []
-        if isinstance(val, list):
-            return val
-        return [val]
+    def __init__(self, compress: bool):
+        self._out = io.BytesIO()
+        self._z = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        self._compress_s = 0.0
+        self.raw_bytes = 0
+
+    def write(self, data: bytes):
+        self.raw_bytes += len(data)
+        if self._z:
+            started = time.perf_counter()
+            self._out.write(self._z.compress(data))
+            self._compress_s += time.perf_counter() - started
+        else:
+            self._out.write(data)
+
+    def size(self) -> int:
+        return self._out.tell()
+
+    def finish(self) -> bytes:
+        if self._z:
+            started = time.perf_counter()
+            self._out.write(self._z.flush())
+            self._compress_s += time.perf_counter() - started
+            record("export.compress", self._compress_s * 1000)
+        return self._out.getvalue()
+
+
+def start_export_upload(
+    job_id: str,
+    staged: int,
+    compress: bool,
+    fmt: str = "geojson",
+    columns: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Open the S3 multipart upload for a staged line-format export (geojson,
+    csv) and return the initial checkpoint that is stored on the job item.
+    """
+    bucket = _export_bucket()
+    filename = export_filename(fmt, compress)
+    key = f"exports/{uuid4()}/{filename}"
 
-    def get_float(key: str) -> Optional[float]:
-        val = f.get(key)
-        if val is None:
-            return None
-        try:
-            return float(val)
-        except (TypeError, ValueError):
-            return None
-
-    def get_float_default(key: str, default: float = 0.0) -> float:
-        val = f.get(key)
-        if val is None:
-            return default
-        try:
-            return float(val)
-        except (TypeError, ValueError):
-            return default
+    s3 = _client("s3")
+    resp = s3.create_multipart_upload(
+        Bucket=bucket,
+        Key=key,
+        ContentType=export_content_type(fmt, compress),
+        ContentDisposition=f'attachment; filename="{filename}"',
+    )
 
     return {
-        "materials": get_list("materials"),
-        "movements": get_list("movements"),
-        "confidences": get_list("confidences"),
-        "pga_min": get_float("pga_min"),
-        "pga_max": get_float("pga_max"),
-        "pgv_min": get_float("pgv_min"),
-        "pgv_max": get_float("pgv_max"),
-        "psa03_min": get_float("psa03_min"),
-        "psa03_max": get_float("psa03_max"),
-        "mmi_min": get_float("mmi_min"),
-        "mmi_max": get_float("mmi_max"),
-        "rain_min": get_float("rain_min"),
-        "rain_max": get_float("rain_max"),
-        "tol_pga": get_float_default("tol_pga", 0.0),
-        "tol_pgv": get_float_default("tol_pgv", 0.0),
-        "tol_psa03": get_float_default("tol_psa03", 0.0),
-        "tol_mmi": get_float_default("tol_mmi", 0.0),
-        "tol_rain": get_float_default("tol_rain", 0.0),
-        "selection_geojson": f.get("selection_geojson"),
+        "staged": staged,
+        "key": key,
+        "filename": filename,
+        "upload_id": resp["UploadId"],
+        "parts": [],
+        "last_seq": 0,
+        "bytes_written": 0,
+        "sealed": False,
+        "format": fmt,
+        "columns": columns,
     }
 
 
-def _build_sql_params(filters: Dict[str, Any], max_features: Optional[int] = None) -> Dict[str, Any]:
-    """
-    Map normalized filters dict -> SQL params for export_original_from_filters.
-    """
-    selection_geojson = filters.get("selection_geojson")
-    selection_geojson_str = json.dumps(selection_geojson) if selection_geojson else None
-
-    params: Dict[str, Any] = {
-        "materials": filters["materials"],
-        "movements": filters["movements"],
-        "confidences": filters["confidences"],
-        "pga_min": filters["pga_min"],
-        "pga_max": filters["pga_max"],
-        "pgv_min": filters["pgv_min"],
-        "pgv_max": filters["pgv_max"],
-        "psa03_min": filters["psa03_min"],
-        "psa03_max": filters["psa03_max"],
-        "mmi_min": filters["mmi_min"],
-        "mmi_max": filters["mmi_max"],
-        "tol_pga": filters["tol_pga"],
-        "tol_pgv": filters["tol_pgv"],
-        "tol_psa03": filters["tol_psa03"],
-        "tol_mmi": filters["tol_mmi"],
-        "rain_min": filters["rain_min"],
-        "rain_max": filters["rain_max"],
-        "tol_rain": filters["tol_rain"],
-        "selection_geojson": selection_geojson_str,
+def _load_checkpoint(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """DynamoDB hands numbers back as Decimal; turn them back into ints."""
+    return {
+        "staged": int(raw["staged"]),
+        "key": raw["key"],
+        "filename": raw["filename"],
+        "upload_id": raw["upload_id"],
+        "parts": [
+            {"PartNumber": int(p["PartNumber"]), "ETag": p["ETag"]}
+            for p in raw.get("parts", [])
+        ],
+        "last_seq": int(raw.get("last_seq", 0)),
+        "bytes_written": int(raw.get("bytes_written", 0)),
+        "sealed": bool(raw.get("sealed", False)),
+        "format": raw.get("format") or "geojson",
+        "columns": list(raw["columns"]) if raw.get("columns") else None,
     }
 
-    if max_features is not None:
-        params["max_features"] = max_features
 
-    return params
+def generate_chunked_export(
+    job_id: str,
+    checkpoint: Dict[str, Any],
+    compress: bool = False,
+    out_of_time: Optional[Callable[[], bool]] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> bool:
+    """
+    Write the staged rows of a job to S3 as one GeoJSON FeatureCollection
+    (or CSV table, see checkpoint["format"]), in ordered chunks of
+    EXPORT_CHUNK_FEATURES rows.
 
+    Chunks are buffered into multipart parts of at least EXPORT_PART_BYTES
+    (S3 needs >= 5 MiB for all but the last part). After every part the
+    checkpoint (last seq, part ETags) is saved on the job item, so a
+    re-delivered message continues from the last uploaded part.
 
-# ---------- Core DB logic ----------
+    Returns True when the upload is complete, False when out_of_time()
+    asked us to stop after a part (the checkpoint is saved).
+    """
+    s3 = _client("s3")
+    bucket = _export_bucket()
+    staged = checkpoint["staged"]
+    last_seq = checkpoint["last_seq"]
+    bytes_written = checkpoint["bytes_written"]
 
-def count_matching_filters(filters_dict: Dict[str, Any], max_features: int = 200_000) -> int:
-    filters = _normalize_filters(filters_dict)
-    params = _build_sql_params(filters, max_features=max_features)
-
-    print("=== count_matching_filters params ===")
-    print(json.dumps(params, indent=2, default=str))
-
-    sql = """
-          SELECT COUNT(*) AS count
-          FROM landslide_v2.lsviewer_filtered_ids(
-              %s, -- materials
-              %s, -- movements
-              %s, -- confidences
-              %s, -- pga_min
-              %s, -- pga_max
-              %s, -- pgv_min
-              %s, -- pgv_max
-              %s, -- psa03_min
-              %s, -- psa03_max
-              %s, -- mmi_min
-              %s, -- mmi_max
-              %s, -- tol_pga
-              %s, -- tol_pgv
-              %s, -- tol_psa03
-              %s, -- tol_mmi
-              %s, -- rain_min
-              %s, -- rain_max
-              %s, -- tol_rain
-              CASE
-                WHEN %s::text IS NULL THEN NULL ::geometry
-                ELSE ST_Transform(
-                    ST_SetSRID(
-                        ST_GeomFromGeoJSON(%s::text), 
-                        4326
-                    ), 
-                    3857
-                )
-              END
-          );
-        """
-
-    selection_str = params["selection_geojson"]
-    args = (
-        params["materials"],
-        params["movements"],
-        params["confidences"],
-        params["pga_min"],
-        params["pga_max"],
-        params["pgv_min"],
-        params["pgv_max"],
-        params["psa03_min"],
-        params["psa03_max"],
-        params["mmi_min"],
-        params["mmi_max"],
-        params["tol_pga"],
-        params["tol_pgv"],
-        params["tol_psa03"],
-        params["tol_mmi"],
-        params["rain_min"],
-        params["rain_max"],
-        params["tol_rain"],
-        selection_str,   # %s::text in WHEN
-        selection_str,   # %s::text in ST_GeomFromGeoJSON
+    encoder = row_encoder(checkpoint["format"], checkpoint["columns"])
+
+    log(
+        "generate_chunked_export", job_id=job_id, format=checkpoint["format"],
+        staged=staged, resume_from_seq=last_seq, parts_done=len(checkpoint["parts"]),
     )
 
-    with get_db_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, args)
-        row = cur.fetchone()
+    buf = _PartBuffer(compress)
+    if last_seq == 0:
+        buf.write(encoder.header())
+
+    def upload_part(final: bool):
+        if final:
+            buf.write(encoder.footer())
+        part_number = len(checkpoint["parts"]) + 1
+        body = buf.finish()
+        with span("s3.upload"):
+            resp = s3.upload_part(
+                Bucket=bucket,
+                Key=checkpoint["key"],
+                UploadId=checkpoint["upload_id"],
+                PartNumber=part_number,
+                Body=body,
+            )
+        checkpoint["parts"].append({"PartNumber": part_number, "ETag": resp["ETag"]})
+        checkpoint["last_seq"] = last_seq
+        checkpoint["bytes_written"] = bytes_written + buf.raw_bytes
+        checkpoint["sealed"] = final
+        _update_job(job_id, checkpoint=checkpoint)
+
+    # The closing part is already uploaded; only the completion is missing
+    if not checkpoint["sealed"]:
+        with get_db_conn() as conn, conn.cursor() as cur:
+            started = time.perf_counter()
+            for rows in _iter_staged_chunks(cur, job_id, last_seq, staged, encoder.select):
+                if started is not None:
+                    record("db.first_row", (time.perf_counter() - started) * 1000)
+                    started = None
+
+                with span("export.stream"):
+                    for seq, value in rows:
+                        buf.write(encoder.row(seq, value))
+                        last_seq = seq
+
+                if on_progress:
+                    on_progress(last_seq, bytes_written + buf.raw_bytes)
+
+                if buf.size() >= EXPORT_PART_BYTES:
+                    upload_part(final=False)
+                    bytes_written = checkpoint["bytes_written"]
+                    buf = _PartBuffer(compress)
+
+                    if out_of_time and out_of_time() and last_seq < staged:
+                        log("Stopping export, checkpoint saved", job_id=job_id, last_seq=last_seq)
+                        return False
+
+        upload_part(final=True)
+
+    with span("s3.upload"):
+        s3.complete_multipart_upload(
+            Bucket=bucket,
+            Key=checkpoint["key"],
+            UploadId=checkpoint["upload_id"],
+            MultipartUpload={"Parts": checkpoint["parts"]},
+        )
+
+    if on_progress:
+        on_progress(last_seq, checkpoint["bytes_written"])
+
+    annotate(features=last_seq, parts=len(checkpoint["parts"]), bytes=checkpoint["bytes_written"])
+    return True
+
+
+def abort_export(job_id: str, checkpoint: Optional[Dict[str, Any]]):
+    """Best-effort cleanup of a failed export (S3 upload + staged rows)."""
+    try:
+        if checkpoint:
+            _client("s3").abort_multipart_upload(
+                Bucket=_export_bucket(),
+                Key=checkpoint["key"],
+                UploadId=checkpoint["upload_id"],
+            )
+        drop_staged_export(job_id)
+    except Exception as e:
+        log("Cleanup failed", level="WARNING", job_id=job_id, error=repr(e))
+
+
+# ---------- Columnar exports (GeoParquet / FlatGeobuf) ----------
+
+class _MultipartSink:
+    """
+    Write-only file object that streams into an S3 multipart upload,
+    one part per EXPORT_PART_BYTES buffered bytes.
 
-    count = row[0]
-    print(f"count_matching_filters result: {count}")
-    return count
+    close() is a no-op (writers may close their sink); complete() uploads
+    the last part and finishes the upload.
+    """
 
+    def __init__(self, key: str, fmt: str):
+        self._s3 = _client("s3")
+        self._bucket = _export_bucket()
+        self.key = key
+        filename = key.rsplit("/", 1)[-1]
+        self._upload_id = self._s3.create_multipart_upload(
+            Bucket=self._bucket,
+            Key=key,
+            ContentType=export_content_type(fmt),
+            ContentDisposition=f'attachment; filename="{filename}"',
+        )["UploadId"]
+        self._buf = io.BytesIO()
+        self._parts: List[Dict[str, Any]] = []
+        self._written = 0
+        self.closed = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._buf.write(data)
+        self._written += len(data)
+        if self._buf.tell() >= EXPORT_PART_BYTES:
+            self._upload_part()
+        return len(data)
+
+    def tell(self) -> int:
+        return self._written
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def _upload_part(self):
+        part_number = len(self._parts) + 1
+        with span("s3.upload"):
+            resp = self._s3.upload_part(
+                Bucket=self._bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                PartNumber=part_number,
+                Body=self._buf.getvalue(),
+            )
+        self._parts.append({"PartNumber": part_number, "ETag": resp["ETag"]})
+        self._buf = io.BytesIO()
+
+    def complete(self) -> int:
+        if self._buf.tell() or not self._parts:
+            self._upload_part()
+        with span("s3.upload"):
+            self._s3.complete_multipart_upload(
+                Bucket=self._bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={"Parts": self._parts},
+            )
+        return self._written
+
+    def abort(self):
+        try:
+            self._s3.abort_multipart_upload(
+                Bucket=self._bucket, Key=self.key, UploadId=self._upload_id
+            )
+        except ClientError as e:
+            log("Multipart abort failed", level="WARNING", key=self.key, error=repr(e))
 
-def generate_geojson_export(
-    filters_dict: Dict[str, Any],
-    compress: bool = False,
-    max_features: int = 200_000,
-) -> Tuple[str, str]:
-    filters = _normalize_filters(filters_dict)
-    params = _build_sql_params(filters, max_features=max_features)
-
-    print("=== generate_geojson_export params ===")
-    print(json.dumps(params, indent=2, default=str))
-
-    sql = """
-        SELECT landslide_v2.export_original_from_filters(
-            %s,  -- materials
-            %s,  -- movements
-            %s,  -- confidences
-            %s,  -- pga_min
-            %s,  -- pga_max
-            %s,  -- pgv_min
-            %s,  -- pgv_max
-            %s,  -- psa03_min
-            %s,  -- psa03_max
-            %s,  -- mmi_min
-            %s,  -- mmi_max
-            %s,  -- tol_pga
-            %s,  -- tol_pgv
-            %s,  -- tol_psa03
-            %s,  -- tol_mmi
-            %s,  -- rain_min
-            %s,  -- rain_max
-            %s,  -- tol_rain
-            CASE
-                WHEN %s::text IS NULL THEN NULL::geometry
-                ELSE ST_Transform(
-                    ST_SetSRID(
-                        ST_GeomFromGeoJSON(%s::text),
-                        4326
-                    ),
-                    3857
+
+def generate_columnar_export(
+    job_id: str,
+    fmt: str,
+    staged: int,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, str]:
+    """
+    Write the staged features of a job to S3 as GeoParquet or FlatGeobuf.
+
+    Unlike GeoJSON these files carry a footer / index covering every row,
+    so they are written in one go (no checkpoints, no partitions); a
+    re-delivered message simply re-stages and rewrites the file.
+    Returns {"key", "filename"}.
+    """
+    filename = export_filename(fmt)
+    sink = _MultipartSink(f"exports/{uuid4()}/{filename}", fmt)
+    log("generate_columnar_export", job_id=job_id, format=fmt, staged=staged)
+
+    try:
+        with get_db_conn() as conn, conn.cursor() as cur, span("export.stream"):
+            if fmt == "geoparquet":
+                write_geoparquet(
+                    cur, job_id, staged, sink,
+                    chunk_size=EXPORT_CHUNK_FEATURES,
+                    on_progress=on_progress,
                 )
-            END,
-            %s   -- max_features
-        ) AS feature;
-    """
-
-    selection_str = params["selection_geojson"]
-    args = (
-        params["materials"],
-        params["movements"],
-        params["confidences"],
-        params["pga_min"],
-        params["pga_max"],
-        params["pgv_min"],
-        params["pgv_max"],
-        params["psa03_min"],
-        params["psa03_max"],
-        params["mmi_min"],
-        params["mmi_max"],
-        params["tol_pga"],
-        params["tol_pgv"],
-        params["tol_psa03"],
-        params["tol_mmi"],
-        params["rain_min"],
-        params["rain_max"],
-        params["tol_rain"],
-        selection_str,   # %s::text in WHEN
-        selection_str,   # %s::text in ST_GeomFromGeoJSON
-        params["max_features"],
-    )
+            else:
+                write_flatgeobuf(cur, job_id, sink, read_bytes=EXPORT_PART_BYTES)
+            conn.commit()
+        size = sink.complete()
+    except Exception:
+        sink.abort()
+        raise
+
+    if on_progress:
+        on_progress(staged, size)
+
+    annotate(features=staged, bytes=size)
+    return {"key": sink.key, "filename": filename}
+
+
+# ---------- Parallel partitioned exports ----------
+
+def plan_partitions(staged: int) -> List[List[int]]:
+    """
+    Split staged seq 1..staged into contiguous [first, last] ranges of about
+    EXPORT_PARTITION_FEATURES rows, at most EXPORT_MAX_PARTITIONS of them.
+    """
+    count = min(EXPORT_MAX_PARTITIONS, -(-staged // EXPORT_PARTITION_FEATURES))
+    size = -(-staged // count)
+    return [
+        [first, min(first + size - 1, staged)]
+        for first in range(1, staged + 1, size)
+    ]
+
+
+def fan_out_export(
+    job_id: str,
+    staged: int,
+    compress: bool,
+    lane: str,
+    fmt: str = "geojson",
+    columns: Optional[List[str]] = None,
+):
+    """
+    Record the partition plan on the job item and enqueue one "download_part"
+    message per partition on this lane's queue, so every free worker of the
+    lane writes one part in parallel.
+    """
+    filename = export_filename(fmt, compress)
+    ranges = plan_partitions(staged)
+    partitions = {
+        "staged": staged,
+        "total": len(ranges),
+        "ranges": ranges,
+        "prefix": f"exports/{uuid4()}",
+        "filename": filename,
+        "format": fmt,
+        "compress": compress,
+        "columns": columns,
+    }
+    _update_job(job_id, partitions=partitions, partSizes={})
+
+    log("Fanning out export", job_id=job_id, partitions=len(ranges), lane=lane)
+    annotate(partitions=len(ranges))
+    for part in range(1, len(ranges) + 1):
+        with span("sqs.send"):
+            _client("sqs").send_message(
+                QueueUrl=JOB_QUEUE_URL,
+                MessageBody=json.dumps({
+                    "jobId": job_id,
+                    "jobType": "download_part",
+                    "lane": lane,
+                    "part": part,
+                }),
+            )
+
+
+def _partition_key(partitions: Dict[str, Any], part: int) -> str:
+    return f"{partitions['prefix']}/parts/{part:05d}"
+
+
+def write_partition(job_id: str, partitions: Dict[str, Any], part: int, compress: bool) -> int:
+    """
+    Write partition `part` (1-based) of a staged export to its own S3 object.
+
+    The objects are byte-exact slices of the final file: the first one has
+    the header (FeatureCollection opening / CSV header line), the last one
+    the footer. Returns the object size.
+    """
+    first, last = (int(v) for v in partitions["ranges"][part - 1])
+    total = int(partitions["total"])
+    columns = partitions.get("columns")
+    encoder = row_encoder(partitions.get("format") or "geojson", list(columns) if columns else None)
+
+    buf = _PartBuffer(compress)
+    if part == 1:
+        buf.write(encoder.header())
 
     with get_db_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, args)
-
-        tmp_dir = tempfile.mkdtemp()
-        geojson_path = os.path.join(tmp_dir, "landslides.geojson")
-
-        feature_count = 0
-        with open(geojson_path, "w", encoding="utf-8") as f:
-            f.write('{"type":"FeatureCollection","features":[')
-            first = True
-            for (feature,) in cur:
-                feature_count += 1
-                if not first:
-                    f.write(",")
-                else:
-                    first = False
-                json.dump(feature, f)
-            f.write("]}")
+        for rows in _iter_staged_chunks(cur, job_id, first - 1, last, encoder.select):
+            with span("export.stream"):
+                for seq, value in rows:
+                    buf.write(encoder.row(seq, value))
+
+    if part == total:
+        buf.write(encoder.footer())
+
+    body = buf.finish()
+    with span("s3.upload"):
+        _client("s3").put_object(
+            Bucket=_export_bucket(),
+            Key=_partition_key(partitions, part),
+            Body=body,
+        )
+    annotate(part=part, partitions=total, features=last - first + 1, bytes=len(body))
+    return len(body)
+
+
+def _mark_partition_done(job_id: str, part: int, size: int) -> Dict[str, Any]:
+    """
+    Atomically record a finished partition. partsDone is a number set, so a
+    re-delivered part message does not count twice. Returns the updated item.
+    """
+    with span("dynamo.update"):
+        resp = _jobs_table().update_item(
+            Key={"jobId": job_id},
+            UpdateExpression="ADD partsDone :part SET partSizes.#p = :size",
+            ExpressionAttributeNames={"#p": str(part)},
+            ExpressionAttributeValues={":part": {part}, ":size": size},
+            ReturnValues="ALL_NEW",
+        )
+    return resp["Attributes"]
+
+
+def _claim_assembly(job_id: str) -> bool:
+    """Only one worker may assemble the final object."""
+    try:
+        _jobs_table().update_item(
+            Key={"jobId": job_id},
+            UpdateExpression="SET assembling = :t",
+            ConditionExpression="attribute_not_exists(assembling)",
+            ExpressionAttributeValues={":t": True},
+        )
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def assemble_partitions(job_id: str, partitions: Dict[str, Any], part_sizes: Dict[str, Any]) -> str:
+    """
+    Stitch the partition objects into the final export with a multipart
+    upload. Partitions of at least 5 MiB are copied server side
+    (upload_part_copy); smaller ones are downloaded and merged with their
+    neighbours first, since S3 rejects non-final parts under 5 MiB.
+    Returns the final object key.
+    """
+    s3 = _client("s3")
+    bucket = _export_bucket()
+    filename = partitions["filename"]
+    key = f"{partitions['prefix']}/{filename}"
+    total = int(partitions["total"])
+    compress = partitions["compress"]
+
+    upload_id = s3.create_multipart_upload(
+        Bucket=bucket,
+        Key=key,
+        ContentType=export_content_type(partitions.get("format") or "geojson", compress),
+        ContentDisposition=f'attachment; filename="{filename}"',
+    )["UploadId"]
+
+    parts = []
+    pending = io.BytesIO()
+
+    def flush_pending():
+        resp = s3.upload_part(
+            Bucket=bucket, Key=key, UploadId=upload_id,
+            PartNumber=len(parts) + 1, Body=pending.getvalue(),
+        )
+        parts.append({"PartNumber": len(parts) + 1, "ETag": resp["ETag"]})
+        pending.seek(0)
+        pending.truncate()
+
+    try:
+        with span("s3.upload"):
+            for part in range(1, total + 1):
+                source_key = _partition_key(partitions, part)
+                size = int(part_sizes[str(part)])
+
+                if pending.tell() == 0 and size >= S3_MIN_PART_BYTES:
+                    resp = s3.upload_part_copy(
+                        Bucket=bucket, Key=key, UploadId=upload_id,
+                        PartNumber=len(parts) + 1,
+                        CopySource={"Bucket": bucket, "Key": source_key},
+                    )
+                    parts.append({
+                        "PartNumber": len(parts) + 1,
+                        "ETag": resp["CopyPartResult"]["ETag"],
+                    })
+                    continue
+
+                pending.write(s3.get_object(Bucket=bucket, Key=source_key)["Body"].read())
+                if pending.tell() >= S3_MIN_PART_BYTES:
+                    flush_pending()
+
+            if pending.tell():
+                flush_pending()
+
+            s3.complete_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+    except Exception:
+        s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+
+    s3.delete_objects(
+        Bucket=bucket,
+        Delete={"Objects": [
+            {"Key": _partition_key(partitions, part)} for part in range(1, total + 1)
+        ]},
+    )
+    annotate(partitions=total, s3_parts=len(parts))
+    return key
 
-    print(f"generate_geojson_export complete. feature_count={feature_count}")
-    print(f"GeoJSON path: {geojson_path}")
 
-    if not compress:
-        return geojson_path, "landslides.geojson"
+# ---------- Export progress ----------
 
-    zip_path = os.path.join(tmp_dir, "landslides.geojson.zip")
-    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-        zf.write(geojson_path, arcname="landslides.geojson")
+class ExportProgress:
+    """
+    Throttled progress publisher for a running export.
 
-    print(f"Zipped file path: {zip_path}")
-    return zip_path, "landslides.geojson.zip"
+    Writes job.progress = {features_written, bytes_written, total_features,
+    eta_seconds} when PROGRESS_INTERVAL_SECONDS have elapsed or
+    PROGRESS_EVERY_FEATURES new features were written since the last write,
+    so a 200k feature export costs a handful of DynamoDB writes.
+    """
 
+    def __init__(self, job_id: str, total_features: Optional[int] = None):
+        self.job_id = job_id
+        self.total_features = total_features
+        self.started = time.monotonic()
+        self.last_write = self.started
+        self.last_features = 0
+
+    def __call__(self, features_written: int, bytes_written: int):
+        now = time.monotonic()
+        if (
+            now - self.last_write < PROGRESS_INTERVAL_SECONDS
+            and features_written - self.last_features < PROGRESS_EVERY_FEATURES
+        ):
+            return
+
+        progress = {
+            "features_written": features_written,
+            "bytes_written": bytes_written,
+        }
+        if self.total_features:
+            progress["total_features"] = self.total_features
+            remaining = max(self.total_features - features_written, 0)
+            elapsed = now - self.started
+            if features_written and remaining:
+                progress["eta_seconds"] = int(elapsed / features_written * remaining) + 1
+            else:
+                progress["eta_seconds"] = 0
 
-# ---------- S3 helper ----------
+        _update_job(self.job_id, progress=progress)
+        self.last_write = now
+        self.last_features = features_written
 
-def upload_to_s3_and_presign(local_path: str, filename: str) -> Dict[str, str]:
+
+# ---------- Export admission control ----------
+
+def estimate_export(
+    filters: Filters,
+    compress: bool = False,
+    fmt: str = "geojson",
+) -> Dict[str, int]:
     """
-    Upload the file to S3 under exports/... and return:
-      - presigned_url: direct S3 URL (for dev / fallback)
-      - key: S3 object key (exports/...)
-      - cf_path: path to use behind CloudFront ("/exports/...")
+    Cheap pre-flight for a download: count the matching features and derive
+    the expected output size and export duration from per-feature averages.
     """
+    features = int(count_matching_filters(filters))
+    size = int(features * EXPORT_BYTES_PER_FEATURE * EXPORT_FORMAT_SIZE_RATIO[fmt])
+    if compress and fmt in LINE_FORMATS:
+        size = int(size * EXPORT_ZIP_RATIO)
+
+    return {
+        "features": features,
+        "bytes": size,
+        "seconds": features // EXPORT_FEATURES_PER_SECOND + 1,
+    }
+
+
+def export_feature_limit(fmt: str) -> int:
+    """The most features an export in `fmt` may have (FORMAT_MAX_FEATURES)."""
+    return min(EXPORT_MAX_FEATURES, FORMAT_MAX_FEATURES.get(fmt, EXPORT_MAX_FEATURES))
+
+
+def admit_export(estimate: Dict[str, int], lane: str, fmt: str = "geojson") -> str:
+    """
+    Decide what to do with a download given its estimate:
+      "reject" -> over export_feature_limit(fmt), never started
+      "defer"  -> over EXPORT_BULK_FEATURES, moved to the bulk lane
+      "run"    -> export it now
+    """
+    features = estimate["features"]
+    if features > export_feature_limit(fmt):
+        return "reject"
+    if features > EXPORT_BULK_FEATURES and lane != "bulk" and BULK_JOBS_QUEUE_URL:
+        return "defer"
+    return "run"
+
+
+def _defer_to_bulk_lane(job_id: str, job_type: str, **fields):
+    msg = {"jobId": job_id, "jobType": job_type, "lane": "bulk"}
+    log("Deferring job to bulk lane", job_id=job_id)
+    _release_job(job_id, status="QUEUED", lane="bulk", **fields)
+    with span("sqs.send"):
+        _client("sqs").send_message(
+            QueueUrl=BULK_JOBS_QUEUE_URL,
+            MessageBody=json.dumps(msg),
+        )
+
+
+# ---------- S3 helper ----------
+
+def _export_bucket() -> str:
     bucket = os.getenv("EXPORT_BUCKET")
     if not bucket:
         raise RuntimeError("EXPORT_BUCKET env var is not set")
+    return bucket
 
-    s3 = boto3.client("s3")
-    key = f"exports/{uuid4()}/{filename}"
-
-    print(f"Uploading {local_path} to s3://{bucket}/{key}")
-    s3.upload_file(local_path, bucket, key)
 
+def presign_export(key: str) -> Dict[str, str]:
+    """
+    Return for an uploaded export object:
+      - presigned_url: direct S3 URL (for dev / fallback)
+      - key: S3 object key (exports/...)
+      - cf_path: path to use behind CloudFront ("/exports/...")
+    """
+    s3 = _client("s3")
     presigned_url = s3.generate_presigned_url(
         "get_object",
-        Params={"Bucket": bucket, "Key": key},
+        Params={"Bucket": _export_bucket(), "Key": key},
         ExpiresIn=3600,
     )
-    print(f"Presigned S3 URL: {presigned_url}")
+    log("Presigned S3 URL", level="DEBUG", key=key)
 
     cf_path = f"/{key}"  # CloudFront behavior matches /exports/*
 
@@ -385,8 +830,49 @@ def upload_to_s3_and_presign(local_path: str, filename: str) -> Dict[str, str]:
     }
 
 
+def _finish_export(job_id: str, key: str, filename: str):
+    """Drop the staged rows and publish the download links on the job."""
+    drop_staged_export(job_id)
+    upload_info = presign_export(key)
+
+    _update_job(
+        job_id,
+        status="DONE",
+        result={
+            "filename": filename,
+            "url": upload_info["presigned_url"],
+            "cf_path": upload_info["cf_path"],
+            "key": upload_info["key"],
+        },
+    )
+
+
+def _schedule_continuation(job_id: str, job_type: str, lane: str):
+    """Re-enqueue a checkpointed job on this worker's lane queue."""
+    msg = {"jobId": job_id, "jobType": job_type, "lane": lane}
+    log("Scheduling continuation", job_id=job_id)
+    _release_job(job_id)
+    with span("sqs.send"):
+        _client("sqs").send_message(
+            QueueUrl=JOB_QUEUE_URL,
+            MessageBody=json.dumps(msg),
+        )
+
+
 # ---------- Worker helpers ----------
 
+def _set_expression(fields: Dict[str, Any], names: Dict[str, str], values: Dict[str, Any]) -> str:
+    # "SET #f0 = :v0, ..." for `fields`, filling in `names` / `values`.
+    # Attribute names always go through placeholders, so reserved words
+    # like 'status' are safe.
+    parts = []
+    for i, (attr, value) in enumerate(fields.items()):
+        names[f"#f{i}"] = attr
+        values[f":v{i}"] = value
+        parts.append(f"#f{i} = :v{i}")
+    return "SET " + ", ".join(parts)
+
+
 def _update_job(job_id: str, **fields):
     """
     Update one or more attributes on a job item in DynamoDB.
@@ -398,31 +884,87 @@ def _update_job(job_id: str, **fields):
     if not fields:
         return
 
-    print(f"Updating job {job_id} with: {fields}")
+    log("Updating job", level="DEBUG", job_id=job_id, fields=sorted(fields))
 
-    # Build a safe UpdateExpression that never uses raw attribute names,
-    # so we don't hit reserved-word issues like 'status'.
-    expr_names = {}
-    expr_values = {}
-    update_parts = []
+    expr_names: Dict[str, str] = {}
+    expr_values: Dict[str, Any] = {}
+    update_expr = _set_expression(fields, expr_names, expr_values)
 
-    for i, (attr, value) in enumerate(fields.items()):
-        name_placeholder = f"#f{i}"
-        value_placeholder = f":v{i}"
-
-        expr_names[name_placeholder] = attr
-        expr_values[value_placeholder] = value
-        update_parts.append(f"{name_placeholder} = {value_placeholder}")
+    with span("dynamo.update"):
+        _jobs_table().update_item(
+            Key={"jobId": job_id},
+            UpdateExpression=update_expr,
+            ExpressionAttributeNames=expr_names,
+            ExpressionAttributeValues=expr_values,
+        )
 
-    update_expr = "SET " + ", ".join(update_parts)
 
-    jobs_table.update_item(
-        Key={"jobId": job_id},
-        UpdateExpression=update_expr,
-        ExpressionAttributeNames=expr_names,
-        ExpressionAttributeValues=expr_values,
+def _claim_job(job_id: str, lease_seconds: int, **fields) -> bool:
+    """
+    Mark the job RUNNING (with `fields`) and lease it for `lease_seconds`,
+    in one conditional write: only a QUEUED job, or a RUNNING one whose
+    lease has expired or was handed back (continuations), can be claimed.
+    False when another worker holds it or it has finished.
+    """
+    now = int(time.time())
+    expr_names = {"#s": "status"}
+    expr_values: Dict[str, Any] = {":queued": "QUEUED", ":running": "RUNNING", ":now": now}
+    update_expr = _set_expression(
+        {**fields, "status": "RUNNING", "leaseUntil": now + lease_seconds},
+        expr_names,
+        expr_values,
     )
 
+    try:
+        with span("dynamo.update"):
+            _jobs_table().update_item(
+                Key={"jobId": job_id},
+                UpdateExpression=update_expr,
+                ConditionExpression=(
+                    "#s IN (:queued, :running)"
+                    " AND (attribute_not_exists(leaseUntil) OR leaseUntil < :now)"
+                ),
+                ExpressionAttributeNames=expr_names,
+                ExpressionAttributeValues=expr_values,
+            )
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def _release_job(job_id: str, **fields):
+    """Hand the job's lease back (the next message may claim it), setting `fields`."""
+    expr_names: Dict[str, str] = {}
+    expr_values: Dict[str, Any] = {}
+    update_expr = _set_expression(fields, expr_names, expr_values) if fields else ""
+
+    with span("dynamo.update"):
+        _jobs_table().update_item(
+            Key={"jobId": job_id},
+            UpdateExpression=f"{update_expr} REMOVE leaseUntil".strip(),
+            **({"ExpressionAttributeNames": expr_names} if expr_names else {}),
+            **({"ExpressionAttributeValues": expr_values} if expr_values else {}),
+        )
+
+
+def _store_query_plans(job_id: str):
+    """Put the plans captured while running the job on its item (see QUERY_PLANS_MAX_BYTES)."""
+    plans = collected_plans()
+    if not plans:
+        return
+    blob = zlib.compress(json.dumps(plans, default=str).encode("utf-8"))
+    if len(blob) > QUERY_PLANS_MAX_BYTES:
+        log("Query plans too large for the job item, not stored", level="WARNING", bytes=len(blob))
+        return
+    annotate(slow_plans=len(plans))
+    try:
+        _update_job(job_id, slowPlansZ=blob)
+    except ClientError as e:
+        # Diagnostics only: never fail (and so re-deliver) the job over them
+        log("Failed to store query plans", level="WARNING", error=str(e))
+
 
 # ---------- Lambda handler (SQS events) ----------
 
@@ -430,87 +972,251 @@ def lambda_handler(event, context):
     """
     Worker Lambda, triggered by SQS.
     Each record body is a JSON object with:
-      { "jobId": "...", "jobType": "count" | "download" }
+      { "jobId": "...", "jobType": "count" | "stats" | "download", "lane": "..." }
+    Download jobs carry "format" (geojson | geoparquet | flatgeobuf | csv) on
+    the item; csv jobs also "columns" and "centroid", the other formats an
+    optional "projection" ({properties, precision}).
+    or, for one partition of a parallel export:
+      { "jobId": "...", "jobType": "download_part", "lane": "...", "part": 3 }
     """
-    print("Worker event:", json.dumps(event))
-
-    for record in event.get("Records", []):
+    for message in event.get("Records", []):
         try:
-            body = json.loads(record["body"])
+            body = json.loads(message["body"])
         except Exception as e:
-            print("Failed to parse SQS body:", record.get("body"), "error:", repr(e))
+            log("Failed to parse SQS body", level="ERROR", error=repr(e))
             # Skip bad message, do not rethrow
             continue
 
         job_id = body.get("jobId")
         job_type = body.get("jobType")
+        lane = body.get("lane") or JOB_LANE
+
+        with trace("worker", job_type or "unknown", job_id=job_id, lane=lane):
+            # Time spent waiting in the lane queue (SentTimestamp is epoch ms)
+            sent_ts = (message.get("attributes") or {}).get("SentTimestamp")
+            queue_wait_ms = int(time.time() * 1000) - int(sent_ts) if sent_ts else None
+            if queue_wait_ms is not None:
+                record("queue.wait", queue_wait_ms)
+
+            if not job_id or not job_type:
+                log("Missing jobId or jobType in SQS message, skipping", level="WARNING")
+                continue
+
+            # Fetch job from DynamoDB
+            with span("dynamo.get"):
+                resp = _jobs_table().get_item(Key={"jobId": job_id})
+            job = resp.get("Item")
+            if not job:
+                log("Job not found in DynamoDB, skipping", level="WARNING")
+                continue
 
-        print(f"Processing jobId={job_id}, jobType={job_type}")
-
-        if not job_id or not job_type:
-            print("Missing jobId or jobType in SQS message, skipping.")
-            continue
-
-        # Fetch job from DynamoDB
-        resp = jobs_table.get_item(Key={"jobId": job_id})
-        job = resp.get("Item")
-        if not job:
-            print(f"Job {job_id} not found in DynamoDB, skipping.")
-            continue
-
-        filters = job.get("filters") or {}
-        # filters stored as JSON string or dict
-        if isinstance(filters, str):
             try:
-                filters = json.loads(filters)
-            except Exception:
-                print("Failed to decode filters JSON; using empty dict")
+                filters = job_filters(job)
+            except ValueError:
+                log("Failed to decode filters JSON; using empty dict", level="WARNING")
                 filters = {}
-
-        compress = bool(job.get("compress", False))
-
-        try:
-            _update_job(job_id, status="RUNNING")
-
-            if job_type == "count":
-                count = count_matching_filters(filters)
-                _update_job(
-                    job_id,
-                    status="DONE",
-                    result={"count": int(count)},
+            filters = Filters.from_dict(filters)
+
+            if job.get("status") in ("DONE", "ERROR"):
+                log("Job already finished, skipping re-delivered message", status=job["status"])
+                continue
+
+            compress = bool(job.get("compress", False))
+            export_format = job.get("format") or "geojson"
+            attributes = None
+            csv_columns = None
+            if export_format == "csv":
+                attributes = {
+                    "columns": normalize_attribute_columns(job.get("columns")),
+                    "centroid": bool(job.get("centroid", False)),
+                }
+                csv_columns = attributes["columns"] + (
+                    CENTROID_COLUMNS if attributes["centroid"] else []
                 )
-
-            elif job_type == "download":
-                file_path, filename = generate_geojson_export(
-                    filters, compress=compress
-                )
-                upload_info = upload_to_s3_and_presign(file_path, filename)
-
-                _update_job(
-                    job_id,
-                    status="DONE",
-                    result={
-                        "filename": filename,
-                        "url": upload_info["presigned_url"],
-                        "cf_path": upload_info["cf_path"],
-                        "key": upload_info["key"],
-                    },
-                )
-
-            else:
-                print(f"Unknown jobType={job_type}, marking ERROR.")
-                _update_job(
-                    job_id,
-                    status="ERROR",
-                    error=f"Unknown jobType {job_type}",
+            projection = None
+            if job.get("projection"):
+                projection = normalize_projection(
+                    job["projection"].get("properties"),
+                    job["projection"].get("precision"),
                 )
+            checkpoint = _load_checkpoint(job["checkpoint"]) if job.get("checkpoint") else None
 
-        except DatabaseError as e:
-            print(f"DatabaseError for job {job_id}: {e}")
-            _update_job(job_id, status="ERROR", error=f"Database error: {str(e)}")
-        except Exception as e:
-            print(f"Unhandled error for job {job_id}: {repr(e)}")
-            _update_job(job_id, status="ERROR", error=f"Internal error: {str(e)}")
+            start_collecting()
+            try:
+                if job_type != "download_part":
+                    running_fields = {"lane": lane}
+                    if queue_wait_ms is not None:
+                        running_fields["queueWaitMs"] = queue_wait_ms
+                    lease_seconds = (
+                        context.get_remaining_time_in_millis() // 1000
+                        if context is not None else JOB_LEASE_SECONDS
+                    )
+                    if not _claim_job(job_id, lease_seconds, **running_fields):
+                        log("Job is leased by another worker or finished, skipping message")
+                        continue
+
+                if job_type == "count":
+                    count = count_matching_filters(filters)
+                    _update_job(
+                        job_id,
+                        status="DONE",
+                        result={"count": int(count)},
+                    )
+
+                elif job_type == "stats":
+                    summary = summarize_matching_filters(filters)
+                    _update_job(
+                        job_id,
+                        status="DONE",
+                        # DynamoDB takes no floats
+                        result=json.loads(json.dumps(summary), parse_float=Decimal),
+                    )
+
+                elif job_type == "download":
+                    if job.get("partitions"):
+                        log("Job already fanned out, skipping re-delivered message")
+                        continue
+
+                    if checkpoint is None:
+                        export_format = normalize_export_format(export_format)
+                        # pyarrow comes from an optional layer (pyarrow_layer_arn):
+                        # fail before the pre-count and staging, not after them
+                        if export_format == "geoparquet" and not geoparquet_available():
+                            log("GeoParquet requested without pyarrow, marking ERROR", level="WARNING")
+                            _update_job(
+                                job_id,
+                                status="ERROR",
+                                error=(
+                                    "GeoParquet exports are not available on this deployment. "
+                                    "Please choose another format."
+                                ),
+                            )
+                            continue
+
+                        estimate = estimate_export(filters, compress=compress, fmt=export_format)
+                        decision = admit_export(estimate, lane, export_format)
+                        annotate(estimated_features=estimate["features"], decision=decision)
+
+                        if decision == "reject":
+                            _update_job(
+                                job_id,
+                                status="ERROR",
+                                estimate=estimate,
+                                error=(
+                                    f"Export of {estimate['features']:,} features exceeds the "
+                                    f"{export_feature_limit(export_format):,} feature limit "
+                                    f"of {export_format} exports. "
+                                    "Please narrow the filters or draw a smaller selection."
+                                ),
+                            )
+                            continue
+
+                        if decision == "defer":
+                            _defer_to_bulk_lane(job_id, job_type, estimate=estimate)
+                            continue
+                        _update_job(job_id, estimate=estimate)
+
+                        staged = stage_export(
+                            job_id,
+                            filters,
+                            max_features=EXPORT_MAX_FEATURES,
+                            attributes=attributes,
+                            projection=projection,
+                        )
+                        if export_format not in LINE_FORMATS:
+                            written = generate_columnar_export(
+                                job_id,
+                                export_format,
+                                staged,
+                                on_progress=ExportProgress(job_id, staged),
+                            )
+                            _finish_export(job_id, written["key"], written["filename"])
+                            continue
+
+                        if staged > EXPORT_PARALLEL_MIN_FEATURES and JOB_QUEUE_URL:
+                            fan_out_export(
+                                job_id, staged, compress, lane, export_format, csv_columns,
+                            )
+                            continue
+
+                        checkpoint = start_export_upload(
+                            job_id, staged, compress, export_format, csv_columns
+                        )
+                        _update_job(job_id, checkpoint=checkpoint)
+                    else:
+                        log("Resuming job from checkpoint", last_seq=checkpoint["last_seq"])
+
+                    def out_of_time() -> bool:
+                        return (
+                            context is not None
+                            and JOB_QUEUE_URL is not None
+                            and context.get_remaining_time_in_millis() < EXPORT_TIME_MARGIN_MS
+                        )
+
+                    complete = generate_chunked_export(
+                        job_id,
+                        checkpoint,
+                        compress=compress,
+                        out_of_time=out_of_time,
+                        on_progress=ExportProgress(job_id, checkpoint["staged"]),
+                    )
+                    if not complete:
+                        _schedule_continuation(job_id, job_type, lane)
+                        continue
+
+                    _finish_export(job_id, checkpoint["key"], checkpoint["filename"])
+
+                elif job_type == "download_part":
+                    partitions = job["partitions"]
+                    part = int(body["part"])
+                    size = write_partition(job_id, partitions, part, compress)
+
+                    item = _mark_partition_done(job_id, part, size)
+                    done_parts = {int(p) for p in item.get("partsDone", set())}
+                    total = int(partitions["total"])
+                    _update_job(
+                        job_id,
+                        progress={
+                            "features_written": sum(
+                                int(last) - int(first) + 1
+                                for i, (first, last) in enumerate(partitions["ranges"], start=1)
+                                if i in done_parts
+                            ),
+                            "total_features": int(partitions["staged"]),
+                            "parts_done": len(done_parts),
+                            "parts_total": total,
+                        },
+                    )
+
+                    if len(done_parts) == total and _claim_assembly(job_id):
+                        key = assemble_partitions(job_id, partitions, item["partSizes"])
+                        _finish_export(job_id, key, partitions["filename"])
 
-    # Let Lambda succeed (no rethrow) so SQS doesn't retry failed jobs indefinitely
+                else:
+                    log("Unknown jobType, marking ERROR", level="ERROR")
+                    fail("UnknownJobType")
+                    _update_job(
+                        job_id,
+                        status="ERROR",
+                        error=f"Unknown jobType {job_type}",
+                    )
+
+            except DatabaseError as e:
+                log("DatabaseError", level="ERROR", error=str(e))
+                fail("DatabaseError")
+                _update_job(job_id, status="ERROR", error=f"Database error: {str(e)}")
+                if job_type in ("download", "download_part"):
+                    abort_export(job_id, checkpoint)
+            except Exception as e:
+                log("Unhandled error", level="ERROR", error=repr(e))
+                fail(type(e).__name__)
+                _update_job(job_id, status="ERROR", error=f"Internal error: {str(e)}")
+                if job_type in ("download", "download_part"):
+                    abort_export(job_id, checkpoint)
+            finally:
+                _store_query_plans(job_id)
+
+    # Let Lambda succeed (no rethrow) so SQS doesn't retry failed jobs indefinitely.
+    # Exports that hit the Lambda timeout never get here: SQS re-delivers the
+    # message and the job resumes from its checkpoint.
     return {"ok": True}
\ No newline at end of file
@@ -42,12 +42,14 @@ function delay(ms) {
  * @param {AbortSignal} [options.signal]
  * @param {number} [options.intervalMs]
  * @param {number} [options.maxDurationMs]
+ * @param {function(object):void} [options.onProgress] - called with job.progress while RUNNING
  * @returns {Promise<object>} full job object from the API
  */
 async function pollJob(basePath, jobId, {
     signal,
     intervalMs = 2000,
     maxDurationMs = 5 * 60 * 1000,
+    onProgress,
 } = {}) {
     const start = Date.now();
 
@@ -78,6 +80,10 @@ async function pollJob(basePath, jobId, {
         }
 
         // QUEUED / RUNNING
+        if (onProgress && job.progress) {
+            onProgress(job.progress);
+        }
+
         const elapsed = Date.now() - start;
         if (elapsed > maxDurationMs) {
             throw new Error('Timed out waiting for job to complete.');
@@ -87,6 +93,14 @@ async function pollJob(basePath, jobId, {
     }
 }
 
+// File extension per export format (fallback when the job has no filename)
+const FORMAT_EXTENSIONS = {
+    geojson: 'geojson',
+    geoparquet: 'parquet',
+    flatgeobuf: 'fgb',
+    csv: 'csv',
+};
+
 /**
  * Call the backend /download endpoint with the given filters.
  *
@@ -98,12 +112,26 @@ async function pollJob(basePath, jobId, {
  *
  * @param {object} filters
  * @param {object} options
- * @param {boolean} [options.compress=false]
+ * @param {boolean} [options.compress=false] - gzip the file (GeoJSON only)
+ * @param {'geojson'|'geoparquet'|'flatgeobuf'|'csv'} [options.format='geojson']
+ * @param {boolean} [options.centroid=false] - csv only: add centroid lon/lat columns
+ * @param {string[]} [options.properties] - property allowlist (other formats)
+ * @param {number} [options.precision] - coordinate decimal places (other formats)
  * @param {AbortSignal} [options.signal] - optional abort signal for polling
+ * @param {function(object):void} [options.onProgress] - export progress callback
+ *        ({features_written, bytes_written, total_features, eta_seconds})
  */
 export async function requestDownload(
     filters,
-    { compress = false, signal } = {},
+    {
+        compress = false,
+        format = 'geojson',
+        centroid = false,
+        properties,
+        precision,
+        signal,
+        onProgress,
+    } = {},
 ) {
     if (!filters || typeof filters !== 'object') {
         throw new Error('Invalid filters object passed to requestDownload.');
@@ -112,7 +140,14 @@ export async function requestDownload(
     const payload = {
         filters,
         compress,
+        format,
     };
+    if (format === 'csv') {
+        payload.centroid = centroid;
+    } else {
+        if (properties?.length) payload.properties = properties;
+        if (Number.isInteger(precision)) payload.precision = precision;
+    }
 
     // Step 1: create the job
     const res = await fetch(`${API_BASE}/download`, {
@@ -137,14 +172,16 @@ export async function requestDownload(
         signal,
         intervalMs: 5000,
         maxDurationMs: 12 * 60 * 1000,
+        onProgress,
     });
 
     // Worker stores result under job.result
     const result = job.result || {};
     const cfPath = result.cf_path;
     const url = result.url;
+    const gz = (format === 'geojson' || format === 'csv') && compress ? '.gz' : '';
     const filename =
-        result.filename || (compress ? 'landslides.geojson.zip' : 'landslides.geojson');
+        result.filename || `landslides.${FORMAT_EXTENSIONS[format] || 'geojson'}${gz}`;
 
     if (!cfPath && !url) {
         throw new Error('Download job completed but no URL was returned.');
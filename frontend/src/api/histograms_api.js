@@ -0,0 +1,26 @@
+import { canonicalFilterQuery } from '../filter-panel/filterQuery.js';
+
+// Slider histograms per categorical filter. They only change with the data,
+// so they are kept for the page's lifetime; CloudFront caches them too.
+const _cache = new Map(); // canonical query -> Promise
+
+/**
+ * Histograms of the numeric attributes for the categorical filters:
+ * { pga: { lo, hi, counts: [...] }, pgv: ..., psa03: ..., mmi: ..., rain: ... }.
+ */
+export function fetchAttributeHistograms({ baseUrl = '', materials = [], movements = [], confidences = [] } = {}) {
+    // Same canonical list encoding as the tile URLs, so equal filters share one cache entry
+    const query = canonicalFilterQuery({ materials, movements, confidences });
+
+    if (!_cache.has(query)) {
+        const url = `${baseUrl}/api/histograms${query ? `?${query}` : ''}`;
+        const request = fetch(url).then((resp) => {
+            if (!resp.ok) throw new Error(`GET /api/histograms failed: ${resp.status}`);
+            return resp.json();
+        });
+        // a failed request is retried next time
+        request.catch(() => _cache.delete(query));
+        _cache.set(query, request);
+    }
+    return _cache.get(query);
+}
@@ -1,6 +1,9 @@
 import { requestDownload, requestCount } from '../api/download_api.js';
 import { getCurrentFilterSummary } from '../filter-panel/filterState.js';
 
+// Must match EXPORT_MAX_FEATURES on the worker: bigger exports are rejected up front
+const MAX_EXPORT_FEATURES = 200_000;
+
 /**
  * Convert filter summary → backend Filters model
  */
@@ -159,6 +162,23 @@ export function initDownloadPanel({ container }) {
     const modalNoteEl  = document.getElementById('downloadConfirmNote');
     const modalConfirm = document.getElementById('downloadConfirmBtn');
     const modalCompress = document.getElementById('downloadCompressModal');
+    const modalFormat = document.getElementById('downloadFormatModal');
+    const modalCentroid = document.getElementById('downloadCentroidModal');
+    const modalCentroidWrap = document.getElementById('downloadCentroidWrap');
+    const modalPrecision = document.getElementById('downloadPrecisionModal');
+    const modalPrecisionWrap = document.getElementById('downloadPrecisionWrap');
+
+    // Columnar formats are compressed internally; .gz only applies to line
+    // formats (GeoJSON, CSV). Centroid columns only exist for CSV.
+    if (modalFormat && modalCompress && !modalFormat._bound) {
+        modalFormat.addEventListener('change', () => {
+            const isLine = modalFormat.value === 'geojson' || modalFormat.value === 'csv';
+            modalCompress.disabled = !isLine;
+            modalCentroidWrap?.classList.toggle('d-none', modalFormat.value !== 'csv');
+            modalPrecisionWrap?.classList.toggle('d-none', modalFormat.value === 'csv');
+        });
+        modalFormat._bound = true;
+    }
 
     let modal = null;
     if (modalEl && window.bootstrap?.Modal) {
@@ -187,10 +207,17 @@ export function initDownloadPanel({ container }) {
                 btnDisabled: true,
                 btnText: 'Download'
             },
+            tooLarge: {
+                count: data.count?.toLocaleString('en-US'),
+                note: `This selection exceeds the ${MAX_EXPORT_FEATURES.toLocaleString('en-US')} feature export limit. Please narrow the filters or draw a smaller selection.`,
+                noteClass: 'text-danger',
+                btnDisabled: true,
+                btnText: 'Download'
+            },
             ready: {
                 count: data.count?.toLocaleString('en-US'),
                 note: data.count > 100_000
-                    ? 'Warning: this is a large download and may take some time to prepare. We advise you to download the .zip version'
+                    ? 'Warning: this is a large download and may take some time to prepare. We advise you to download the compressed (.gz) version'
                     : 'Large downloads may take some time to prepare.',
                 noteClass: data.count > 100_000 ? 'text-danger' : 'text-muted',
                 btnDisabled: false,
@@ -226,14 +253,31 @@ export function initDownloadPanel({ container }) {
     };
 
     // ---- Extract download logic ----
-    const performDownload = async (backendFilters, compress) => {
+    const performDownload = async (backendFilters, { compress, format, centroid, precision }) => {
         setModalState('downloading');
         setStatus('Preparing file…', 'muted');
         button.disabled = true;
         button.textContent = 'Downloading…';
 
+        const onProgress = (progress) => {
+            const written = progress.features_written ?? 0;
+            const total = progress.total_features;
+            let msg = total
+                ? `Preparing file… ${written.toLocaleString('en-US')} / ${total.toLocaleString('en-US')} features`
+                : `Preparing file… ${written.toLocaleString('en-US')} features`;
+            if (progress.eta_seconds) msg += ` (~${progress.eta_seconds}s left)`;
+            setStatus(msg, 'muted');
+            modalNoteEl.textContent = msg;
+        };
+
         try {
-            await requestDownload(backendFilters, { compress });
+            await requestDownload(backendFilters, {
+                compress,
+                format,
+                centroid,
+                precision,
+                onProgress,
+            });
 
             setStatus('Download started.', 'success');
             modalNoteEl.textContent = 'Download started. You can close this window when the file appears.';
@@ -265,9 +309,13 @@ export function initDownloadPanel({ container }) {
             if (!pendingFilters) return;
 
             modalConfirm.dataset.mode = 'downloading';
-            const compress = modalCompress?.checked ?? false;
+            const format = modalFormat?.value || 'geojson';
+            const isLine = format === 'geojson' || format === 'csv';
+            const compress = isLine && (modalCompress?.checked ?? false);
+            const centroid = format === 'csv' && (modalCentroid?.checked ?? false);
+            const precision = modalPrecision?.value ? Number(modalPrecision.value) : undefined;
 
-            await performDownload(pendingFilters, compress);
+            await performDownload(pendingFilters, { compress, format, centroid, precision });
         });
         modalConfirm._bound = true;
     }
@@ -322,7 +370,7 @@ export function initDownloadPanel({ container }) {
 
         try {
             const count = await requestCount(backendFilters);
-            setModalState('ready', { count });
+            setModalState(count > MAX_EXPORT_FEATURES ? 'tooLarge' : 'ready', { count });
             setStatus('', 'muted');
         } catch (err) {
             console.error('[downloadPanel] count error', err);
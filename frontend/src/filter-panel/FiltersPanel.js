@@ -5,7 +5,8 @@ export class FiltersPanel {
      *   categorical: Record<string,{label:string, options:string[]}>,
      *   numeric: Record<string,{label:string,min:number,max:number,step:number,initialMin?:number,initialMax?:number}>,
      *   onApply: (filters)=>void,
-     *   onReset?: ()=>void
+     *   onReset?: ()=>void,
+     *   onCategoricalChange?: (categorical)=>void
      * }} config
      */
     constructor(mountEl, config) {
@@ -179,6 +180,11 @@ export class FiltersPanel {
             group.appendChild(grid);
             section.appendChild(group);
         }
+
+        // the slider histograms follow the ticked categories (before Apply)
+        section.addEventListener('change', () => {
+            this.config.onCategoricalChange?.(this.getFilters().categorical);
+        });
         return section;
     }
 
@@ -195,6 +201,7 @@ export class FiltersPanel {
             group.dataset.key = key;
             group.innerHTML = `
 <div class="form-label filter-numeric-label">${this._makeLabelHTML(label, cfg.help)}</div>
+               <div class="ls-hist" aria-hidden="true"></div>
                <div id="ns_${key}" class="mb-2 slider-round"></div>
         <div class="row gx-2">
           <div class="col">
@@ -229,6 +236,7 @@ export class FiltersPanel {
                 const [lo, hi] = vals.map(parseFloat);
                 numMin.value = lo.toFixed(decimals);
                 numMax.value = hi.toFixed(decimals);
+                this._paintHistogram(key);
             });
 
             const syncFromBoxes = () => {
@@ -239,12 +247,50 @@ export class FiltersPanel {
             numMin.addEventListener('change', syncFromBoxes);
             numMax.addEventListener('change', syncFromBoxes);
 
-            this._noUi[key] = {slider, cfg, numMin, numMax};
+            const histEl = group.querySelector('.ls-hist');
+            this._noUi[key] = {slider, cfg, numMin, numMax, histEl};
         }
 
         return section;
     }
 
+    // Bars of the precomputed histogram (see setHistograms)
+    _renderHistogram(key) {
+        const entry = this._noUi?.[key];
+        const hist = this._histograms?.[key];
+        if (!entry) return;
+        entry.histEl.innerHTML = '';
+        if (!hist?.counts?.length) return;
+
+        const max = Math.max(...hist.counts);
+        for (const n of hist.counts) {
+            const bar = document.createElement('span');
+            bar.style.height = max ? `${(n / max) * 100}%` : '0';
+            if (n) bar.style.minHeight = '1px';
+            entry.histEl.appendChild(bar);
+        }
+        this._paintHistogram(key);
+    }
+
+    // Highlight the bins inside the slider range and show how many
+    // landslides they hold - no request, the counts are all local
+    _paintHistogram(key) {
+        const entry = this._noUi?.[key];
+        const hist = this._histograms?.[key];
+        if (!entry || !hist?.counts?.length || !entry.histEl.children.length) return;
+
+        const [lo, hi] = entry.slider.get().map(parseFloat);
+        const width = (hist.hi - hist.lo) / hist.counts.length;
+        let inRange = 0;
+        hist.counts.forEach((n, i) => {
+            const center = hist.lo + (i + 0.5) * width;
+            const inside = center >= lo && center <= hi;
+            if (inside) inRange += n;
+            entry.histEl.children[i].classList.toggle('is-out', !inside);
+        });
+        entry.histEl.title = `≈ ${inRange.toLocaleString('en-US')} landslides in range`;
+    }
+
     // ---- Public API ----
 
     /** Collapse all accordion sections */
@@ -271,6 +317,15 @@ export class FiltersPanel {
         }
     }
 
+    /**
+     * Show the attribute distributions above the sliders:
+     * {pga: {lo, hi, counts: [...]}, ...} as served by /api/histograms.
+     */
+    setHistograms(histograms) {
+        this._histograms = histograms || {};
+        for (const key of Object.keys(this._noUi || {})) this._renderHistogram(key);
+    }
+
     getFilters() {
         const out = {categorical: {}, numeric: {}};
 
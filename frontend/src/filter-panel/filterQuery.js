@@ -0,0 +1,74 @@
+// filterQuery.js
+// Canonical filter -> query string encoding for tile URLs.
+//
+// Equivalent filters must produce byte-identical query strings, otherwise
+// CloudFront caches the same tile under several keys. Rules:
+//   - keys sorted; unknown keys dropped
+//   - list values trimmed, de-duplicated, sorted, joined with ','
+//   - numbers rounded to NUMERIC_DECIMALS, no trailing zeros
+//   - empty / null values dropped, tol_<key> only with a <key>_min/_max
+//     and only when non-zero
+//
+// Mirrored by landslide_core/filter_query.py - keep the two in sync.
+
+const NUMERIC_DECIMALS = 4;
+
+const LIST_KEYS = ['materials', 'movements', 'confidences'];
+const RANGE_KEYS = ['pga', 'pgv', 'psa03', 'mmi', 'rain'];
+// Not filters, but part of the tile cache key (cluster/raw, data version)
+const EXTRA_KEYS = ['mode', 'v'];
+
+// Bump VITE_TILE_VERSION after reloading the data to miss old cached tiles
+const TILE_VERSION = import.meta.env.VITE_TILE_VERSION ?? '';
+
+function canonicalList(value) {
+    const items = Array.isArray(value) ? value : String(value ?? '').split(',');
+    const out = new Set();
+    for (const item of items) {
+        const s = String(item ?? '').trim();
+        if (s) out.add(s);
+    }
+    return Array.from(out).sort().join(',');
+}
+
+function canonicalNumber(value) {
+    if (value == null || value === '') return null;
+    const x = Number(value);
+    if (!Number.isFinite(x)) return null;
+    const scale = 10 ** NUMERIC_DECIMALS;
+    const r = Math.round(x * scale) / scale;
+    return String(r === 0 ? 0 : r);   // no "-0"
+}
+
+/**
+ * Canonical query string for flat filters in the API shape
+ * ({materials: [...], pga_min, pga_max, tol_pga, ..., mode}).
+ */
+export function canonicalFilterQuery(params = {}) {
+    const out = {};
+
+    for (const key of LIST_KEYS) {
+        const v = canonicalList(params[key]);
+        if (v) out[key] = v;
+    }
+
+    for (const key of RANGE_KEYS) {
+        const min = canonicalNumber(params[`${key}_min`]);
+        const max = canonicalNumber(params[`${key}_max`]);
+        if (min != null) out[`${key}_min`] = min;
+        if (max != null) out[`${key}_max`] = max;
+        if (min == null && max == null) continue;
+        const tol = canonicalNumber(params[`tol_${key}`]);
+        if (tol != null && tol !== '0') out[`tol_${key}`] = tol;
+    }
+
+    for (const key of EXTRA_KEYS) {
+        const v = String(params[key] ?? '').trim();
+        if (v) out[key] = v;
+    }
+    if (!out.v && TILE_VERSION) out.v = TILE_VERSION;
+
+    const qp = new URLSearchParams();
+    for (const key of Object.keys(out).sort()) qp.set(key, out[key]);
+    return qp.toString();
+}
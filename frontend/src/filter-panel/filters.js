@@ -1,5 +1,6 @@
 // filters.js
-import {MARTIN_URL, sourceNames} from '../maplibre/config.js';
+import {MARTIN_URL, sourceNames, tileSources} from '../maplibre/config.js';
+import {canonicalFilterQuery} from './filterQuery.js';
 
 let _currentFiltersForSummary = null;
 
@@ -71,32 +72,25 @@ function collectCategorical(groupCfg, selected) {
     return Array.from(new Set(out));
 }
 
-function buildQueryFromFiltersObject(filtersObj) {
-    const qp = new URLSearchParams();
+function filterParamsFromObject(filtersObj) {
+    const params = {};
 
     // categorical
     const cat = filtersObj?.categorical || {};
-    if (cat.material?.length) qp.set('materials', cat.material.join(','));
-    if (cat.movement?.length) qp.set('movements', cat.movement.join(','));
-    if (cat.confidence?.length) qp.set('confidences', cat.confidence.join(','));
+    params.materials = cat.material ?? [];
+    params.movements = cat.movement ?? [];
+    params.confidences = cat.confidence ?? [];
 
     // numeric
     const num = filtersObj?.numeric || {};
-    const push = (key) => {
-        if (!num[key]) return;
+    for (const key of ['pga', 'pgv', 'psa03', 'mmi', 'rain']) {
+        if (!num[key]) continue;
         const {min, max, tol} = num[key];
-        if (min != null) qp.set(`${key}_min`, String(min));
-        if (max != null) qp.set(`${key}_max`, String(max));
-        if (tol != null) qp.set(`tol_${key}`, String(tol));
-    };
-    push('pga');
-    push('pgv');
-    push('psa03');
-    push('mmi');
-    push('rain');
-
-    qp.set('ts', Date.now().toString());
-    return qp.toString();
+        params[`${key}_min`] = min;
+        params[`${key}_max`] = max;
+        params[`tol_${key}`] = tol;
+    }
+    return params;
 }
 
 function showMapLoading() {
@@ -108,18 +102,16 @@ function hideMapLoading() {
 }
 
 export function applyLandslideFiltersFromObject(map, filtersObj) {
-    const qp = buildQueryFromFiltersObject(filtersObj);
+    const params = filterParamsFromObject(filtersObj);
+    // Canonical (cacheable) query per mode: mode is one of the sorted keys
+    const qp = (mode) => canonicalFilterQuery({...params, mode});
 
     showMapLoading();
 
-    setSourceTilesSafe(map, 'polys_cluster',
-        `${MARTIN_URL}/${sourceNames.polysFn}/{z}/{x}/{y}?mode=cluster&${qp}`);
-    setSourceTilesSafe(map, 'polys_raw',
-        `${MARTIN_URL}/${sourceNames.polysFn}/{z}/{x}/{y}?mode=raw&${qp}`);
-    setSourceTilesSafe(map, 'points_cluster',
-        `${MARTIN_URL}/${sourceNames.pointsFn}/{z}/{x}/{y}?mode=cluster&${qp}`);
-    setSourceTilesSafe(map, 'points_raw',
-        `${MARTIN_URL}/${sourceNames.pointsFn}/{z}/{x}/{y}?mode=raw&${qp}`);
+    setSourceTilesSafe(map, tileSources.cluster,
+        `${MARTIN_URL}/${sourceNames.landslidesFn}/{z}/{x}/{y}?${qp('cluster')}`);
+    setSourceTilesSafe(map, tileSources.raw,
+        `${MARTIN_URL}/${sourceNames.landslidesFn}/{z}/{x}/{y}?${qp('raw')}`);
 
 
     let done = false;
@@ -136,16 +128,13 @@ export function applyLandslideFiltersFromObject(map, filtersObj) {
 // ---- public API ----
 export function buildFilterQuery() {
     const cfg = safeCfg();
-    const qp = new URLSearchParams();
+    const params = {};
 
     // categorical
     const c = cfg.categorical;
-    const materials = collectCategorical(c.material, getSelectedValues(c.material?.elementId));
-    const movements = collectCategorical(c.movement, getSelectedValues(c.movement?.elementId));
-    const confidences = collectCategorical(c.confidence, getSelectedValues(c.confidence?.elementId));
-    if (materials.length) qp.set('materials', materials.join(','));
-    if (movements.length) qp.set('movements', movements.join(','));
-    if (confidences.length) qp.set('confidences', confidences.join(','));
+    params.materials = collectCategorical(c.material, getSelectedValues(c.material?.elementId));
+    params.movements = collectCategorical(c.movement, getSelectedValues(c.movement?.elementId));
+    params.confidences = collectCategorical(c.confidence, getSelectedValues(c.confidence?.elementId));
 
     // numeric
     const n = cfg.numericRanges;
@@ -155,9 +144,9 @@ export function buildFilterQuery() {
         const r = getRange(groupCfg.elementId);
         if (!r) return;
         const [minV, maxV] = r;
-        if (minV != null) qp.set(`${key}_min`, String(minV));
-        if (maxV != null) qp.set(`${key}_max`, String(maxV));
-        if (groupCfg.tolerance != null) qp.set(`tol_${key}`, String(groupCfg.tolerance));
+        params[`${key}_min`] = minV;
+        params[`${key}_max`] = maxV;
+        params[`tol_${key}`] = groupCfg.tolerance;
     }
 
     pushRange('pga', n?.pga);
@@ -166,9 +155,8 @@ export function buildFilterQuery() {
     pushRange('mmi', n?.mmi);
     pushRange('rain', n?.rain);
 
-    // cache-buster
-    qp.set('ts', Date.now().toString());
-    return qp.toString();
+    // No cache-buster: equivalent filters must map to the same cached tiles
+    return canonicalFilterQuery(params);
 }
 
 function whenStyleLoaded(map) {
@@ -10,6 +10,8 @@ import { initDownloadPanel } from './download/downloadPanel.js';
 import { initLegend } from "./legend/legend.js";
 import {setCurrentFilterSummary} from "./filter-panel/filterState.js";
 import {styleIds} from "./maplibre/config.js";
+import { fetchAttributeHistograms } from './api/histograms_api.js';
+import { initViewportCount } from './maplibre/viewportCount.js';
 
 // ---- defaults ----
 const DEFAULT_NUMERIC_BOUNDS = {
@@ -91,6 +93,22 @@ function toMartinFilters(panelFilters, lfc) {
 }
 
 let filtersPanel;
+let histogramsRequest = 0;
+
+// Slider histograms for the ticked categories (cached per combination)
+function loadHistograms(categorical = {}) {
+    const request = ++histogramsRequest;
+    fetchAttributeHistograms({
+        materials: categorical.material ?? [],
+        movements: categorical.movement ?? [],
+        confidences: categorical.confidence ?? []
+    })
+        .then((histograms) => {
+            // a quicker answer for later ticks must not be overwritten
+            if (request === histogramsRequest) filtersPanel?.setHistograms(histograms);
+        })
+        .catch((e) => console.warn('[histograms]', e));
+}
 
 function initFiltersPanel(map) {
     const lfc = window.LandslideFilterConfig;
@@ -109,8 +127,11 @@ function initFiltersPanel(map) {
         },
         onReset: () => {
             currentMartinFilters = null;
-        }
+            loadHistograms();
+        },
+        onCategoricalChange: loadHistograms
     });
+    loadHistograms();
 }
 
 // Close accordions on landslide select:
@@ -216,6 +237,8 @@ map.once('load', () => {
         container: 'download-panel'
     });
 
+    initViewportCount(map, document.getElementById("inview-count"));
+
     // ---- coordinate display ----
     const coordBox = document.getElementById("coord-box");
 
@@ -8,8 +8,15 @@ export const INITIAL_VIEW = { center: [-123.0, 44.0], zoom: 6 };
 
 // Endpoints (functions for clusters, tables for raw)
 export const sourceNames = {
-    polysFn:  'ls_polygons_q',  // <-- NEW: unified polygons endpoint
-    pointsFn: 'ls_points_q',    // <-- NEW: unified points endpoint
+    // ls_points_q + ls_polygons_q in one tile (sql/tiles_combined.sql),
+    // i.e. one request per tile position instead of one per geometry type
+    landslidesFn: 'ls_landslides_q',
+};
+
+// MapLibre source ids (each carries both the points and the polygons layer)
+export const tileSources = {
+    cluster: 'landslides_cluster',
+    raw:     'landslides_raw'
 };
 
 // Vector layer ids *inside* the tiles (MVT layer names)
@@ -21,7 +28,9 @@ export const sourceLayers = {
     points: {
         cluster: 'ls_points_cluster',
         raw: 'ls_points_raw'
-    }
+    },
+    // totals of a coded cluster tile (counts in view, see viewportCount.js)
+    summary: 'ls_tile_summary'
 };
 
 // MapLibre style layer ids
@@ -39,9 +48,11 @@ export const styleIds = {
     pointsLabel:        'points-label'
 };
 
-// Zoom thresholds (clusters < Z, raw ≥ Z)
-export const Z_RAW_POLYS  = 9;
-export const Z_RAW_POINTS = 9;
+// Zoom thresholds (clusters < Z, raw ≥ Z); one threshold since points and
+// polygons share their tile sources
+export const Z_RAW = 9;
+export const Z_RAW_POLYS  = Z_RAW;
+export const Z_RAW_POINTS = Z_RAW;
 
 export const CFM_URLS = [
     'https://raw.githubusercontent.com/cascadiaquakes/CRESCENT-CFM/main/crescent_cfm_files/crescent_cfm_crustal_traces.geojson',
@@ -1,34 +1,25 @@
 import {
-    MARTIN_URL, sourceNames, sourceLayers, styleIds,
-    Z_RAW_POLYS, Z_RAW_POINTS
+    MARTIN_URL, sourceNames, sourceLayers, styleIds, tileSources,
+    Z_RAW, Z_RAW_POLYS, Z_RAW_POINTS
 } from './config.js';
+import {canonicalFilterQuery} from '../filter-panel/filterQuery.js';
 
 export function addVectorSources(style) {
-    // POLYGON CLUSTERS (function)
-    style.sources.polys_cluster = {
-        type: 'vector',
-        tiles: [`${MARTIN_URL}/${sourceNames.polysFn}/{z}/{x}/{y}?mode=cluster`],
-        minzoom: 0, maxzoom: Z_RAW_POLYS
-    };
-    // RAW POLYGONS (table)
-    style.sources.polys_raw = {
-        type: 'vector',
-        tiles: [`${MARTIN_URL}/${sourceNames.polysFn}/{z}/{x}/{y}?mode=raw`],
-        minzoom: Z_RAW_POLYS, maxzoom: 22,
-        promoteId: 'viewer_id'
-    };
+    // Points + polygons per tile (one Martin request per tile position)
+    const url = (mode) =>
+        `${MARTIN_URL}/${sourceNames.landslidesFn}/{z}/{x}/{y}?${canonicalFilterQuery({mode})}`;
 
-    // POINTS CLUSTERS (function)
-    style.sources.points_cluster = {
+    // CLUSTERS (ls_points_cluster + ls_polygons_cluster)
+    style.sources[tileSources.cluster] = {
         type: 'vector',
-        tiles: [`${MARTIN_URL}/${sourceNames.pointsFn}/{z}/{x}/{y}?mode=cluster`],
-        minzoom: 0, maxzoom: Z_RAW_POINTS
+        tiles: [url('cluster')],
+        minzoom: 0, maxzoom: Z_RAW
     };
-    // RAW POINTS (table)
-    style.sources.points_raw = {
+    // RAW FEATURES (ls_points_raw + ls_polygons_raw)
+    style.sources[tileSources.raw] = {
         type: 'vector',
-        tiles: [`${MARTIN_URL}/${sourceNames.pointsFn}/{z}/{x}/{y}?mode=raw`],
-        minzoom: Z_RAW_POINTS, maxzoom: 22,
+        tiles: [url('raw')],
+        minzoom: Z_RAW, maxzoom: 22,
         promoteId: 'viewer_id'
     };
 }
@@ -56,7 +47,7 @@ export function addPolygonLayers(style) {
     style.layers.push({
         id: styleIds.polysCluster,
         type: 'circle',
-        source: 'polys_cluster',
+        source: tileSources.cluster,
         'source-layer': sourceLayers.polys.cluster,
         minzoom: 0, maxzoom: Z_RAW_POLYS,
         paint: {
@@ -72,7 +63,7 @@ export function addPolygonLayers(style) {
     style.layers.push({
         id: styleIds.polysClusterCount,
         type: 'symbol',
-        source: 'polys_cluster',
+        source: tileSources.cluster,
         'source-layer': sourceLayers.polys.cluster,
         minzoom: 0, maxzoom: Z_RAW_POLYS,
         layout: {
@@ -93,7 +84,7 @@ export function addPolygonLayers(style) {
         {
             id: styleIds.polysFill,
             type: 'fill',
-            source: 'polys_raw',
+            source: tileSources.raw,
             'source-layer': sourceLayers.polys.raw,
             minzoom: Z_RAW_POLYS,
             paint: {
@@ -117,7 +108,7 @@ export function addPolygonLayers(style) {
         {
             id: styleIds.polysLine,
             type: 'line',
-            source: 'polys_raw',
+            source: tileSources.raw,
             'source-layer': sourceLayers.polys.raw,
             minzoom: Z_RAW_POLYS,
             paint: {
@@ -167,7 +158,7 @@ export function addPointLayers(style) {
     style.layers.push({
         id: styleIds.pointsCluster,
         type: 'circle',
-        source: 'points_cluster',
+        source: tileSources.cluster,
         'source-layer': sourceLayers.points.cluster, // "ls_points_cluster"
         minzoom: 0, maxzoom: Z_RAW_POINTS,
         paint: {
@@ -183,7 +174,7 @@ export function addPointLayers(style) {
     style.layers.push({
         id: styleIds.pointsClusterCount,
         type: 'symbol',
-        source: 'points_cluster',
+        source: tileSources.cluster,
         'source-layer': sourceLayers.points.cluster,
         minzoom: 0, maxzoom: Z_RAW_POINTS,
         layout: {
@@ -205,7 +196,7 @@ export function addPointLayers(style) {
     style.layers.push({
         id: styleIds.pointsCircle,
         type: 'circle',
-        source: 'points_raw',
+        source: tileSources.raw,
         'source-layer': sourceLayers.points.raw,
         minzoom: Z_RAW_POINTS,
         paint: {
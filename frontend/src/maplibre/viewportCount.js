@@ -0,0 +1,101 @@
+// Landslides in view, counted from the tiles already on the map (no request).
+//
+// Cluster zooms: coded cluster tiles (z <= 8, categorical filters only) carry
+// a one-feature ls_tile_summary layer with the tile's totals
+// (sql/tile_cells.sql). Tiles entirely inside the view add their totals and
+// are exact. The tiles on its edge, and all tiles when there is no summary
+// (numeric filters set), add the clusters whose point falls inside the view:
+// a cluster stands for a whole cell (1/8 of a tile side) and is counted
+// entirely or not at all, so the count is then approximate and shown as such.
+// Raw zooms: distinct landslides whose bbox touches the view.
+import {sourceLayers, tileSources, Z_RAW} from './config.js';
+
+const lng2x = (lng, n) => Math.floor((lng + 180) / 360 * n);
+const lat2y = (lat, n) => {
+    const r = lat * Math.PI / 180;
+    return Math.floor((1 - Math.log(Math.tan(r) + 1 / Math.cos(r)) / Math.PI) / 2 * n);
+};
+const x2lng = (x, n) => x / n * 360 - 180;
+const y2lat = (y, n) => Math.atan(Math.sinh(Math.PI * (1 - 2 * y / n))) * 180 / Math.PI;
+
+function tileInside({z, x, y}, view) {
+    const n = 2 ** z;
+    return x2lng(x, n) >= view.west && x2lng(x + 1, n) <= view.east
+        && y2lat(y + 1, n) >= view.south && y2lat(y, n) <= view.north;
+}
+
+function pointInside([lng, lat], view) {
+    return lng >= view.west && lng <= view.east && lat >= view.south && lat <= view.north;
+}
+
+function bboxTouches(coords, view) {
+    let w = Infinity, s = Infinity, e = -Infinity, n = -Infinity;
+    const walk = (c) => {
+        if (typeof c[0] === 'number') {
+            w = Math.min(w, c[0]); e = Math.max(e, c[0]);
+            s = Math.min(s, c[1]); n = Math.max(n, c[1]);
+        } else c.forEach(walk);
+    };
+    walk(coords);
+    return w <= view.east && e >= view.west && s <= view.north && n >= view.south;
+}
+
+function clusterCount(map, view) {
+    // Totals of the tiles entirely in view, by "z/x/y"
+    const whole = new Map();
+    let z = null;
+    for (const f of map.querySourceFeatures(tileSources.cluster, {sourceLayer: sourceLayers.summary})) {
+        const p = f.properties;
+        z = p.z;
+        if (tileInside(p, view)) whole.set(`${p.z}/${p.x}/${p.y}`, p.pt_count + p.poly_count);
+    }
+
+    let count = 0;
+    for (const n of whole.values()) count += n;
+
+    // Clusters of edge tiles (and of tiles without a summary)
+    let approximate = false;
+    const n = 2 ** (z ?? 0);
+    for (const [layer, prop] of [[sourceLayers.points.cluster, 'pt_count'], [sourceLayers.polys.cluster, 'poly_count']]) {
+        for (const f of map.querySourceFeatures(tileSources.cluster, {sourceLayer: layer})) {
+            const [lng, lat] = f.geometry.coordinates;
+            if (!pointInside([lng, lat], view)) continue;
+            if (z != null && whole.has(`${z}/${lng2x(lng, n)}/${lat2y(lat, n)}`)) continue;
+            count += Number(f.properties[prop]) || 0;
+            approximate = true;
+        }
+    }
+    return {count, approximate};
+}
+
+function rawCount(map, view) {
+    const ids = new Set();
+    for (const layer of [sourceLayers.points.raw, sourceLayers.polys.raw]) {
+        for (const f of map.querySourceFeatures(tileSources.raw, {sourceLayer: layer})) {
+            // features crossing tile borders come once per tile
+            const id = `${f.properties.source}:${f.properties.viewer_id}`;
+            if (!ids.has(id) && bboxTouches(f.geometry.coordinates, view)) ids.add(id);
+        }
+    }
+    return {count: ids.size, approximate: false};
+}
+
+// {count, approximate}
+export function viewportCount(map) {
+    const b = map.getBounds();
+    const view = {west: b.getWest(), east: b.getEast(), south: b.getSouth(), north: b.getNorth()};
+    return map.getZoom() >= Z_RAW ? rawCount(map, view) : clusterCount(map, view);
+}
+
+// Keep `el` showing the count in view; updated whenever the map settles
+// (moves, filter changes and tile loads all end in 'idle')
+export function initViewportCount(map, el) {
+    if (!el) return;
+    const update = () => {
+        const {count, approximate} = viewportCount(map);
+        el.textContent = `${approximate ? '~' : ''}${count.toLocaleString('en-US')} in view`;
+        el.title = approximate ? 'Approximate: clusters on the edge of the view are counted whole' : '';
+    };
+    map.on('idle', update);
+    update();
+}
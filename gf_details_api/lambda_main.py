@@ -1,10 +1,11 @@
-import os
 import json
 from typing import Any, Dict, Optional
 
-import boto3
-from botocore.exceptions import ClientError
-import pg8000
+from landslide_core.db import HISTOGRAM_CACHE_SECONDS, attribute_histograms, get_db_conn
+from landslide_core.filter_query import canonical_filters
+from landslide_core.filters import Filters
+from landslide_core.sql import execute
+from landslide_core.tracing import annotate, fail, log, span, trace
 
 
 ALLOWED_CORS_ORIGINS = {
@@ -13,7 +14,12 @@ ALLOWED_CORS_ORIGINS = {
     # add CloudFront URL here if you want to restrict later
 }
 
-def _lambda_response(status_code: int, body: Dict[str, Any], origin: Optional[str] = "*"):
+def _lambda_response(
+    status_code: int,
+    body: Dict[str, Any],
+    origin: Optional[str] = "*",
+    max_age: Optional[int] = None,
+):
     headers = {
         "Content-Type": "application/json",
         "Access-Control-Allow-Origin": origin or "*",
@@ -21,6 +27,9 @@ def _lambda_response(status_code: int, body: Dict[str, Any], origin: Optional[st
         "Access-Control-Allow-Headers": "Content-Type",
         "Access-Control-Allow-Methods": "OPTIONS,GET",
     }
+    if max_age:
+        # lets CloudFront and the browser answer repeats
+        headers["Cache-Control"] = f"public, max-age={max_age}"
     return {
         "statusCode": status_code,
         "headers": headers,
@@ -33,36 +42,15 @@ def _parse_bool(v) -> bool:
         return False
     return str(v).strip().lower() in ("1", "true", "t", "yes", "y", "on")
 
-def _get_db_credentials_from_env() -> Dict[str, Any]:
-    host = os.getenv("PGHOST")
-    database = os.getenv("PGDATABASE")
-    user = os.getenv("PGUSER")
-    if not (host and database and user):
-        raise RuntimeError("Missing PGHOST / PGDATABASE / PGUSER env vars.")
-
-    password = os.getenv("PGPASSWORD")
-    if not password:
-        secret_arn = os.getenv("DB_SECRET_ARN")
-        if not secret_arn:
-            raise RuntimeError("Neither PGPASSWORD nor DB_SECRET_ARN is set.")
-        sm = boto3.client("secretsmanager")
-        try:
-            resp = sm.get_secret_value(SecretId=secret_arn)
-            secret_dict = json.loads(resp.get("SecretString") or "{}")
-            password = secret_dict.get("password")
-        except ClientError as e:
-            raise RuntimeError(f"Failed to fetch DB secret: {e}")
-
-    port = int(os.getenv("PGPORT", "5432"))
-    return {"host": host, "database": database, "user": user, "password": password, "port": port}
-
-def get_db_conn():
-    c = _get_db_credentials_from_env()
-    return pg8000.connect(
-        host=c["host"], database=c["database"], user=c["user"], password=c["password"], port=c["port"]
-    )
-
 def lambda_handler(event, context):
+    path = event.get("path", "") or ""
+    operation = "histograms" if path.endswith("/histograms") else "get"
+    with trace("details", operation):
+        response = _dispatch(event)
+        annotate(status_code=response["statusCode"])
+        return response
+
+def _dispatch(event) -> Dict[str, Any]:
     path = event.get("path", "") or ""
     method = event.get("httpMethod", "GET")
 
@@ -78,6 +66,10 @@ def lambda_handler(event, context):
 
     # Query params
     query = event.get("queryStringParameters") or {}
+
+    if path.endswith("/histograms"):
+        return _histograms(query, cors_origin)
+
     source = (query.get("source") or "").strip()
     viewer_id = (query.get("viewer_id") or "").strip()
     include_geom = _parse_bool(query.get("include_geom"))
@@ -85,13 +77,10 @@ def lambda_handler(event, context):
     if not source or not viewer_id:
         return _lambda_response(400, {"error": "Missing required params: source, viewer_id"}, cors_origin)
 
-    sql = "SELECT landslide_v2.get_landslide_props(%s, %s, %s);"
-
     try:
-        with get_db_conn() as conn, conn.cursor() as cur:
-            cur.execute(sql, (source, viewer_id, include_geom))
-            row = cur.fetchone()
-            payload = row[0] if row else None
+        with get_db_conn() as conn, span("db.execute"):
+            rows = execute(conn, "landslide_props", (source, viewer_id, include_geom))
+        payload = rows[0][0] if rows else None
 
         if not payload:
             return _lambda_response(404, {"found": False, "source": source, "viewer_id": viewer_id}, cors_origin)
@@ -99,5 +88,18 @@ def lambda_handler(event, context):
         return _lambda_response(200, payload, cors_origin)
 
     except Exception as e:
-        print("Details Lambda error:", repr(e))
+        log("Details Lambda error", level="ERROR", error=repr(e))
+        fail(type(e).__name__)
+        return _lambda_response(500, {"error": "Internal error"}, cors_origin)
+
+
+def _histograms(query: Dict[str, Any], cors_origin: str) -> Dict[str, Any]:
+    # ?materials=a,b&movements=...&confidences=... as in the tile URLs
+    filters = Filters.from_dict(canonical_filters(query))
+    try:
+        histograms = attribute_histograms(filters)
+    except Exception as e:
+        log("Histograms error", level="ERROR", error=repr(e))
+        fail(type(e).__name__)
         return _lambda_response(500, {"error": "Internal error"}, cors_origin)
+    return _lambda_response(200, histograms, cors_origin, max_age=int(HISTOGRAM_CACHE_SECONDS))
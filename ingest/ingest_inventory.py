@@ -0,0 +1,256 @@
+"""
+Bulk ingest of a landslide inventory (GeoJSON, GeoPackage or CSV).
+
+Features are streamed from the file in batches of --batch-size and COPYed
+into landslides.ingest_staging; landslides.ingest_staged(batch) then
+validates, reprojects and upserts the whole batch into
+landslides.ls_points / ls_polygons (sql/ingest.sql), and
+landslide_v2.refresh_tile_cells_for(...) refreshes the derived tables
+(tile cells, histograms, statistics) for that batch's landslides only.
+Each batch is one transaction. Prints rows read/s per batch and overall,
+with the rows loaded as points / polygons, rejected, and dropped as
+duplicates.
+
+Landslides are keyed by (--source, viewer id): the --id-field property,
+else the GeoJSON feature id / GeoPackage fid, else the position in the
+file. Loading an inventory again updates it in place; within a batch, the
+last row of a key wins.
+
+Usage (PG* env vars as for the worker, e.g. from download_api/.env.local):
+
+    python ingest/ingest_inventory.py slides.geojson --source usgs_2024
+    python ingest/ingest_inventory.py slides.gpkg --layer landslides --source dogami --id-field ID
+    python ingest/ingest_inventory.py points.csv --source field --lon-field lon --lat-field lat
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+from itertools import count, islice
+from uuid import uuid4
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from landslide_core.db import get_db_conn  # noqa: E402
+
+COPY_SQL = """
+    COPY landslides.ingest_staging
+        (batch_id, seq, source, viewer_id, geom_kind, geom, srid, props)
+    FROM STDIN WITH (FORMAT csv)
+"""
+
+INGEST_SQL = "SELECT points, polygons, rejected, duplicates FROM landslides.ingest_staged(%s)"
+
+REFRESH_SQL = """
+    SELECT landslide_v2.refresh_tile_cells_for(array_agg(source), array_agg(viewer_id))
+    FROM landslides.ingest_staging
+    WHERE batch_id = %s
+"""
+
+CLEAR_SQL = "DELETE FROM landslides.ingest_staging WHERE batch_id = %s"
+
+# Large CSV fields (polygon WKT) exceed the csv module's default limit
+csv.field_size_limit(sys.maxsize)
+
+
+def _ijson():
+    """ijson for streaming GeoJSON, or None (the file is then parsed whole)."""
+    try:
+        import ijson
+    except ImportError:
+        return None
+    return ijson
+
+
+def _geojson_features(path):
+    # (id, properties, geom_kind, geom)
+    ijson = _ijson()
+    with open(path, "rb") as f:
+        if ijson is not None:
+            features = ijson.items(f, "features.item", use_float=True)
+        else:
+            features = json.load(f).get("features") or []
+        for feature in features:
+            geometry = feature.get("geometry")
+            yield (
+                feature.get("id"),
+                feature.get("properties") or {},
+                "geojson",
+                json.dumps(geometry) if geometry else None,
+            )
+
+
+def _gpkg_wkb(blob):
+    # GeoPackage geometry: "GP" header + optional envelope, then plain WKB
+    if blob is None or bytes(blob[:2]) != b"GP":
+        return None
+    flags = blob[3]
+    if flags & 0x10:   # empty geometry
+        return None
+    envelope = (0, 32, 48, 48, 64)[(flags >> 1) & 0x07]
+    return bytes(blob[8 + envelope:])
+
+
+def _gpkg_layer(path, layer):
+    # (table, geometry column, srid) of `layer`, or of the only layer
+    con = sqlite3.connect(path)
+    try:
+        rows = con.execute(
+            "SELECT table_name, column_name, srs_id FROM gpkg_geometry_columns"
+        ).fetchall()
+    finally:
+        con.close()
+    if layer:
+        rows = [r for r in rows if r[0] == layer]
+    if len(rows) != 1:
+        names = ", ".join(r[0] for r in rows) or "none"
+        raise SystemExit(f"{path}: pick a layer with --layer (geometry layers: {names})")
+    return rows[0]
+
+
+def _gpkg_features(path, table, column):
+    con = sqlite3.connect(path)
+    try:
+        cur = con.execute(f'SELECT * FROM "{table}"')
+        names = [d[0] for d in cur.description]
+        for row in cur:
+            props = dict(zip(names, row))
+            wkb = _gpkg_wkb(props.pop(column))
+            fid = props.pop("fid", None)
+            props = {k: v for k, v in props.items() if not isinstance(v, bytes)}
+            yield fid, props, "wkb", wkb.hex() if wkb else None
+    finally:
+        con.close()
+
+
+def _csv_features(path, wkt_field, lon_field, lat_field):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            props = {k: (v if v != "" else None) for k, v in row.items() if k}
+            wkt = props.pop(wkt_field, None)
+            if wkt:
+                yield None, props, "wkt", wkt
+                continue
+            lon, lat = props.get(lon_field), props.get(lat_field)
+            yield None, props, "wkt", f"POINT({lon} {lat})" if lon and lat else None
+
+
+def open_inventory(args):
+    """(srid, iterator of (id, properties, geom_kind, geom)) for the input file."""
+    ext = os.path.splitext(args.path)[1].lower()
+    if ext in (".geojson", ".json"):
+        return args.srid or 4326, _geojson_features(args.path)
+    if ext == ".gpkg":
+        table, column, srid = _gpkg_layer(args.path, args.layer)
+        return args.srid or srid, _gpkg_features(args.path, table, column)
+    if ext == ".csv":
+        return args.srid or 4326, _csv_features(
+            args.path, args.wkt_field, args.lon_field, args.lat_field,
+        )
+    raise SystemExit(f"{args.path}: expected .geojson, .json, .gpkg or .csv")
+
+
+def _staging_csv(batch_id, seq, rows, source, srid, id_field):
+    # One batch as COPY csv text; NULLs are unquoted empty fields
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    for offset, (feature_id, props, kind, geom) in enumerate(rows):
+        viewer_id = props.get(id_field)
+        if viewer_id is None:
+            viewer_id = feature_id if feature_id is not None else seq + offset
+        writer.writerow([
+            batch_id, seq + offset, source, str(viewer_id), kind, geom, srid,
+            json.dumps(props, default=str),
+        ])
+    buf.seek(0)
+    return buf
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help=".geojson / .json, .gpkg or .csv")
+    parser.add_argument("--source", required=True,
+                        help="source name of the inventory (first half of the landslide key)")
+    parser.add_argument("--id-field", default="viewer_id",
+                        help="property holding the landslide id within the source")
+    parser.add_argument("--srid", type=int,
+                        help="SRID of the input (default: GeoPackage layer SRID, else 4326)")
+    parser.add_argument("--layer", help="GeoPackage layer (table) name")
+    parser.add_argument("--wkt-field", default="wkt", help="CSV column holding WKT geometries")
+    parser.add_argument("--lon-field", default="longitude", help="CSV point longitude column")
+    parser.add_argument("--lat-field", default="latitude", help="CSV point latitude column")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--no-refresh", action="store_true",
+                        help="skip the derived tables (run refresh_tile_cells() afterwards)")
+    parser.add_argument("--refresh-merc", action="store_true",
+                        help="also rebuild the legacy ls_*_merc views (full refresh)")
+    args = parser.parse_args()
+
+    srid, features = open_inventory(args)
+    run_id = uuid4().hex[:12]
+    totals = {"rows": 0, "points": 0, "polygons": 0, "rejected": 0, "duplicates": 0}
+    started = time.perf_counter()
+
+    print(f"{'batch':>5} {'rows':>8} {'copy s':>7} {'upsert s':>9} {'refresh s':>10}"
+          f" {'points':>8} {'polygons':>9} {'rejected':>9} {'duplicate':>9} {'rows/s':>9}")
+    with get_db_conn() as conn:
+        cur = conn.cursor()
+        for number in count(1):
+            rows = list(islice(features, args.batch_size))
+            if not rows:
+                break
+            batch_id = f"{run_id}-{number}"
+            batch_started = time.perf_counter()
+
+            cur.execute(COPY_SQL, stream=_staging_csv(
+                batch_id, totals["rows"], rows, args.source, srid, args.id_field,
+            ))
+            copied = time.perf_counter()
+
+            cur.execute(INGEST_SQL, (batch_id,))
+            points, polygons, rejected, duplicates = cur.fetchone()
+            upserted = time.perf_counter()
+
+            if not args.no_refresh:
+                cur.execute(REFRESH_SQL, (batch_id,))
+            cur.execute(CLEAR_SQL, (batch_id,))
+            conn.commit()
+            done = time.perf_counter()
+
+            totals["rows"] += len(rows)
+            totals["points"] += points
+            totals["polygons"] += polygons
+            totals["rejected"] += rejected
+            totals["duplicates"] += duplicates
+            print(f"{number:>5} {len(rows):>8,} {copied - batch_started:>7.2f}"
+                  f" {upserted - copied:>9.2f} {done - upserted:>10.2f}"
+                  f" {points:>8,} {polygons:>9,} {rejected:>9,} {duplicates:>9,}"
+                  f" {len(rows) / max(done - batch_started, 1e-9):>9,.0f}")
+
+        if args.refresh_merc:
+            cur.execute("SELECT landslides.refresh_merc_views()")
+            conn.commit()
+
+        # ANALYZE for the planner, VACUUM so the tile_cells index-only scans
+        # stay free of heap fetches (sql/tile_cells.sql)
+        tables = ["landslides.ls_points", "landslides.ls_polygons"]
+        if not args.no_refresh:
+            tables.append("landslide_v2.tile_cells")
+        conn.autocommit = True
+        for table in tables:
+            cur.execute(f"VACUUM (ANALYZE) {table}")
+        conn.autocommit = False
+
+    seconds = time.perf_counter() - started
+    print(f"{totals['rows']:,} rows ({totals['points']:,} points, {totals['polygons']:,} polygons,"
+          f" {totals['rejected']:,} rejected, {totals['duplicates']:,} duplicates) in {seconds:.1f}s:"
+          f" {totals['rows'] / max(seconds, 1e-9):,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
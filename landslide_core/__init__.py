@@ -0,0 +1,20 @@
+"""
+Code shared by every entry point: the Lambdas (download_api/lambda_main.py,
+download_api/worker_main.py, gf_details_api/lambda_main.py), the local
+FastAPI app (download_api/main.py) and the benchmarks.
+
+  filters       Filters, the one filter model
+  filter_query  canonical filter encoding (same as the frontend tile URLs)
+  sql           named SQL statements, selection preparation, export staging
+  db            connections (credentials, read replica routing), counts,
+                statistics, slider histograms
+  aio           the same over an asyncpg pool, for the FastAPI service
+  profile       opt-in EXPLAIN ANALYZE capture of slow statements
+  tracing       request traces and structured logs
+
+Deployed as a Lambda layer (/opt/python/landslide_core); locally it is
+imported from the repository root.
+
+Import from the submodules: the package itself imports nothing, so the API
+Lambda (no pg8000) can use filter_query and tracing alone.
+"""
@@ -0,0 +1,203 @@
+"""
+asyncio Postgres access (asyncpg) for the FastAPI export service
+(download_api/main.py): the counterpart of db.py for code that runs in an
+event loop.
+
+One pool per host (primary, read replica), created on first use with the
+credentials / settings of db.py. asyncpg prepares every statement it runs
+and keeps it per connection, so the registered statements of sql.py
+(sql.numbered) are parsed and planned once per pooled connection as with
+db.get_db_conn.
+
+Env vars (besides those of db.py):
+  DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE
+"""
+
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import asyncpg
+
+from . import profile
+from .db import (
+    DB_PLAN_CACHE_MODE,
+    PGHOST_REPLICA,
+    REPLICA_MAX_LAG_SECONDS,
+    cached_histograms,
+    get_db_credentials,
+    histogram_args,
+    remember_histograms,
+)
+from .filters import Filters
+from .sql import SELECTION_MAX_VERTICES, SELECTION_SIMPLIFY_TOLERANCE_M, numbered
+from .tracing import annotate, log, span
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+
+# host -> pool
+_pools: Dict[str, asyncpg.Pool] = {}
+_pools_lock = asyncio.Lock()
+
+
+async def _pool(host: Optional[str] = None) -> asyncpg.Pool:
+    host = host or os.getenv("PGHOST")
+    async with _pools_lock:
+        if host not in _pools:
+            creds = get_db_credentials(host)
+            log("Creating Postgres pool", level="DEBUG", host=host,
+                min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE)
+            _pools[host] = await asyncpg.create_pool(
+                host=creds["host"],
+                database=creds["database"],
+                user=creds["user"],
+                password=creds["password"],
+                port=creds["port"],
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                server_settings=(
+                    {"plan_cache_mode": DB_PLAN_CACHE_MODE} if DB_PLAN_CACHE_MODE else None
+                ),
+            )
+        return _pools[host]
+
+
+async def close_pools():
+    """Close every pool (application shutdown)."""
+    async with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        await pool.close()
+
+
+async def _replica_conn():
+    try:
+        pool = await _pool(PGHOST_REPLICA)
+        conn = await pool.acquire()
+    except Exception as e:
+        log("Replica unavailable, using the primary", level="WARNING", error=repr(e))
+        return None, None
+
+    try:
+        lag = float(await conn.fetchval(numbered("replica_lag")))
+    except Exception as e:
+        await pool.release(conn)
+        log("Replica unavailable, using the primary", level="WARNING", error=repr(e))
+        return None, None
+
+    annotate(replica_lag_s=round(lag, 1))
+    if lag <= REPLICA_MAX_LAG_SECONDS:
+        return pool, conn
+    log("Replica lag above bound, using the primary", level="WARNING",
+        lag_s=lag, max_lag_s=REPLICA_MAX_LAG_SECONDS)
+    await pool.release(conn)
+    return None, None
+
+
+@asynccontextmanager
+async def acquire(role: str = "primary") -> AsyncIterator[asyncpg.Connection]:
+    """
+    async with acquire() as conn: a pooled connection to the primary, or
+    with role="replica" to the read replica (same rules as db.get_db_conn).
+    """
+    pool, conn = None, None
+    if role == "replica" and PGHOST_REPLICA:
+        pool, conn = await _replica_conn()
+    if conn is None:
+        pool = await _pool()
+        with span("db.acquire"):
+            conn = await pool.acquire()
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+
+async def _fetchval(conn: asyncpg.Connection, name: str, args: tuple, filters: Filters) -> Any:
+    # conn.fetchval of a registered statement, with the slow plan capture of
+    # sql.execute
+    started = time.perf_counter()
+    value = await conn.fetchval(numbered(name), *args)
+    ms = (time.perf_counter() - started) * 1000
+    if profile.should_capture(ms):
+        await profile.acapture(conn, name, numbered(name), args, ms, filters)
+    return value
+
+
+async def prepare_selection(conn: asyncpg.Connection, filters: Filters) -> Optional[str]:
+    """sql.prepare_selection on an asyncpg connection (outside a transaction it commits)."""
+    selection_hash = filters.selection_hash
+    if not selection_hash:
+        return None
+
+    with span("db.prepare_selection"):
+        return await conn.fetchval(
+            numbered("prepare_selection"),
+            selection_hash,
+            filters.selection_text,
+            SELECTION_SIMPLIFY_TOLERANCE_M,
+            SELECTION_MAX_VERTICES,
+        )
+
+
+async def count_matching_filters(filters: Filters) -> int:
+    """Number of landslides matching `filters` (see db.count_matching_filters)."""
+    role = "primary" if filters.selection_hash else "replica"
+    async with acquire(role) as conn:
+        await prepare_selection(conn, filters)
+        with span("db.execute"):
+            count = await _fetchval(conn, "count", filters.sql_args(), filters)
+
+    annotate(db_role=role, count=count)
+    return count
+
+
+async def summarize_matching_filters(filters: Filters) -> Dict[str, Any]:
+    """Statistics of the landslides matching `filters` (see db.summarize_matching_filters)."""
+    role = "primary" if filters.selection_hash else "replica"
+    async with acquire(role) as conn:
+        await prepare_selection(conn, filters)
+        with span("db.execute"):
+            summary = json.loads(await _fetchval(conn, "stats", filters.sql_args(), filters))
+
+    annotate(db_role=role, count=summary["count"])
+    return summary
+
+
+async def attribute_histograms(filters: Filters) -> Dict[str, Any]:
+    """Slider histograms of `filters` (see db.attribute_histograms, same cache)."""
+    args = histogram_args(filters)
+    histograms = cached_histograms(args)
+    if histograms is None:
+        async with acquire("replica") as conn:
+            with span("db.execute"):
+                # asyncpg returns json as text
+                histograms = json.loads(await conn.fetchval(numbered("attribute_histograms"), *args))
+        remember_histograms(args, histograms)
+    return histograms
+
+
+async def stream(
+    name: str,
+    args: tuple,
+    filters: Optional[Filters] = None,
+    batch_size: int = 1000,
+) -> AsyncIterator[Any]:
+    """
+    Yield the first column of every row of the registered statement `name`,
+    fetched through a server-side cursor batch_size rows at a time, so
+    memory stays bounded however many rows match. `filters` (if given) has
+    its selection prepared first.
+    """
+    async with acquire() as conn:
+        if filters is not None:
+            await prepare_selection(conn, filters)
+        async with conn.transaction():
+            cursor = conn.cursor(numbered(name), *args, prefetch=batch_size)
+            async for row in cursor:
+                yield row[0]
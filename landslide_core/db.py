@@ -0,0 +1,291 @@
+"""
+Postgres connections for all entry points (pg8000: pure Python, Lambda
+friendly).
+
+Env vars:
+  PGHOST, PGDATABASE, PGUSER, PGPORT, and PGPASSWORD or DB_SECRET_ARN
+  PGHOST_REPLICA, REPLICA_MAX_LAG_SECONDS (optional read replica)
+  DB_CONN_REUSE, DB_CONN_MAX_IDLE_SECONDS, DB_PLAN_CACHE_MODE
+  HISTOGRAM_CACHE_SECONDS
+  QUERY_PROFILE_MS, QUERY_PROFILE_DIR (slow plan capture, see profile.py)
+
+The secret is fetched once per process, not once per connection, and
+connections are kept for the next request (see get_db_conn).
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+import pg8000
+
+from .filters import Filters
+from .sql import execute, forget, prepare_selection
+from .tracing import annotate, log, span
+
+# Optional read replica (PGHOST_REPLICA, same database / credentials).
+# Read-only work that tolerates slightly stale data (counts) runs there;
+# anything that writes (exports staging, selection cache) stays on the
+# primary. A replica lagging more than REPLICA_MAX_LAG_SECONDS, or not
+# reachable, is skipped in favour of the primary.
+PGHOST_REPLICA = os.getenv("PGHOST_REPLICA")
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "30"))
+
+# One idle connection per host is kept between uses, so a warm Lambda
+# container connects (and prepares its statements, see sql.py) once rather
+# than on every invocation. Connections idle for longer than
+# DB_CONN_MAX_IDLE_SECONDS are closed instead of reused, and a kept
+# connection is checked with SELECT 1 before it is handed out again, so one
+# the server has dropped is replaced. DB_CONN_REUSE=0 connects per use.
+DB_CONN_REUSE = os.getenv("DB_CONN_REUSE", "1") != "0"
+DB_CONN_MAX_IDLE_SECONDS = float(os.getenv("DB_CONN_MAX_IDLE_SECONDS", "300"))
+
+# plan_cache_mode of every connection: auto (Postgres' default: custom plans
+# for the first five executions of a prepared statement, then the generic
+# plan if it isn't costlier), force_generic_plan or force_custom_plan.
+DB_PLAN_CACHE_MODE = os.getenv("DB_PLAN_CACHE_MODE") or None
+
+# host -> (connection, idle since)
+_idle: Dict[str, Tuple[Any, float]] = {}
+
+# Slider histograms only change when the data is refreshed, so they are kept
+# per categorical filter for HISTOGRAM_CACHE_SECONDS (at most
+# HISTOGRAM_CACHE_SIZE filters, oldest dropped first).
+HISTOGRAM_CACHE_SECONDS = float(os.getenv("HISTOGRAM_CACHE_SECONDS", "3600"))
+HISTOGRAM_CACHE_SIZE = 256
+
+# histogram_args(filters), as tuples -> (histograms, stored at)
+_histograms: Dict[tuple, Tuple[Dict[str, Any], float]] = {}
+
+
+@lru_cache(maxsize=None)
+def _secret_password(secret_arn: str) -> Optional[str]:
+    import boto3
+    from botocore.exceptions import ClientError
+
+    try:
+        with span("db.credentials"):
+            resp = boto3.client("secretsmanager").get_secret_value(SecretId=secret_arn)
+    except ClientError as e:
+        raise RuntimeError(f"Failed to fetch DB secret: {e}")
+    return json.loads(resp.get("SecretString") or "{}").get("password")
+
+
+def get_db_credentials(host: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Connection params from env (and Secrets Manager). `host` replaces
+    PGHOST (e.g. the read replica).
+    """
+    host = host or os.getenv("PGHOST")
+    database = os.getenv("PGDATABASE")
+    user = os.getenv("PGUSER")
+
+    if not (host and database and user):
+        raise RuntimeError("Missing PGHOST / PGDATABASE / PGUSER env vars.")
+
+    password = os.getenv("PGPASSWORD")
+    if not password:
+        secret_arn = os.getenv("DB_SECRET_ARN")
+        if not secret_arn:
+            raise RuntimeError("Neither PGPASSWORD nor DB_SECRET_ARN is set.")
+        password = _secret_password(secret_arn)
+
+    return {
+        "host": host,
+        "database": database,
+        "user": user,
+        "password": password,
+        "port": int(os.getenv("PGPORT", "5432")),
+    }
+
+
+def _connect(creds: Dict[str, Any]):
+    log("Connecting to Postgres", level="DEBUG", host=creds["host"], database=creds["database"])
+    with span("db.connect"):
+        return pg8000.connect(
+            host=creds["host"],
+            database=creds["database"],
+            user=creds["user"],
+            password=creds["password"],
+            port=creds["port"],
+            startup_params=(
+                {"plan_cache_mode": DB_PLAN_CACHE_MODE} if DB_PLAN_CACHE_MODE else None
+            ),
+        )
+
+
+def _close(conn):
+    forget(conn)
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _alive(conn) -> bool:
+    # One round trip: a kept connection may have been dropped by the server
+    # meanwhile (failover, restart, idle timeout)
+    try:
+        with conn.cursor() as cur, span("db.ping"):
+            cur.execute("SELECT 1")
+            cur.fetchone()
+        conn.rollback()
+        return True
+    except Exception as e:
+        log("Kept connection is gone, reconnecting", level="WARNING", error=repr(e))
+        return False
+
+
+def _checkout(host: Optional[str] = None):
+    """An idle connection to `host` (default PGHOST), else a new one."""
+    host = host or os.getenv("PGHOST")
+    idle = _idle.pop(host, None)
+    if idle is not None:
+        conn, since = idle
+        if time.monotonic() - since < DB_CONN_MAX_IDLE_SECONDS and _alive(conn):
+            annotate(db_conn="reused")
+            return conn
+        _close(conn)
+    annotate(db_conn="new")
+    return _connect(get_db_credentials(host))
+
+
+def _release(conn, host: str):
+    """Keep `conn` for the next use of `host` (or close it)."""
+    try:
+        # Whatever wasn't committed is dropped, as closing would
+        conn.rollback()
+        conn.autocommit = False
+    except Exception:
+        _close(conn)
+        return
+    if not DB_CONN_REUSE or _idle.setdefault(host, (conn, time.monotonic()))[0] is not conn:
+        _close(conn)
+
+
+def _replica_lag_seconds(conn) -> float:
+    return float(execute(conn, "replica_lag")[0][0])
+
+
+def _replica_conn():
+    conn = None
+    try:
+        conn = _checkout(PGHOST_REPLICA)
+        lag = _replica_lag_seconds(conn)
+        annotate(replica_lag_s=round(lag, 1))
+        if lag <= REPLICA_MAX_LAG_SECONDS:
+            conn.rollback()
+            return conn
+        log("Replica lag above bound, using the primary", level="WARNING",
+            lag_s=lag, max_lag_s=REPLICA_MAX_LAG_SECONDS)
+        _release(conn, PGHOST_REPLICA)
+    except Exception as e:
+        log("Replica unavailable, using the primary", level="WARNING", error=repr(e))
+        if conn is not None:
+            _close(conn)
+    return None
+
+
+@contextmanager
+def get_db_conn(role: str = "primary"):
+    """
+    with get_db_conn() as conn: a connection to the primary, or with
+    role="replica" to the read replica when one is configured and within
+    REPLICA_MAX_LAG_SECONDS (else the primary).
+
+    On leaving the block the connection is rolled back (commit what should
+    stay) and kept for the next get_db_conn(); after an error it is closed.
+    """
+    conn = _replica_conn() if role == "replica" and PGHOST_REPLICA else None
+    host = PGHOST_REPLICA if conn is not None else os.getenv("PGHOST")
+    if conn is None:
+        conn = _checkout(host)
+
+    try:
+        yield conn
+    except BaseException:
+        _close(conn)
+        raise
+    _release(conn, host)
+
+
+def count_matching_filters(filters: Filters) -> int:
+    """Number of landslides matching `filters`."""
+    # Counts only read, so they may use the replica - unless a selection
+    # has to be prepared first, which writes (and would only reach the
+    # replica after its lag).
+    role = "primary" if filters.selection_hash else "replica"
+    with get_db_conn(role) as conn:
+        prepare_selection(conn, filters)
+        with span("db.execute"):
+            count = execute(conn, "count", filters.sql_args(), filters)[0][0]
+
+    annotate(db_role=role, count=count)
+    return count
+
+
+def summarize_matching_filters(filters: Filters) -> Dict[str, Any]:
+    """
+    Statistics of the landslides matching `filters` (counts per category and
+    geometry type, spread of the numeric attributes; see
+    sql/summary_stats.sql). Same replica routing as count_matching_filters.
+    """
+    role = "primary" if filters.selection_hash else "replica"
+    with get_db_conn(role) as conn:
+        prepare_selection(conn, filters)
+        with span("db.execute"):
+            summary = execute(conn, "stats", filters.sql_args(), filters)[0][0]
+
+    annotate(db_role=role, count=summary["count"])
+    return summary
+
+
+def histogram_args(filters: Filters) -> tuple:
+    """
+    Arguments of the attribute_histograms statement: the categorical
+    filters (sorted, None when unset), which is all histograms depend on.
+    """
+    return tuple(
+        sorted(set(values)) or None
+        for values in (filters.materials, filters.movements, filters.confidences)
+    )
+
+
+def _histogram_key(args: tuple) -> tuple:
+    return tuple(tuple(values) if values else None for values in args)
+
+
+def cached_histograms(args: tuple) -> Optional[Dict[str, Any]]:
+    """The histograms stored for `args` by remember_histograms, if still fresh."""
+    hit = _histograms.get(_histogram_key(args))
+    if hit is not None and time.monotonic() - hit[1] < HISTOGRAM_CACHE_SECONDS:
+        annotate(histograms="cached")
+        return hit[0]
+    return None
+
+
+def remember_histograms(args: tuple, histograms: Dict[str, Any]):
+    key = _histogram_key(args)
+    _histograms.pop(key, None)
+    while len(_histograms) >= HISTOGRAM_CACHE_SIZE:
+        del _histograms[next(iter(_histograms))]
+    _histograms[key] = (histograms, time.monotonic())
+
+
+def attribute_histograms(filters: Filters) -> Dict[str, Any]:
+    """
+    Histograms of the numeric filter attributes for the categorical filters
+    of `filters`: {attribute: {"lo", "hi", "counts": [...]}} (see
+    sql/attribute_histograms.sql). Numeric ranges and the selection are
+    ignored, the sliders show the whole distribution.
+    """
+    args = histogram_args(filters)
+    histograms = cached_histograms(args)
+    if histograms is None:
+        with get_db_conn("replica") as conn, span("db.execute"):
+            histograms = execute(conn, "attribute_histograms", args)[0][0]
+        remember_histograms(args, histograms)
+    return histograms
@@ -0,0 +1,114 @@
+"""
+Canonical filter encoding, shared with the frontend tile URLs.
+
+Equivalent filters (other key order, list order, duplicates, float noise,
+explicit defaults) normalize to the same dict and the same query string, so
+they share CloudFront tile cache entries and compare equal on jobs:
+
+  - list values trimmed, de-duplicated and sorted
+  - numbers rounded to NUMERIC_DECIMALS
+  - empty / None values dropped; tol_<key> only kept next to a
+    <key>_min / <key>_max and only when non-zero
+
+Mirrors frontend/src/filter-panel/filterQuery.js - keep the two in sync.
+"""
+
+import math
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote_plus
+
+NUMERIC_DECIMALS = 4
+
+LIST_KEYS = ("materials", "movements", "confidences")
+RANGE_KEYS = ("pga", "pgv", "psa03", "mmi", "rain")
+# Not filters, but part of the tile cache key (cluster/raw, data version)
+EXTRA_KEYS = ("mode", "v")
+
+
+def _canonical_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    items = value if isinstance(value, (list, tuple)) else str(value).split(",")
+    return sorted({str(item).strip() for item in items if item is not None} - {""})
+
+
+def _canonical_number(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        x = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(x):
+        return None
+    # floor(x + 0.5) rounds half up like JS Math.round (round() is half-even)
+    scale = 10 ** NUMERIC_DECIMALS
+    r = math.floor(x * scale + 0.5) / scale
+    return r if r != 0 else 0.0  # no "-0"
+
+
+def _format_number(x: float) -> str:
+    # Same text as JS String(x): shortest repr, no trailing ".0"
+    return str(int(x)) if x.is_integer() else repr(x)
+
+
+def canonical_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Canonical form of an API filters dict. Unknown keys are dropped, except
+    selection_geojson which is passed through unchanged.
+    """
+    f = filters or {}
+    out: Dict[str, Any] = {}
+
+    for key in LIST_KEYS:
+        values = _canonical_list(f.get(key))
+        if values:
+            out[key] = values
+
+    for key in RANGE_KEYS:
+        lo = _canonical_number(f.get(f"{key}_min"))
+        hi = _canonical_number(f.get(f"{key}_max"))
+        if lo is not None:
+            out[f"{key}_min"] = lo
+        if hi is not None:
+            out[f"{key}_max"] = hi
+        if lo is None and hi is None:
+            continue
+        tol = _canonical_number(f.get(f"tol_{key}"))
+        if tol:
+            out[f"tol_{key}"] = tol
+
+    for key in EXTRA_KEYS:
+        value = str(f.get(key) or "").strip()
+        if value:
+            out[key] = value
+
+    if f.get("selection_geojson"):
+        out["selection_geojson"] = f["selection_geojson"]
+
+    return dict(sorted(out.items()))
+
+
+def canonical_filter_query(filters: Optional[Dict[str, Any]], mode: Optional[str] = None) -> str:
+    """
+    Canonical tile query string (without selection_geojson); byte-identical
+    to canonicalFilterQuery() in the frontend for the same filters.
+    """
+    f = dict(filters or {})
+    if mode is not None:
+        f["mode"] = mode
+    canonical = canonical_filters(f)
+    canonical.pop("selection_geojson", None)
+
+    parts = []
+    for key, value in canonical.items():
+        if isinstance(value, list):
+            text = ",".join(value)
+        elif isinstance(value, float):
+            text = _format_number(value)
+        else:
+            text = value
+        # URLSearchParams escaping: '*' stays literal, '~' is escaped
+        encoded = quote_plus(text, safe="*").replace("~", "%7E")
+        parts.append(f"{key}={encoded}")
+    return "&".join(parts)
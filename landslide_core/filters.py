@@ -0,0 +1,172 @@
+"""
+The filter model of counts, exports and tiles.
+
+API requests, job items and the local FastAPI app all carry filters as a
+JSON object; Filters.from_dict() is the one place that turns it into typed
+values (lenient: bad numbers are ignored, single values become lists), and
+sql_args() the one place that orders them for the landslide_v2 filter
+functions (see sql.py). job_item_filters() / job_filters() store them on
+and read them back from DynamoDB job items.
+"""
+
+import hashlib
+import json
+import os
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from .filter_query import LIST_KEYS, RANGE_KEYS, canonical_filter_query
+
+# Job items keep filters JSON longer than this zlib-compressed, as the
+# binary attribute "filtersZ" instead of the "filters" string: a drawn
+# selection runs to tens of KB, and DynamoDB bills every read and write of
+# the item by its size.
+FILTERS_COMPRESS_BYTES = int(os.getenv("FILTERS_COMPRESS_BYTES", "1024"))
+
+
+def _as_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def _as_float(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class Filters:
+    # Categorical filters
+    materials: List[str] = field(default_factory=list)
+    movements: List[str] = field(default_factory=list)
+    confidences: List[str] = field(default_factory=list)
+
+    # Numeric filters
+    pga_min: Optional[float] = None
+    pga_max: Optional[float] = None
+    pgv_min: Optional[float] = None
+    pgv_max: Optional[float] = None
+    psa03_min: Optional[float] = None
+    psa03_max: Optional[float] = None
+    mmi_min: Optional[float] = None
+    mmi_max: Optional[float] = None
+    rain_min: Optional[float] = None
+    rain_max: Optional[float] = None
+
+    # Tolerances
+    tol_pga: float = 0.0
+    tol_pgv: float = 0.0
+    tol_psa03: float = 0.0
+    tol_mmi: float = 0.0
+    tol_rain: float = 0.0
+
+    # Optional selection geometry (GeoJSON, EPSG:4326)
+    selection_geojson: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_dict(cls, filters: Optional[Dict[str, Any]]) -> "Filters":
+        """Filters from a request / job filters dict; unknown keys are ignored."""
+        f = filters or {}
+        values: Dict[str, Any] = {key: _as_list(f.get(key)) for key in LIST_KEYS}
+        for key in RANGE_KEYS:
+            values[f"{key}_min"] = _as_float(f.get(f"{key}_min"))
+            values[f"{key}_max"] = _as_float(f.get(f"{key}_max"))
+            values[f"tol_{key}"] = _as_float(f.get(f"tol_{key}")) or 0.0
+        values["selection_geojson"] = f.get("selection_geojson") or None
+        return cls(**values)
+
+    @property
+    def selection_text(self) -> Optional[str]:
+        # Canonical text, so the same polygon always maps to the same cache entry
+        if not self.selection_geojson:
+            return None
+        return json.dumps(self.selection_geojson, sort_keys=True, separators=(",", ":"))
+
+    @property
+    def selection_hash(self) -> Optional[str]:
+        text = self.selection_text
+        return hashlib.sha256(text.encode()).hexdigest() if text else None
+
+    @property
+    def query(self) -> str:
+        """The canonical filter query (filter_query.py), without the selection."""
+        return canonical_filter_query(vars(self))
+
+    @property
+    def fingerprint(self) -> str:
+        # Same for equivalent filters: files captured query plans (profile.py)
+        text = f"{self.query}|{self.selection_hash or ''}"
+        return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+    def sql_args(self) -> tuple:
+        """
+        The 19 filter arguments of lsviewer_filtered_ids(...) and the
+        *_from_filters(...) export functions, in order; the selection is
+        passed as its hash (see sql.prepare_selection).
+        """
+        return (
+            self.materials,
+            self.movements,
+            self.confidences,
+            self.pga_min,
+            self.pga_max,
+            self.pgv_min,
+            self.pgv_max,
+            self.psa03_min,
+            self.psa03_max,
+            self.mmi_min,
+            self.mmi_max,
+            self.tol_pga,
+            self.tol_pgv,
+            self.tol_psa03,
+            self.tol_mmi,
+            self.rain_min,
+            self.rain_max,
+            self.tol_rain,
+            self.selection_hash,
+        )
+
+    def log_fields(self) -> Dict[str, Any]:
+        """Set filters for log lines (the selection only by hash)."""
+        fields = {
+            key: value for key, value in vars(self).items()
+            if value not in (None, [], 0.0) and key != "selection_geojson"
+        }
+        if self.selection_hash:
+            fields["selection_hash"] = self.selection_hash
+        return fields
+
+
+def job_item_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """The job item attributes holding `filters`: {"filters": json} or {"filtersZ": bytes}."""
+    text = json.dumps(filters)
+    if len(text) > FILTERS_COMPRESS_BYTES:
+        return {"filtersZ": zlib.compress(text.encode("utf-8"))}
+    return {"filters": text}
+
+
+def job_filters(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The filters stored on a job item by job_item_filters() (or, on older
+    items, as a map). Raises ValueError when they can't be decoded.
+    """
+    if item.get("filtersZ") is not None:
+        # boto3 returns binary attributes wrapped in a Binary
+        raw = getattr(item["filtersZ"], "value", item["filtersZ"])
+        try:
+            return json.loads(zlib.decompress(bytes(raw)))
+        except zlib.error as e:
+            raise ValueError(f"filtersZ: {e}") from e
+
+    filters = item.get("filters") or {}
+    if isinstance(filters, str):
+        filters = json.loads(filters)   # JSONDecodeError is a ValueError
+    return filters
@@ -0,0 +1,231 @@
+"""
+Opt-in capture of slow query plans.
+
+With QUERY_PROFILE_MS set, every registered statement (sql.py) that takes
+longer is run a second time as EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON),
+inside a savepoint that is rolled back, and the plan is kept together with
+the fingerprint of the filters it ran with (Filters.fingerprint). The
+export statements (sql.PLAN_ONLY_STATEMENTS) are only planned, EXPLAIN
+(FORMAT JSON) without ANALYZE: they are too long to run twice. The
+statement is explained with the same arguments bound, i.e. with a custom
+plan for them; a prepared statement that switched to its generic plan
+(plan_cache_mode, see db.py) may have run with another one.
+
+Captured plans go
+  - to the current collection (start_collecting / collected_plans): the
+    worker stores them on the job item (slowPlansZ)
+  - to QUERY_PROFILE_DIR, one JSON file per plan, if set (local dev)
+  - to the log, one WARNING line with the scans of the plan
+
+A plpgsql filter function shows up in the plan as one Function Scan; the
+plans of the statements inside it are only available when auto_explain is
+loaded (shared_preload_libraries, e.g. the RDS parameter group): the capture
+then asks it for them as notices and adds them as "nested".
+
+EXPLAIN ANALYZE runs the query again, so a captured statement costs twice
+its time; QUERY_PROFILE_MAX_PLANS caps the captures per collection (job).
+
+Env vars:
+  QUERY_PROFILE_MS (unset / 0: off), QUERY_PROFILE_DIR, QUERY_PROFILE_MAX_PLANS
+"""
+
+import json
+import os
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from .tracing import log, span
+
+QUERY_PROFILE_MS = float(os.getenv("QUERY_PROFILE_MS") or 0)
+QUERY_PROFILE_DIR = os.getenv("QUERY_PROFILE_DIR") or None
+QUERY_PROFILE_MAX_PLANS = int(os.getenv("QUERY_PROFILE_MAX_PLANS", "3"))
+
+EXPLAIN = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "
+EXPLAIN_PLAN_ONLY = "EXPLAIN (FORMAT JSON) "
+
+# Passed on to auto_explain (if loaded) for the capture only; as notices,
+# its plans reach this connection instead of only the server log
+_AUTO_EXPLAIN_SETTINGS = (
+    "auto_explain.log_min_duration = 0",
+    "auto_explain.log_nested_statements = on",
+    "auto_explain.log_analyze = on",
+    "auto_explain.log_buffers = on",
+    "auto_explain.log_format = json",
+    "auto_explain.log_level = notice",
+)
+
+# Plans of the current job / request; None when nobody collects
+_collected: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("query_plans", default=None)
+
+
+def enabled() -> bool:
+    return QUERY_PROFILE_MS > 0
+
+
+def start_collecting():
+    """Collect the plans captured from here on (in this context)."""
+    _collected.set([])
+
+
+def collected_plans() -> List[Dict[str, Any]]:
+    """The plans collected since start_collecting(); stops collecting."""
+    plans = _collected.get() or []
+    _collected.set(None)
+    return plans
+
+
+def should_capture(ms: float) -> bool:
+    """Whether a statement that took `ms` gets its plan captured."""
+    if not enabled() or ms < QUERY_PROFILE_MS:
+        return False
+    plans = _collected.get()
+    return plans is None or len(plans) < QUERY_PROFILE_MAX_PLANS
+
+
+def _notice_text(notice) -> str:
+    # pg8000 keeps notices as dicts of field code -> value (bytes)
+    message = notice.get(b"M", notice.get("M", b""))
+    return message.decode("utf-8", "replace") if isinstance(message, bytes) else message
+
+
+def _nested_plans(messages: List[str]) -> List[Any]:
+    # auto_explain notices: "duration: 12.345 ms  plan:\n{...}"
+    plans = []
+    for message in messages:
+        head, sep, plan = message.partition("plan:\n")
+        if sep and head.startswith("duration:"):
+            try:
+                plans.append(json.loads(plan))
+            except ValueError:
+                continue
+    return plans
+
+
+def _scans(node: Dict[str, Any], out: List[str]) -> List[str]:
+    # "Index Scan using x on t", "Seq Scan on t", "Function Scan on f", ...
+    node_type = node.get("Node Type", "")
+    if "Scan" in node_type:
+        text = node_type
+        if node.get("Index Name"):
+            text += f" using {node['Index Name']}"
+        target = node.get("Relation Name") or node.get("Function Name")
+        if target:
+            text += f" on {target}"
+        out.append(text)
+    for child in node.get("Plans") or ():
+        _scans(child, out)
+    return out
+
+
+def plan_scans(plan: Any) -> List[str]:
+    """The scan nodes of an EXPLAIN (FORMAT JSON) result, in plan order."""
+    out: List[str] = []
+    for entry in plan if isinstance(plan, list) else [plan]:
+        if isinstance(entry, dict) and "Plan" in entry:
+            _scans(entry["Plan"], out)
+    return out
+
+
+def _keep(name: str, ms: float, filters, plan: Any, nested: List[Any], analyzed: bool = True):
+    entry = {
+        "statement": name,
+        "ms": round(ms, 1),
+        "analyzed": analyzed,
+        "fingerprint": filters.fingerprint if filters is not None else None,
+        "filters": filters.query if filters is not None else None,
+        "selection_hash": filters.selection_hash if filters is not None else None,
+        "captured_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "plan": plan,
+    }
+    if nested:
+        entry["nested"] = nested
+
+    plans = _collected.get()
+    if plans is not None:
+        plans.append(entry)
+
+    if QUERY_PROFILE_DIR:
+        os.makedirs(QUERY_PROFILE_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        path = os.path.join(
+            QUERY_PROFILE_DIR, f"{stamp}-{name}-{entry['fingerprint'] or 'none'}.json"
+        )
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, indent=2, default=str)
+
+    log(
+        "Slow query plan captured", level="WARNING",
+        statement=name, ms=entry["ms"], fingerprint=entry["fingerprint"],
+        scans=plan_scans(plan) + [s for p in nested for s in plan_scans(p)],
+    )
+
+
+def capture(
+    conn, name: str, sql: str, args: tuple, ms: float, filters=None, analyze: bool = True,
+):
+    """
+    EXPLAIN ANALYZE `sql` (%s placeholders, run with `args`) on the pg8000
+    connection `conn` and keep the plan; analyze=False only plans it.
+    Never raises: a failed capture is logged and rolled back.
+    """
+    # SAVEPOINT needs a transaction block
+    begin, undo = (
+        ("BEGIN", "ROLLBACK") if conn.autocommit
+        else ("SAVEPOINT query_profile", "ROLLBACK TO SAVEPOINT query_profile")
+    )
+    with conn.cursor() as pcur, span("db.profile"):
+        pcur.execute(begin)
+        try:
+            # auto_explain's settings are superuser-only (RDS: rds_superuser);
+            # without them the capture goes on with the outer plan only
+            if analyze:
+                pcur.execute("SAVEPOINT query_profile_settings")
+                try:
+                    for setting in _AUTO_EXPLAIN_SETTINGS:
+                        pcur.execute(f"SET LOCAL {setting}")
+                except Exception:
+                    pcur.execute("ROLLBACK TO SAVEPOINT query_profile_settings")
+            conn.notices.clear()
+            explain = EXPLAIN if analyze else EXPLAIN_PLAN_ONLY
+            pcur.execute(explain + sql, args)
+            plan = pcur.fetchone()[0]
+            nested = _nested_plans([_notice_text(n) for n in conn.notices])
+        except Exception as e:
+            log("Query plan capture failed", level="WARNING", statement=name, error=str(e))
+            return
+        finally:
+            pcur.execute(undo)
+
+    _keep(name, ms, filters, plan, nested, analyzed=analyze)
+
+
+async def acapture(conn, name: str, sql: str, args: tuple, ms: float, filters=None):
+    """capture() on an asyncpg connection; `sql` has $n placeholders."""
+    messages: List[str] = []
+
+    def on_notice(_conn, message):
+        messages.append(message.message)
+
+    tr = conn.transaction()
+    with span("db.profile"):
+        await tr.start()
+        conn.add_log_listener(on_notice)
+        try:
+            try:
+                async with conn.transaction():
+                    for setting in _AUTO_EXPLAIN_SETTINGS:
+                        await conn.execute(f"SET LOCAL {setting}")
+            except Exception:
+                pass    # superuser-only, see capture()
+            # asyncpg returns json as text
+            plan = json.loads(await conn.fetchval(EXPLAIN + sql, *args))
+        except Exception as e:
+            log("Query plan capture failed", level="WARNING", statement=name, error=str(e))
+            return
+        finally:
+            conn.remove_log_listener(on_notice)
+            await tr.rollback()
+
+    _keep(name, ms, filters, plan, _nested_plans(messages))
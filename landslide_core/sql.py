@@ -0,0 +1,307 @@
+"""
+Named SQL statements of all entry points.
+
+Every query the Lambdas and the local app send is registered here under a
+name and run through execute(conn, name, args), which returns the rows, so
+a statement is written, tuned and benchmarked once. Arguments are
+positional (%s); the filter functions take the 19 values of
+Filters.sql_args() followed by the statement's own arguments.
+
+Each statement is prepared once per connection, on its first use
+(pg8000's Connection.prepare: a named statement, parsed and described),
+and afterwards only bound and executed: Postgres parses, analyses and
+(depending on plan_cache_mode, see db.py) plans it once instead of on every
+request. With connections kept warm between invocations (db.get_db_conn)
+that is once per Lambda container. The arguments are bound parameters
+either way. PREPARED_STATEMENTS=0 sends the plain, parameterised SQL
+instead.
+
+With QUERY_PROFILE_MS set, execute() also captures the plan of every
+statement slower than that (profile.py); pass `filters` so the plan is
+filed under their fingerprint.
+"""
+
+import os
+import re
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from . import profile
+from .filters import Filters
+from .tracing import span
+
+# Selection polygons are prepared once per distinct GeoJSON (see
+# sql/selection_cache.sql): simplified within this tolerance (metres, 3857)
+# and subdivided into parts of at most this many vertices.
+SELECTION_SIMPLIFY_TOLERANCE_M = float(os.getenv("SELECTION_SIMPLIFY_TOLERANCE_M", "5"))
+SELECTION_MAX_VERTICES = int(os.getenv("SELECTION_MAX_VERTICES", "256"))
+
+PREPARED_STATEMENTS = os.getenv("PREPARED_STATEMENTS", "1") != "0"
+
+FILTER_ARGS = """
+            %s,  -- materials
+            %s,  -- movements
+            %s,  -- confidences
+            %s,  -- pga_min
+            %s,  -- pga_max
+            %s,  -- pgv_min
+            %s,  -- pgv_max
+            %s,  -- psa03_min
+            %s,  -- psa03_max
+            %s,  -- mmi_min
+            %s,  -- mmi_max
+            %s,  -- tol_pga
+            %s,  -- tol_pgv
+            %s,  -- tol_psa03
+            %s,  -- tol_mmi
+            %s,  -- rain_min
+            %s,  -- rain_max
+            %s,  -- tol_rain
+            -- prepared selection (hash)
+            landslide_v2.selection_geom(%s)"""
+
+STATEMENTS = {
+    # (filters...)
+    "count": f"""
+        SELECT COUNT(*) AS count
+        FROM landslide_v2.lsviewer_filtered_ids({FILTER_ARGS}
+        );
+    """,
+    # (filters...) - grouped statistics, see sql/summary_stats.sql
+    "stats": f"""
+        SELECT landslide_v2.summary_from_filters({FILTER_ARGS}
+        );
+    """,
+    # (job_id, filters..., max_features) -> number of staged rows, as do
+    # the other stage_* statements
+    "stage_original": f"""
+        WITH staged AS (
+            INSERT INTO landslide_v2.export_staging (job_id, seq, feature)
+            SELECT %s, t.seq, t.feature::jsonb
+            FROM landslide_v2.export_original_from_filters({FILTER_ARGS},
+                %s   -- max_features
+            ) WITH ORDINALITY AS t(feature, seq)
+            RETURNING 1
+        )
+        SELECT count(*) FROM staged;
+    """,
+    # (job_id, filters..., max_features, property_names, coord_precision)
+    "stage_projected": f"""
+        WITH staged AS (
+            INSERT INTO landslide_v2.export_staging (job_id, seq, feature)
+            SELECT %s, t.seq, t.feature
+            FROM landslide_v2.export_projected_from_filters({FILTER_ARGS},
+                %s,  -- max_features
+                %s,  -- property_names
+                %s   -- coord_precision
+            ) WITH ORDINALITY AS t(feature, seq)
+            RETURNING 1
+        )
+        SELECT count(*) FROM staged;
+    """,
+    # (job_id, filters..., max_features, attribute_names, include_centroid)
+    "stage_attributes": f"""
+        WITH staged AS (
+            INSERT INTO landslide_v2.export_staging (job_id, seq, feature)
+            SELECT %s, t.seq, t.feature::jsonb
+            FROM landslide_v2.export_attributes_from_filters({FILTER_ARGS},
+                %s,  -- max_features
+                %s,  -- attribute_names
+                %s   -- include_centroid
+            ) WITH ORDINALITY AS t(feature, seq)
+            RETURNING 1
+        )
+        SELECT count(*) FROM staged;
+    """,
+    # (filters..., max_features)
+    "stream_original": f"""
+        SELECT f.feature::jsonb AS feature
+        FROM landslide_v2.export_original_from_filters({FILTER_ARGS},
+            %s   -- max_features
+        ) AS f(feature);
+    """,
+    # (filters..., max_features, property_names, coord_precision)
+    "stream_projected": f"""
+        SELECT f.feature
+        FROM landslide_v2.export_projected_from_filters({FILTER_ARGS},
+            %s,  -- max_features
+            %s,  -- property_names
+            %s   -- coord_precision
+        ) AS f(feature);
+    """,
+    # (filters..., max_features, attribute_names, include_centroid)
+    "stream_attributes": f"""
+        SELECT t.feature::text AS feature
+        FROM landslide_v2.export_attributes_from_filters({FILTER_ARGS},
+            %s,  -- max_features
+            %s,  -- attribute_names
+            %s   -- include_centroid
+        ) AS t(feature);
+    """,
+    # (job_id) - re-staging after a crash must not duplicate rows; also
+    # sweeps leftovers of jobs that never finished
+    "clear_staged": """
+        DELETE FROM landslide_v2.export_staging
+        WHERE job_id = %s OR created_at < now() - interval '1 day';
+    """,
+    # (job_id)
+    "drop_staged": """
+        DELETE FROM landslide_v2.export_staging WHERE job_id = %s;
+    """,
+    # (selection_hash, selection_geojson, simplify_tolerance_m, max_vertices)
+    "prepare_selection": """
+        SELECT landslide_v2.prepare_selection(%s, %s, %s, %s);
+    """,
+    # (materials, movements, confidences) - slider histograms, from the
+    # precomputed sql/attribute_histograms.sql
+    "attribute_histograms": """
+        SELECT landslide_v2.attribute_histograms_for(%s, %s, %s);
+    """,
+    # (source, viewer_id, include_geom)
+    "landslide_props": """
+        SELECT landslide_v2.get_landslide_props(%s, %s, %s);
+    """,
+    # () - replay lag in seconds; 0 when everything received has been
+    # replayed (an idle primary has no new transactions, so the replay
+    # timestamp alone ages)
+    "replica_lag": """
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery()
+              OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END::float8;
+    """,
+}
+
+
+def _numbered_form(sql: str, placeholder) -> Tuple[str, int]:
+    # %s placeholders -> placeholder(1), placeholder(2), ...
+    count = 0
+
+    def number(_):
+        nonlocal count
+        count += 1
+        return placeholder(count)
+
+    return re.sub(r"%s", number, sql).strip().rstrip(";"), count
+
+
+# name -> (statement with $1, $2, ..., number of parameters)
+_NUMBERED = {name: _numbered_form(sql, lambda i: f"${i}") for name, sql in STATEMENTS.items()}
+# name -> statement with :a1, :a2, ... (pg8000's run() / prepare() placeholders)
+_NAMED = {name: _numbered_form(sql, lambda i: f":a{i}")[0] for name, sql in STATEMENTS.items()}
+
+# connection -> {name: pg8000 PreparedStatement}. Prepared statements live as
+# long as the session and survive rollbacks; a PreparedStatement holds its
+# connection, so the entry is dropped explicitly with the connection
+# (forget(), db.py) or by deallocate().
+_prepared_on: Dict[Any, Dict[str, Any]] = {}
+
+
+def numbered(name: str) -> str:
+    """The statement `name` with $1, $2, ... placeholders (e.g. for asyncpg)."""
+    return _NUMBERED[name][0]
+
+
+# The export statements run for minutes and aren't checkpointed, so running
+# them again under EXPLAIN ANALYZE would double an export's time inside the
+# worker's deadline: their plans are captured without ANALYZE. (The count of
+# the same filters has the analyzed filter plan.)
+PLAN_ONLY_STATEMENTS = frozenset(
+    name for name in STATEMENTS if name.startswith(("stage_", "stream_"))
+)
+
+
+def execute(conn, name: str, args: tuple = (), filters: Optional[Filters] = None) -> tuple:
+    """Run the registered statement `name` on `conn` (prepared, see above); returns its rows."""
+    count = _NUMBERED[name][1]
+    if len(args) != count:
+        raise TypeError(f"{name} takes {count} arguments, got {len(args)}")
+    params = {f"a{i}": value for i, value in enumerate(args, 1)}
+
+    started = time.perf_counter()
+    if not PREPARED_STATEMENTS:
+        rows = conn.run(_NAMED[name], **params)
+    else:
+        prepared = _prepared_on.setdefault(conn, {})
+        statement = prepared.get(name)
+        if statement is None:
+            with span("db.prepare"):
+                statement = prepared[name] = conn.prepare(_NAMED[name])
+            started = time.perf_counter()
+        rows = statement.run(**params)
+
+    ms = (time.perf_counter() - started) * 1000
+    if profile.should_capture(ms):
+        analyze = name not in PLAN_ONLY_STATEMENTS
+        profile.capture(conn, name, STATEMENTS[name], args, ms, filters, analyze=analyze)
+    return rows
+
+
+def deallocate(conn):
+    """Close the statements prepared on `conn`; the next execute() re-prepares."""
+    for statement in forget(conn).values():
+        statement.close()
+
+
+def forget(conn) -> Dict[str, Any]:
+    """Drop (and return) what is kept about `conn`, e.g. when it is closed."""
+    return _prepared_on.pop(conn, None) or {}
+
+
+def prepare_selection(conn, filters: Filters) -> Optional[str]:
+    """
+    Make sure the selection polygon of `filters` is prepared (valid,
+    simplified, EPSG:3857, subdivided) in landslide_v2.selection_cache and
+    return its hash. The count / export SQL only ever see the hash, via
+    landslide_v2.selection_geom(hash); the GeoJSON is parsed once per polygon.
+    Commits.
+    """
+    selection_hash = filters.selection_hash
+    if not selection_hash:
+        return None
+
+    with span("db.prepare_selection"):
+        rows = execute(conn, "prepare_selection", (
+            selection_hash,
+            filters.selection_text,
+            SELECTION_SIMPLIFY_TOLERANCE_M,
+            SELECTION_MAX_VERTICES,
+        ))
+    conn.commit()
+    return rows[0][0]
+
+
+def stage_filtered(
+    conn,
+    job_id: str,
+    filters: Filters,
+    max_features: int,
+    attributes: Optional[Dict[str, Any]] = None,
+    projection: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    Run the export query of `filters` once, inside Postgres, into
+    landslide_v2.export_staging keyed by (job_id, seq); returns the number
+    of staged rows. The selection must be prepared and the transaction is
+    left open.
+
+    attributes={"columns": [...], "centroid": bool} stages flat attribute
+    rows (csv exports), projection={"properties": [...], "precision": n}
+    projected features, otherwise the features are staged as they are.
+    """
+    if attributes is not None:
+        name = "stage_attributes"
+        args = (job_id, *filters.sql_args(), max_features,
+                attributes["columns"], bool(attributes.get("centroid")))
+    elif projection:
+        name = "stage_projected"
+        args = (job_id, *filters.sql_args(), max_features,
+                projection.get("properties"), projection.get("precision"))
+    else:
+        name = "stage_original"
+        args = (job_id, *filters.sql_args(), max_features)
+
+    with span("db.execute"):
+        rows = execute(conn, name, args, filters)
+    return rows[0][0]
@@ -0,0 +1,148 @@
+"""
+Structured logging and low-overhead request tracing for the Lambdas.
+
+One trace per request / SQS message; spans inside it add up their wall time
+per name (a span entered once per chunk costs two perf_counter() calls):
+
+    with trace("worker", "download", job_id=job_id, lane=lane):
+        record("queue.wait", wait_ms)
+        with span("db.connect"):
+            conn = ...
+
+When the trace ends it is emitted as one CloudWatch Embedded Metric Format
+(EMF) line - the span timings become metrics under TRACE_NAMESPACE with the
+dimensions Service / Operation, the other fields stay searchable in Logs
+Insights. Only a TRACE_SAMPLE_RATE fraction of traces is emitted, plus every
+failed trace and every trace slower than TRACE_SLOW_MS; the record carries
+its SampleRate so counts can be scaled back up.
+
+log() writes one JSON line per event instead of free-form prints; DEBUG
+lines are dropped (and never serialized) unless LOG_LEVEL=DEBUG.
+
+Spans and record() outside a trace are no-ops, so shared code (export
+writers, the local FastAPI app) can use them unconditionally.
+"""
+
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+TRACE_NAMESPACE = os.getenv("TRACE_NAMESPACE", "LandslideViewer")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "5000"))
+
+_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+LOG_LEVEL = _LEVELS.get(os.getenv("LOG_LEVEL", "INFO").upper(), 20)
+
+
+class Trace:
+    """Timings (ms, summed per span name) and fields of one request."""
+
+    def __init__(self, service: str, operation: str, **fields: Any):
+        self.service = service
+        self.operation = operation
+        self.trace_id = uuid4().hex[:16]
+        self.fields: Dict[str, Any] = dict(fields)
+        self.timings: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.sampled = random.random() < TRACE_SAMPLE_RATE
+        self._started = time.perf_counter()
+
+    def add(self, name: str, ms: float):
+        self.timings[name] = self.timings.get(name, 0.0) + ms
+
+    def emit(self):
+        total_ms = (time.perf_counter() - self._started) * 1000
+        if not (self.sampled or self.error or total_ms >= TRACE_SLOW_MS):
+            return
+        timings = dict(self.timings, total=total_ms)
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": TRACE_NAMESPACE,
+                    "Dimensions": [["Service", "Operation"]],
+                    "Metrics": [{"Name": name, "Unit": "Milliseconds"} for name in timings],
+                }],
+            },
+            "Service": self.service,
+            "Operation": self.operation,
+            "trace_id": self.trace_id,
+            "SampleRate": TRACE_SAMPLE_RATE if self.sampled else 1.0,
+            **{k: v for k, v in self.fields.items() if v is not None},
+            **{name: round(ms, 2) for name, ms in timings.items()},
+        }
+        if self.error:
+            record["error"] = self.error
+        print(json.dumps(record, default=str))
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+@contextmanager
+def trace(service: str, operation: str, **fields: Any):
+    """Trace one request; emitted (if sampled, failed or slow) on exit."""
+    t = Trace(service, operation, **fields)
+    token = _current.set(t)
+    try:
+        yield t
+    except BaseException as e:
+        t.error = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        t.emit()
+
+
+@contextmanager
+def span(name: str):
+    """Add the wall time of the block to the current trace under `name`."""
+    t = _current.get()
+    if t is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        t.add(name, (time.perf_counter() - started) * 1000)
+
+
+def record(name: str, ms: float):
+    """Add a duration measured elsewhere (e.g. SQS queue wait)."""
+    t = _current.get()
+    if t is not None:
+        t.add(name, ms)
+
+
+def annotate(**fields: Any):
+    """Attach fields (job id, lane, row counts ...) to the current trace."""
+    t = _current.get()
+    if t is not None:
+        t.fields.update(fields)
+
+
+def fail(error: str):
+    """Mark the current trace as failed (handled errors are not raised)."""
+    t = _current.get()
+    if t is not None:
+        t.error = error
+
+
+def log(message: str, level: str = "INFO", **fields: Any):
+    """One structured JSON log line, tagged with the current trace."""
+    if _LEVELS.get(level, 20) < LOG_LEVEL:
+        return
+    line = {"level": level, "message": message}
+    t = _current.get()
+    if t is not None:
+        line["trace_id"] = t.trace_id
+        line["Service"] = t.service
+    line.update(fields)
+    print(json.dumps(line, default=str))
@@ -0,0 +1,23 @@
+#!/usr/bin/env bash
+# Tiles/s vs number of Martin instances (local, docker compose "load" profile).
+#
+#   ./load/run.sh              # 1, 2 and 4 instances
+#   INSTANCES="1 3 6" VUS=128 DURATION=2m ./load/run.sh
+#
+# Instance size follows MARTIN_CPUS / MARTIN_MEMORY / MARTIN_WORKERS /
+# MARTIN_POOL_SIZE (defaults: one 0.5 vCPU Fargate task). Needs the PostGIS
+# container on the external "pgnet" network, like `docker compose up`.
+set -euo pipefail
+cd "$(dirname "$0")/.."
+
+INSTANCES="${INSTANCES:-1 2 4}"
+
+for n in $INSTANCES; do
+    docker compose --profile load up -d --scale martin-load="$n" martin-load martin-lb >/dev/null
+    docker compose --profile load restart martin-lb >/dev/null
+    sleep 5
+    printf 'instances=%s ' "$n"
+    docker compose --profile load run --rm k6
+done
+
+docker compose --profile load stop martin-load martin-lb >/dev/null
@@ -0,0 +1,66 @@
+// k6 tile load profile: closed loop of VUS virtual users requesting random
+// ls_landslides_q tiles over Cascadia at z5-z11 (cluster below z9, raw from
+// z9, like the viewer), a third of them filtered. Throughput = http_reqs/s.
+import http from 'k6/http';
+import {check} from 'k6';
+
+const TILES_URL = __ENV.TILES_URL || 'http://localhost:3100';
+
+export const options = {
+    vus: Number(__ENV.VUS || 64),
+    duration: __ENV.DURATION || '60s',
+    thresholds: {
+        http_req_failed: ['rate<0.01'],
+    },
+};
+
+// Canonical filter queries, as built by frontend/src/filter-panel/filterQuery.js
+const FILTERS = [
+    '',
+    '',
+    '',
+    '',
+    'materials=Rock',
+    'movements=Flow%2CSlide',
+    'confidences=High&materials=Debris%2CEarth',
+];
+
+const BBOX = {west: -125.0, south: 40.0, east: -116.5, north: 49.5};
+const Z_RAW = 9;
+
+function tileOf(lon, lat, z) {
+    const n = 2 ** z;
+    const x = Math.floor((lon + 180) / 360 * n);
+    const rad = lat * Math.PI / 180;
+    const y = Math.floor((1 - Math.asinh(Math.tan(rad)) / Math.PI) / 2 * n);
+    return [x, y];
+}
+
+export default function () {
+    const z = 5 + Math.floor(Math.random() * 7);
+    const lon = BBOX.west + Math.random() * (BBOX.east - BBOX.west);
+    const lat = BBOX.south + Math.random() * (BBOX.north - BBOX.south);
+    const [x, y] = tileOf(lon, lat, z);
+
+    const mode = z < Z_RAW ? 'cluster' : 'raw';
+    const filter = FILTERS[Math.floor(Math.random() * FILTERS.length)];
+    // mode sorts between the filter keys; order does not matter to Martin
+    const query = filter ? `${filter}&mode=${mode}` : `mode=${mode}`;
+
+    const res = http.get(`${TILES_URL}/ls_landslides_q/${z}/${x}/${y}?${query}`, {
+        tags: {name: `z${z}-${mode}`},
+    });
+    check(res, {'status 200/204': (r) => r.status === 200 || r.status === 204});
+}
+
+export function handleSummary(data) {
+    const m = data.metrics;
+    const line = {
+        vus: options.vus,
+        tiles_per_s: Number(m.http_reqs.values.rate.toFixed(1)),
+        p50_ms: Number(m.http_req_duration.values.med.toFixed(1)),
+        p95_ms: Number(m.http_req_duration.values['p(95)'].toFixed(1)),
+        failed: m.http_req_failed.values.rate,
+    };
+    return {stdout: JSON.stringify(line) + '\n'};
+}
@@ -0,0 +1,170 @@
+-- Precomputed histograms of the numeric filter attributes (filter panel sliders).
+--
+-- The sliders show how the landslides are distributed over PGA, PGV,
+-- PSA 0.3s, MMI and annual rain, for the categorical filters currently set.
+-- Binning the matching rows on every request would scan them all; instead
+-- the counts per (attribute, material / movement / confidence code, bin)
+-- are stored once, so a histogram is a sum over at most a few thousand
+-- rows of this table, however many landslides there are:
+--
+--   SELECT landslide_v2.attribute_histograms_for('{Rock}', NULL, NULL);
+--   -> {"pga": {"lo": 0, "hi": 150, "counts": [...]}, "pgv": {...}, ...}
+--
+-- Codes are those of landslide_v2.category_codes (sql/tile_cells.sql) and
+-- the values the columns of landslide_v2.landslide_attributes
+-- (sql/summary_stats.sql, apply it too). landslide_v2.refresh_tile_cells()
+-- rebuilds the histograms once both files are applied,
+-- refresh_tile_cells_for() adjusts them for the landslides it reloads and
+-- landslides.refresh_merc_views() rebuilds them as well (e.g. after
+-- rebinning).
+
+-- Bins per attribute: `bins` equal bins over the slider range lo..hi
+-- (frontend/src/main.js DEFAULT_NUMERIC_BOUNDS); values outside it are
+-- counted in the first / last bin. Edit and refresh to rebin.
+CREATE TABLE IF NOT EXISTS landslide_v2.histogram_bins (
+    attribute text             PRIMARY KEY,   -- filter key = landslide_attributes column
+    lo        double precision NOT NULL,
+    hi        double precision NOT NULL,
+    bins      integer          NOT NULL CHECK (bins > 0)
+);
+
+INSERT INTO landslide_v2.histogram_bins (attribute, lo, hi, bins) VALUES
+    ('pga',   0, 150,  60),
+    ('pgv',   0, 150,  60),
+    ('psa03', 0, 300,  60),
+    ('mmi',   1, 10,   36),
+    ('rain',  0, 5500, 55)
+ON CONFLICT (attribute) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS landslide_v2.attribute_histograms (
+    attribute       text     NOT NULL,
+    material_code   smallint,
+    movement_code   smallint,
+    confidence_code smallint,
+    bin             integer  NOT NULL,   -- 1..bins
+    n               integer  NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS attribute_histograms_attribute_idx
+    ON landslide_v2.attribute_histograms (attribute, bin);
+
+
+-- Rebuild from landslide_attributes (sql/summary_stats.sql): its numeric
+-- columns are the binned values and its codes the categories, so a full
+-- rebuild and the incremental adjustments read the same values. With the
+-- temp table tile_cells_keys (refresh_tile_cells_for()) only the counts of
+-- those landslides are added instead, `sign` times: load_tile_cells()
+-- subtracts them (-1) before landslide_attributes is refreshed and adds them
+-- back (1) after.
+DROP FUNCTION IF EXISTS landslide_v2.refresh_attribute_histograms();
+CREATE OR REPLACE FUNCTION landslide_v2.refresh_attribute_histograms(sign integer DEFAULT 1)
+RETURNS bigint
+LANGUAGE plpgsql VOLATILE AS $$
+DECLARE
+    incremental constant boolean := to_regclass('pg_temp.tile_cells_keys') IS NOT NULL;
+    n bigint;
+BEGIN
+    IF to_regclass('landslide_v2.landslide_attributes') IS NULL THEN
+        RAISE NOTICE 'attribute_histograms not refreshed: landslide_attributes (sql/summary_stats.sql) is missing';
+        RETURN 0;
+    END IF;
+
+    -- values by attribute name (landslide_attributes has a column per
+    -- histogram attribute, already NULL for non-numeric text)
+    IF NOT incremental THEN
+        TRUNCATE landslide_v2.attribute_histograms;
+        INSERT INTO landslide_v2.attribute_histograms (
+            attribute, material_code, movement_code, confidence_code, bin, n
+        )
+        SELECT b.attribute, a.material_code, a.movement_code, a.confidence_code,
+               least(b.bins, greatest(1, width_bucket(v.value, b.lo, b.hi, b.bins))),
+               count(*)
+        FROM landslide_v2.landslide_attributes a
+        CROSS JOIN landslide_v2.histogram_bins b
+        CROSS JOIN LATERAL (
+            SELECT (to_jsonb(a) ->> b.attribute)::double precision AS value
+        ) AS v
+        WHERE v.value IS NOT NULL
+        GROUP BY 1, 2, 3, 4, 5;
+        GET DIAGNOSTICS n = ROW_COUNT;
+        ANALYZE landslide_v2.attribute_histograms;
+    ELSE
+        CREATE TEMP TABLE attribute_histograms_new ON COMMIT DROP AS
+        SELECT b.attribute, a.material_code, a.movement_code, a.confidence_code,
+               least(b.bins, greatest(1, width_bucket(v.value, b.lo, b.hi, b.bins))) AS bin,
+               sign * count(*) AS n
+        FROM tile_cells_keys k
+        JOIN landslide_v2.landslide_attributes a
+            ON a.source = k.source AND a.viewer_id = k.viewer_id
+        CROSS JOIN landslide_v2.histogram_bins b
+        CROSS JOIN LATERAL (
+            SELECT (to_jsonb(a) ->> b.attribute)::double precision AS value
+        ) AS v
+        WHERE v.value IS NOT NULL
+        GROUP BY 1, 2, 3, 4, 5;
+
+        -- merge the deltas into the rows they touch
+        WITH
+        touched AS (
+            DELETE FROM landslide_v2.attribute_histograms h
+            USING (SELECT DISTINCT attribute, material_code, movement_code, confidence_code, bin
+                   FROM attribute_histograms_new) AS d
+            WHERE h.attribute = d.attribute AND h.bin = d.bin
+              AND h.material_code   IS NOT DISTINCT FROM d.material_code
+              AND h.movement_code   IS NOT DISTINCT FROM d.movement_code
+              AND h.confidence_code IS NOT DISTINCT FROM d.confidence_code
+            RETURNING h.attribute, h.material_code, h.movement_code, h.confidence_code, h.bin, h.n
+        )
+        INSERT INTO landslide_v2.attribute_histograms (
+            attribute, material_code, movement_code, confidence_code, bin, n
+        )
+        SELECT attribute, material_code, movement_code, confidence_code, bin, sum(t.n)
+        FROM (
+            SELECT * FROM touched
+            UNION ALL
+            SELECT * FROM attribute_histograms_new
+        ) AS t
+        GROUP BY 1, 2, 3, 4, 5
+        HAVING sum(t.n) > 0;
+        GET DIAGNOSTICS n = ROW_COUNT;
+        DROP TABLE attribute_histograms_new;
+    END IF;
+
+    RETURN n;
+END $$;
+
+
+-- Histograms of every attribute for the categorical filters (NULL or an
+-- empty list = no filter), as one JSON object keyed by attribute
+CREATE OR REPLACE FUNCTION landslide_v2.attribute_histograms_for(
+    materials   text[] DEFAULT NULL,
+    movements   text[] DEFAULT NULL,
+    confidences text[] DEFAULT NULL
+)
+RETURNS json
+LANGUAGE sql STABLE PARALLEL SAFE AS $$
+WITH
+codes AS (
+    SELECT landslide_v2.category_codes_for('material',   nullif(materials, '{}'))   AS mat,
+           landslide_v2.category_codes_for('movement',   nullif(movements, '{}'))   AS mov,
+           landslide_v2.category_codes_for('confidence', nullif(confidences, '{}')) AS conf
+),
+counts AS (
+    SELECT h.attribute, h.bin, sum(h.n) AS n
+    FROM landslide_v2.attribute_histograms h, codes k
+    WHERE (k.mat  IS NULL OR h.material_code   = ANY (k.mat))
+      AND (k.mov  IS NULL OR h.movement_code   = ANY (k.mov))
+      AND (k.conf IS NULL OR h.confidence_code = ANY (k.conf))
+    GROUP BY h.attribute, h.bin
+)
+SELECT coalesce(json_object_agg(b.attribute, json_build_object(
+           'lo', b.lo,
+           'hi', b.hi,
+           'counts', (
+               SELECT json_agg(coalesce(c.n, 0) ORDER BY g.bin)
+               FROM generate_series(1, b.bins) AS g(bin)
+               LEFT JOIN counts c ON c.attribute = b.attribute AND c.bin = g.bin
+           )
+       ) ORDER BY b.attribute), '{}'::json)
+FROM landslide_v2.histogram_bins b;
+$$;
@@ -0,0 +1,80 @@
+-- Attribute-only (CSV) exports (download worker, format = "csv").
+--
+-- Same filter arguments as export_original_from_filters(...), but returns one
+-- flat jsonb object of attributes per landslide and never serializes the
+-- geometry. Ids come from lsviewer_filtered_ids(...) (source, viewer_id) and
+-- the attributes from get_landslide_props(...), the function behind the
+-- details API, so both stay the single source of truth for filtering and
+-- harmonized properties.
+--
+--   attribute_names  - lower-case property names to keep (NULL = all);
+--                      source and viewer_id are always available
+--   include_centroid - add lon / lat of the geometry centroid (EPSG:4326);
+--                      only then is the geometry read at all
+--
+-- Numeric filter arguments are numeric so they cast implicitly to whatever
+-- lsviewer_filtered_ids(...) declares.
+
+CREATE OR REPLACE FUNCTION landslide_v2.export_attributes_from_filters(
+    materials        text[],
+    movements        text[],
+    confidences      text[],
+    pga_min          numeric,
+    pga_max          numeric,
+    pgv_min          numeric,
+    pgv_max          numeric,
+    psa03_min        numeric,
+    psa03_max        numeric,
+    mmi_min          numeric,
+    mmi_max          numeric,
+    tol_pga          numeric,
+    tol_pgv          numeric,
+    tol_psa03        numeric,
+    tol_mmi          numeric,
+    rain_min         numeric,
+    rain_max         numeric,
+    tol_rain         numeric,
+    selection        geometry,
+    max_features     integer,
+    attribute_names  text[]  DEFAULT NULL,
+    include_centroid boolean DEFAULT false
+)
+RETURNS SETOF jsonb
+LANGUAGE sql STABLE PARALLEL SAFE AS $$
+    SELECT
+        (
+            SELECT coalesce(jsonb_object_agg(a.key, a.value), '{}'::jsonb)
+            FROM jsonb_each(
+                coalesce(d.payload -> 'properties', '{}'::jsonb)
+                || jsonb_build_object('source', f.source, 'viewer_id', f.viewer_id)
+            ) AS a
+            WHERE attribute_names IS NULL OR lower(a.key) = ANY (attribute_names)
+        )
+        || CASE
+            WHEN include_centroid AND c.centroid IS NOT NULL THEN jsonb_build_object(
+                'lon', round(ST_X(c.centroid)::numeric, 6),
+                'lat', round(ST_Y(c.centroid)::numeric, 6)
+            )
+            ELSE '{}'::jsonb
+        END
+    FROM landslide_v2.lsviewer_filtered_ids(
+        materials, movements, confidences,
+        pga_min, pga_max, pgv_min, pgv_max,
+        psa03_min, psa03_max, mmi_min, mmi_max,
+        tol_pga, tol_pgv, tol_psa03, tol_mmi,
+        rain_min, rain_max, tol_rain,
+        selection
+    ) AS f
+    CROSS JOIN LATERAL (
+        SELECT landslide_v2.get_landslide_props(
+            f.source::text, f.viewer_id::text, include_centroid
+        )::jsonb AS payload
+    ) AS d
+    CROSS JOIN LATERAL (
+        SELECT CASE
+            WHEN include_centroid AND d.payload ? 'geometry' THEN
+                ST_Centroid(ST_GeomFromGeoJSON(d.payload ->> 'geometry'))
+        END AS centroid
+    ) AS c
+    LIMIT max_features;
+$$;
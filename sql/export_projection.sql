@@ -0,0 +1,77 @@
+-- Column projection / coordinate precision for exports (download worker).
+--
+-- Same filter arguments as export_original_from_filters(...), but builds each
+-- feature with only the requested properties and its geometry written once,
+-- by ST_AsGeoJSON at the requested precision: dropped properties and extra
+-- coordinate digits never reach the staging table, the worker's
+-- serialization loop or the exported file, and no full feature is built
+-- only to be cut down again. As in export_attributes_from_filters(...), ids
+-- come from lsviewer_filtered_ids(...) and properties from
+-- get_landslide_props(...); the geometry is read from ls_points /
+-- ls_polygons.
+--
+--   property_names  - lower-case property names to keep (NULL = all)
+--   coord_precision - decimal places of the coordinates (NULL = ST_AsGeoJSON's
+--                     default of 9)
+--
+-- Numeric filter arguments are numeric so they cast implicitly to whatever
+-- lsviewer_filtered_ids(...) declares.
+
+CREATE OR REPLACE FUNCTION landslide_v2.export_projected_from_filters(
+    materials       text[],
+    movements       text[],
+    confidences     text[],
+    pga_min         numeric,
+    pga_max         numeric,
+    pgv_min         numeric,
+    pgv_max         numeric,
+    psa03_min       numeric,
+    psa03_max       numeric,
+    mmi_min         numeric,
+    mmi_max         numeric,
+    tol_pga         numeric,
+    tol_pgv         numeric,
+    tol_psa03       numeric,
+    tol_mmi         numeric,
+    rain_min        numeric,
+    rain_max        numeric,
+    tol_rain        numeric,
+    selection       geometry,
+    max_features    integer,
+    property_names  text[]  DEFAULT NULL,
+    coord_precision integer DEFAULT NULL
+)
+RETURNS SETOF jsonb
+LANGUAGE sql STABLE PARALLEL SAFE AS $$
+    SELECT jsonb_build_object(
+        'type', 'Feature',
+        'geometry', ST_AsGeoJSON(ST_Transform(g.geom, 4326), coalesce(coord_precision, 9))::jsonb,
+        'properties', (
+            SELECT coalesce(jsonb_object_agg(p.key, p.value), '{}'::jsonb)
+            FROM jsonb_each(coalesce(d.payload -> 'properties', '{}'::jsonb)) AS p
+            WHERE property_names IS NULL OR lower(p.key) = ANY (property_names)
+        )
+    )
+    FROM landslide_v2.lsviewer_filtered_ids(
+        materials, movements, confidences,
+        pga_min, pga_max, pgv_min, pgv_max,
+        psa03_min, psa03_max, mmi_min, mmi_max,
+        tol_pga, tol_pgv, tol_psa03, tol_mmi,
+        rain_min, rain_max, tol_rain,
+        selection
+    ) AS f
+    CROSS JOIN LATERAL (
+        SELECT landslide_v2.get_landslide_props(
+            f.source::text, f.viewer_id::text, false
+        )::jsonb AS payload
+    ) AS d
+    LEFT JOIN LATERAL (
+        SELECT pt.geom FROM landslides.ls_points pt
+        WHERE pt.source = f.source::text AND pt.viewer_id = f.viewer_id::text
+        UNION ALL
+        SELECT pg.geom FROM landslides.ls_polygons pg
+        WHERE pg.source = f.source::text AND pg.viewer_id = f.viewer_id::text
+        LIMIT 1
+    ) AS g ON true
+    LIMIT max_features;
+$$;
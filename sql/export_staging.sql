@@ -0,0 +1,19 @@
+-- Staging table for chunked / resumable exports (download worker).
+--
+-- The worker runs landslide_v2.export_original_from_filters(...) once per job
+-- and stores the features here in output order (seq = 1..n). The GeoJSON is
+-- then written to S3 in ordered seq ranges, one multipart part at a time, so
+-- an export interrupted by the Lambda timeout resumes from its last part.
+-- Rows are deleted when the job finishes; leftovers older than a day are
+-- swept the next time a job is staged.
+
+CREATE UNLOGGED TABLE IF NOT EXISTS landslide_v2.export_staging (
+    job_id     text        NOT NULL,
+    seq        bigint      NOT NULL,
+    feature    jsonb       NOT NULL,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (job_id, seq)
+);
+
+CREATE INDEX IF NOT EXISTS export_staging_created_at_idx
+    ON landslide_v2.export_staging (created_at);
@@ -0,0 +1,182 @@
+-- Bulk ingest of landslide inventories (ingest/ingest_inventory.py).
+--
+-- The loader COPYs each batch of features into landslides.ingest_staging
+-- as text (geometry as GeoJSON, WKT or hex WKB, properties as jsonb), then
+-- one call per batch does everything else set-based, in Postgres:
+--
+--   SELECT * FROM landslides.ingest_staged('batch-id');
+--
+--   deduplicate         one row per (source, viewer_id), the last one in
+--                       the input; the others are counted as duplicates
+--   parse + validate    ST_MakeValid, polygons / points only, empty and
+--                       unparseable geometries rejected (counted)
+--   reproject           to the SRID of the target geometry column
+--   upsert              into landslides.ls_points / ls_polygons on
+--                       (source, viewer_id); a landslide that changed from
+--                       point to polygon (or back) leaves the other table
+--
+-- Properties map onto the target columns by name, so whatever attribute
+-- columns ls_points / ls_polygons have are filled from the properties of
+-- the same name; unknown properties are ignored.
+-- The derived tables are then refreshed for the batch's keys only
+-- (landslide_v2.refresh_tile_cells_for, sql/tile_cells.sql).
+
+-- Unlogged: staged rows are only ever read back by the same loader run
+CREATE UNLOGGED TABLE IF NOT EXISTS landslides.ingest_staging (
+    batch_id   text    NOT NULL,
+    seq        bigint  NOT NULL,   -- position in the input; the last duplicate wins
+    source     text    NOT NULL,
+    viewer_id  text    NOT NULL,
+    geom_kind  text    NOT NULL CHECK (geom_kind IN ('geojson', 'wkt', 'wkb')),
+    geom       text,
+    srid       integer NOT NULL,
+    props      jsonb   NOT NULL DEFAULT '{}'
+);
+
+CREATE INDEX IF NOT EXISTS ingest_staging_batch_idx
+    ON landslides.ingest_staging (batch_id);
+
+-- The upsert key
+CREATE UNIQUE INDEX IF NOT EXISTS ls_points_source_viewer_id_key
+    ON landslides.ls_points (source, viewer_id);
+CREATE UNIQUE INDEX IF NOT EXISTS ls_polygons_source_viewer_id_key
+    ON landslides.ls_polygons (source, viewer_id);
+
+
+-- A staged geometry in `srid`, or NULL when it can't be parsed (the batch
+-- goes on without it)
+CREATE OR REPLACE FUNCTION landslides.ingest_geometry(kind text, value text, srid integer)
+RETURNS geometry
+LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE AS $$
+BEGIN
+    RETURN ST_SetSRID(CASE kind
+        WHEN 'geojson' THEN ST_GeomFromGeoJSON(value)
+        WHEN 'wkt'     THEN ST_GeomFromText(value)
+        WHEN 'wkb'     THEN ST_GeomFromWKB(decode(value, 'hex'))
+    END, srid);
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END $$;
+
+
+-- Upsert `source_rows` (temp table: source, viewer_id, g, props) into `target`;
+-- the columns written are geom, source, viewer_id and the target columns
+-- named by a property key. A value that isn't valid input for its column
+-- ("NA" for a number, ...) is stored as NULL (pg_input_is_valid, Postgres 16).
+CREATE OR REPLACE FUNCTION landslides.ingest_upsert(target regclass, source_rows regclass)
+RETURNS bigint
+LANGUAGE plpgsql VOLATILE AS $$
+DECLARE
+    cols   text[];
+    types  text[];
+    n      bigint;
+BEGIN
+    EXECUTE format($q$
+        SELECT array_agg(a.attname::text ORDER BY a.attnum),
+               array_agg(format_type(a.atttypid, a.atttypmod) ORDER BY a.attnum)
+        FROM pg_attribute a
+        WHERE a.attrelid = %L::regclass
+          AND a.attnum > 0 AND NOT a.attisdropped AND a.attgenerated = ''
+          AND a.attname NOT IN ('geom', 'source', 'viewer_id')
+          AND EXISTS (SELECT 1 FROM %s r WHERE r.props ? a.attname)
+    $q$, target, source_rows) INTO cols, types;
+    cols := coalesce(cols, '{}');
+
+    EXECUTE format($q$
+        INSERT INTO %1$s (source, viewer_id, geom%2$s)
+        SELECT r.source, r.viewer_id, r.g%3$s
+        FROM %4$s r
+        ON CONFLICT (source, viewer_id) DO UPDATE SET geom = EXCLUDED.geom%5$s
+    $q$,
+        target,
+        (SELECT string_agg(format(', %I', c), '' ORDER BY i)
+         FROM unnest(cols) WITH ORDINALITY AS u(c, i)),
+        (SELECT string_agg(CASE
+                    WHEN t IN ('json', 'jsonb') THEN format(', (r.props -> %L)::%s', c, t)
+                    ELSE format(', CASE WHEN pg_input_is_valid(r.props ->> %1$L, %2$L)'
+                                ' THEN (r.props ->> %1$L)::%2$s END', c, t)
+                END, '' ORDER BY i)
+         FROM unnest(cols, types) WITH ORDINALITY AS u(c, t, i)),
+        source_rows,
+        (SELECT string_agg(format(', %1$I = EXCLUDED.%1$I', c), '' ORDER BY i)
+         FROM unnest(cols) WITH ORDINALITY AS u(c, i))
+    );
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END $$;
+
+
+-- Validate, reproject and upsert the staged batch `batch`; rejected rows
+-- are removed from staging, so what is left are the keys to refresh.
+-- points + polygons + rejected + duplicates = staged rows.
+DROP FUNCTION IF EXISTS landslides.ingest_staged(text);
+CREATE OR REPLACE FUNCTION landslides.ingest_staged(batch text)
+RETURNS TABLE (points bigint, polygons bigint, rejected bigint, duplicates bigint)
+LANGUAGE plpgsql VOLATILE AS $$
+DECLARE
+    points_srid   constant integer := Find_SRID('landslides', 'ls_points', 'geom');
+    polygons_srid constant integer := Find_SRID('landslides', 'ls_polygons', 'geom');
+    multi         constant boolean := (
+        SELECT type LIKE 'MULTI%' FROM geometry_columns
+        WHERE f_table_schema = 'landslides' AND f_table_name = 'ls_polygons'
+          AND f_geometry_column = 'geom'
+    );
+BEGIN
+    CREATE TEMP TABLE ingest_rows ON COMMIT DROP AS
+    SELECT s.source, s.viewer_id, s.props, v.g,
+           CASE ST_Dimension(v.g) WHEN 0 THEN 'point' WHEN 2 THEN 'polygon' END AS kind
+    FROM (
+        SELECT DISTINCT ON (source, viewer_id) *
+        FROM landslides.ingest_staging
+        WHERE batch_id = batch
+        ORDER BY source, viewer_id, seq DESC
+    ) AS s
+    CROSS JOIN LATERAL (
+        SELECT landslides.ingest_geometry(s.geom_kind, s.geom, s.srid) AS raw
+    ) AS r
+    CROSS JOIN LATERAL (
+        -- repaired polygons can come back as collections: keep their
+        -- polygons (points / polygons only, lines are rejected)
+        SELECT CASE
+            WHEN r.raw IS NULL OR ST_IsEmpty(r.raw) THEN NULL
+            WHEN ST_Dimension(r.raw) = 0 THEN r.raw
+            WHEN ST_Dimension(r.raw) = 2 THEN
+                ST_CollectionExtract(CASE WHEN ST_IsValid(r.raw) THEN r.raw
+                                          ELSE ST_MakeValid(r.raw) END, 3)
+        END AS g
+    ) AS v;
+
+    -- earlier rows of a key repeated in the batch
+    duplicates := (SELECT count(*) FROM landslides.ingest_staging WHERE batch_id = batch)
+                  - (SELECT count(*) FROM ingest_rows);
+
+    DELETE FROM ingest_rows WHERE g IS NULL OR ST_IsEmpty(g) OR kind IS NULL;
+    GET DIAGNOSTICS rejected = ROW_COUNT;
+
+    CREATE TEMP TABLE ingest_points ON COMMIT DROP AS
+    SELECT source, viewer_id, props, ST_Transform(g, points_srid) AS g
+    FROM ingest_rows WHERE kind = 'point';
+
+    CREATE TEMP TABLE ingest_polygons ON COMMIT DROP AS
+    SELECT source, viewer_id, props,
+           CASE WHEN multi THEN ST_Multi(ST_Transform(g, polygons_srid))
+                ELSE ST_Transform(g, polygons_srid) END AS g
+    FROM ingest_rows WHERE kind = 'polygon';
+
+    -- a landslide is either a point or a polygon
+    DELETE FROM landslides.ls_polygons t USING ingest_points r
+    WHERE t.source = r.source AND t.viewer_id = r.viewer_id;
+    DELETE FROM landslides.ls_points t USING ingest_polygons r
+    WHERE t.source = r.source AND t.viewer_id = r.viewer_id;
+
+    points   := landslides.ingest_upsert('landslides.ls_points', 'ingest_points');
+    polygons := landslides.ingest_upsert('landslides.ls_polygons', 'ingest_polygons');
+
+    DELETE FROM landslides.ingest_staging s
+    WHERE s.batch_id = batch
+      AND NOT EXISTS (SELECT 1 FROM ingest_rows r
+                      WHERE r.source = s.source AND r.viewer_id = s.viewer_id);
+
+    DROP TABLE ingest_rows, ingest_points, ingest_polygons;
+    RETURN NEXT;
+END $$;
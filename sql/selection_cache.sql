@@ -0,0 +1,125 @@
+-- Prepared spatial selections (count / export / tile SQL).
+--
+-- A drawn or imported selection polygon is parsed and normalized once per
+-- distinct GeoJSON: made valid, simplified within a tolerance (metres, in
+-- EPSG:3857), transformed to 3857 and split with ST_Subdivide into small
+-- index-friendly parts. Callers then pass only the selection hash:
+--
+--   landslide_v2.prepare_selection(hash, geojson, tolerance, max_vertices)
+--       -> hash; computes and caches on first use, touches last_used_at after
+--   landslide_v2.selection_geom(hash)
+--       -> prepared geometry (3857), NULL for a NULL hash; the value passed as
+--          `selection` to lsviewer_filtered_ids / export_*_from_filters
+--   landslide_v2.selection_intersects(hash, g)
+--       -> g (3857) intersects the selection, tested against the subdivided
+--          parts through their GiST index (tiles: ls_landslides_q's
+--          `selection` param, and other SQL that does its own spatial test)
+--
+-- The hash is computed by the caller (sha256 of the canonical GeoJSON).
+-- Entries unused for 7 days are swept whenever a new selection is cached.
+
+CREATE TABLE IF NOT EXISTS landslide_v2.selection_cache (
+    hash          text        PRIMARY KEY,
+    geom          geometry(Geometry, 3857) NOT NULL,
+    vertices_in   integer     NOT NULL,
+    vertices_out  integer     NOT NULL,
+    created_at    timestamptz NOT NULL DEFAULT now(),
+    last_used_at  timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS selection_cache_last_used_idx
+    ON landslide_v2.selection_cache (last_used_at);
+
+CREATE TABLE IF NOT EXISTS landslide_v2.selection_cache_parts (
+    hash  text    NOT NULL REFERENCES landslide_v2.selection_cache (hash) ON DELETE CASCADE,
+    part  integer NOT NULL,
+    geom  geometry(Geometry, 3857) NOT NULL,
+    PRIMARY KEY (hash, part)
+);
+
+CREATE INDEX IF NOT EXISTS selection_cache_parts_gix
+    ON landslide_v2.selection_cache_parts USING GIST (geom);
+
+
+CREATE OR REPLACE FUNCTION landslide_v2.prepare_selection(
+    selection_hash    text,
+    selection_geojson text,
+    tolerance         double precision DEFAULT 5,
+    max_vertices      integer DEFAULT 256
+)
+RETURNS text
+LANGUAGE plpgsql VOLATILE AS $$
+DECLARE
+    raw geometry;
+    g   geometry;
+BEGIN
+    IF selection_hash IS NULL OR selection_geojson IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    UPDATE landslide_v2.selection_cache
+    SET last_used_at = now()
+    WHERE hash = selection_hash;
+    IF FOUND THEN
+        RETURN selection_hash;
+    END IF;
+
+    raw := ST_Transform(ST_SetSRID(ST_GeomFromGeoJSON(selection_geojson), 4326), 3857);
+    g := ST_CollectionExtract(ST_MakeValid(raw), 3);
+    IF tolerance > 0 THEN
+        g := ST_CollectionExtract(ST_MakeValid(ST_SimplifyPreserveTopology(g, tolerance)), 3);
+    END IF;
+    IF g IS NULL OR ST_IsEmpty(g) THEN
+        RAISE EXCEPTION 'selection_geojson does not contain a valid polygon';
+    END IF;
+
+    INSERT INTO landslide_v2.selection_cache (hash, geom, vertices_in, vertices_out)
+    VALUES (selection_hash, g, ST_NPoints(raw), ST_NPoints(g))
+    ON CONFLICT (hash) DO NOTHING;
+
+    IF FOUND THEN
+        INSERT INTO landslide_v2.selection_cache_parts (hash, part, geom)
+        SELECT selection_hash, row_number() OVER (), p.geom
+        FROM ST_Subdivide(g, max_vertices) AS p(geom);
+
+        DELETE FROM landslide_v2.selection_cache
+        WHERE last_used_at < now() - interval '7 days';
+    END IF;
+
+    RETURN selection_hash;
+END $$;
+
+
+CREATE OR REPLACE FUNCTION landslide_v2.selection_geom(selection_hash text)
+RETURNS geometry
+LANGUAGE plpgsql STABLE PARALLEL SAFE AS $$
+DECLARE
+    g geometry;
+BEGIN
+    IF selection_hash IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT c.geom INTO g
+    FROM landslide_v2.selection_cache c
+    WHERE c.hash = selection_hash;
+
+    -- A missing entry must not silently turn into "no spatial filter"
+    IF g IS NULL THEN
+        RAISE EXCEPTION 'selection % is not prepared', selection_hash;
+    END IF;
+    RETURN g;
+END $$;
+
+
+CREATE OR REPLACE FUNCTION landslide_v2.selection_intersects(selection_hash text, g geometry)
+RETURNS boolean
+LANGUAGE sql STABLE PARALLEL SAFE AS $$
+    SELECT selection_hash IS NULL OR EXISTS (
+        SELECT 1
+        FROM landslide_v2.selection_cache_parts p
+        WHERE p.hash = selection_hash
+          AND p.geom && g
+          AND ST_Intersects(p.geom, g)
+    );
+$$;
@@ -33,6 +33,10 @@ EXCEPTION WHEN feature_not_supported THEN
 END;
   ANALYZE landslides.ls_points_merc;
   ANALYZE landslides.ls_polygons_merc;
+  -- slider histograms (sql/attribute_histograms.sql), if applied
+  IF to_regclass('landslide_v2.attribute_histograms') IS NOT NULL THEN
+    PERFORM landslide_v2.refresh_attribute_histograms();
+  END IF;
 END $$;
 
 -- 10: points clustering function
@@ -0,0 +1,228 @@
+-- Statistics of a filtered set of landslides (worker job type "stats").
+--
+-- Counts by material / movement / confidence and geometry type, and the
+-- spread of the numeric attributes, for any filter - drawn selection
+-- included - as one small JSON document instead of a full export:
+--
+--   {"count": 1234,
+--    "geometry":   {"points": 1000, "polygons": 234},
+--    "categories": {"material": {"rock": 700, "debris": 500, "unknown": 34}, ...},
+--    "numeric":    {"pga": {"n", "min", "max", "mean", "median",
+--                           "distribution": {"lo", "hi", "counts": [...]}}, ...}}
+--
+-- The matching ids come from lsviewer_filtered_ids(...), as for counts, and
+-- are joined to landslide_v2.landslide_attributes: one narrow row per
+-- landslide with its category codes and numeric attributes as plain
+-- columns. Exports build every landslide's property document
+-- (get_landslide_props); here only a few fixed-width columns are read and
+-- grouped, in Postgres.
+--
+-- Codes are those of sql/tile_cells.sql and the distribution bins those of
+-- sql/attribute_histograms.sql (apply both first); refresh_tile_cells()
+-- rebuilds landslide_attributes once this file is applied.
+
+CREATE TABLE IF NOT EXISTS landslide_v2.landslide_attributes (
+    source          text    NOT NULL,
+    viewer_id       text    NOT NULL,
+    is_point        boolean NOT NULL,
+    material_code   smallint,
+    movement_code   smallint,
+    confidence_code smallint,
+    pga             real,
+    pgv             real,
+    psa03           real,
+    mmi             real,
+    rain            real,
+    PRIMARY KEY (source, viewer_id)
+);
+
+
+-- A property value as a number; non-numeric text (blank, "NA", ...) is NULL
+CREATE OR REPLACE FUNCTION landslide_v2.number_or_null(value text)
+RETURNS double precision
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CASE WHEN value ~ '^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$'
+                THEN value::double precision
+           END;
+$$;
+
+
+-- Rebuild from refresh_tile_cells()' source rows (temp table tile_cells_src,
+-- joined to tile_cells for the codes); only callable from there. After
+-- refresh_tile_cells_for() only the rows of its keys are replaced.
+CREATE OR REPLACE FUNCTION landslide_v2.refresh_landslide_attributes()
+RETURNS bigint
+LANGUAGE plpgsql VOLATILE AS $$
+DECLARE
+    n bigint;
+BEGIN
+    IF to_regclass('pg_temp.tile_cells_keys') IS NOT NULL THEN
+        DELETE FROM landslide_v2.landslide_attributes a
+        USING tile_cells_keys k
+        WHERE a.source = k.source AND a.viewer_id = k.viewer_id;
+    ELSE
+        TRUNCATE landslide_v2.landslide_attributes;
+    END IF;
+
+    INSERT INTO landslide_v2.landslide_attributes (
+        source, viewer_id, is_point,
+        material_code, movement_code, confidence_code,
+        pga, pgv, psa03, mmi, rain
+    )
+    SELECT c.source, c.viewer_id, c.is_point,
+           c.material_code, c.movement_code, c.confidence_code,
+           landslide_v2.number_or_null(s.props ->> 'pga'),
+           landslide_v2.number_or_null(s.props ->> 'pgv'),
+           landslide_v2.number_or_null(s.props ->> 'psa03'),
+           landslide_v2.number_or_null(s.props ->> 'mmi'),
+           landslide_v2.number_or_null(s.props ->> 'rain')
+    FROM tile_cells_src s
+    JOIN landslide_v2.tile_cells c
+        ON c.source = s.source AND c.viewer_id = s.viewer_id
+    ON CONFLICT (source, viewer_id) DO NOTHING;
+
+    GET DIAGNOSTICS n = ROW_COUNT;
+    IF to_regclass('pg_temp.tile_cells_keys') IS NULL THEN
+        ANALYZE landslide_v2.landslide_attributes;
+    END IF;
+    RETURN n;
+END $$;
+
+
+-- Summary of the landslides matching the filters (same arguments as
+-- export_attributes_from_filters without max_features / attribute_names).
+-- Landslides missing from landslide_attributes (not refreshed yet) still
+-- count, under "unknown".
+CREATE OR REPLACE FUNCTION landslide_v2.summary_from_filters(
+    materials   text[],
+    movements   text[],
+    confidences text[],
+    pga_min     numeric,
+    pga_max     numeric,
+    pgv_min     numeric,
+    pgv_max     numeric,
+    psa03_min   numeric,
+    psa03_max   numeric,
+    mmi_min     numeric,
+    mmi_max     numeric,
+    tol_pga     numeric,
+    tol_pgv     numeric,
+    tol_psa03   numeric,
+    tol_mmi     numeric,
+    rain_min    numeric,
+    rain_max    numeric,
+    tol_rain    numeric,
+    selection   geometry
+)
+RETURNS json
+LANGUAGE sql STABLE PARALLEL SAFE AS $$
+WITH
+matched AS (
+    SELECT a.*
+    FROM landslide_v2.lsviewer_filtered_ids(
+        materials, movements, confidences,
+        pga_min, pga_max, pgv_min, pgv_max,
+        psa03_min, psa03_max, mmi_min, mmi_max,
+        tol_pga, tol_pgv, tol_psa03, tol_mmi,
+        rain_min, rain_max, tol_rain,
+        selection
+    ) AS f
+    LEFT JOIN landslide_v2.landslide_attributes a
+        ON a.source = f.source::text AND a.viewer_id = f.viewer_id::text
+),
+groups AS (
+    -- one pass for the counts: a few hundred rows at most
+    SELECT is_point, material_code, movement_code, confidence_code, count(*) AS n
+    FROM matched
+    GROUP BY 1, 2, 3, 4
+),
+categories AS (
+    SELECT v.attribute, coalesce(c.key, 'unknown') AS key, sum(g.n) AS n
+    FROM groups g
+    CROSS JOIN LATERAL (VALUES
+        ('material',   g.material_code),
+        ('movement',   g.movement_code),
+        ('confidence', g.confidence_code)
+    ) AS v(attribute, code)
+    LEFT JOIN landslide_v2.category_codes c
+        ON c.attribute = v.attribute AND c.code = v.code
+    GROUP BY v.attribute, coalesce(c.key, 'unknown')
+),
+columns AS (
+    -- one pass for the spread, a column at a time (no unpivot of every row)
+    SELECT count(pga) AS pga_n, min(pga) AS pga_min, max(pga) AS pga_max, avg(pga) AS pga_mean,
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY pga) AS pga_median,
+           count(pgv) AS pgv_n, min(pgv) AS pgv_min, max(pgv) AS pgv_max, avg(pgv) AS pgv_mean,
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY pgv) AS pgv_median,
+           count(psa03) AS psa03_n, min(psa03) AS psa03_min, max(psa03) AS psa03_max, avg(psa03) AS psa03_mean,
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY psa03) AS psa03_median,
+           count(mmi) AS mmi_n, min(mmi) AS mmi_min, max(mmi) AS mmi_max, avg(mmi) AS mmi_mean,
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY mmi) AS mmi_median,
+           count(rain) AS rain_n, min(rain) AS rain_min, max(rain) AS rain_max, avg(rain) AS rain_mean,
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY rain) AS rain_median
+    FROM matched
+),
+spread AS (
+    SELECT v.attribute, v.n,
+           round(v.min::numeric, 4)    AS min,
+           round(v.max::numeric, 4)    AS max,
+           round(v.mean::numeric, 4)   AS mean,
+           round(v.median::numeric, 4) AS median
+    FROM columns c
+    CROSS JOIN LATERAL (VALUES
+        ('pga',   c.pga_n,   c.pga_min,   c.pga_max,   c.pga_mean,   c.pga_median),
+        ('pgv',   c.pgv_n,   c.pgv_min,   c.pgv_max,   c.pgv_mean,   c.pgv_median),
+        ('psa03', c.psa03_n, c.psa03_min, c.psa03_max, c.psa03_mean, c.psa03_median),
+        ('mmi',   c.mmi_n,   c.mmi_min,   c.mmi_max,   c.mmi_mean,   c.mmi_median),
+        ('rain',  c.rain_n,  c.rain_min,  c.rain_max,  c.rain_mean,  c.rain_median)
+    ) AS v(attribute, n, min, max, mean, median)
+    WHERE v.n > 0
+),
+binned AS MATERIALIZED (
+    SELECT v.attribute,
+           least(b.bins, greatest(1, width_bucket(v.value, b.lo, b.hi, b.bins))) AS bin,
+           count(*) AS n
+    FROM matched m
+    CROSS JOIN LATERAL (VALUES
+        ('pga', m.pga), ('pgv', m.pgv), ('psa03', m.psa03), ('mmi', m.mmi), ('rain', m.rain)
+    ) AS v(attribute, value)
+    JOIN landslide_v2.histogram_bins b ON b.attribute = v.attribute
+    WHERE v.value IS NOT NULL
+    GROUP BY 1, 2
+)
+SELECT json_build_object(
+    'count', (SELECT coalesce(sum(n), 0) FROM groups),
+    'geometry', json_build_object(
+        'points',   (SELECT coalesce(sum(n) FILTER (WHERE is_point), 0) FROM groups),
+        'polygons', (SELECT coalesce(sum(n) FILTER (WHERE NOT is_point), 0) FROM groups)
+    ),
+    'categories', (
+        SELECT coalesce(json_object_agg(g.attribute, g.counts), '{}'::json)
+        FROM (
+            SELECT attribute, json_object_agg(key, n ORDER BY n DESC, key) AS counts
+            FROM categories
+            GROUP BY attribute
+        ) AS g
+    ),
+    'numeric', (
+        SELECT coalesce(json_object_agg(s.attribute, json_build_object(
+            'n', s.n,
+            'min', s.min,
+            'max', s.max,
+            'mean', s.mean,
+            'median', s.median,
+            'distribution', json_build_object(
+                'lo', b.lo,
+                'hi', b.hi,
+                'counts', (
+                    SELECT json_agg(coalesce(x.n, 0) ORDER BY g.bin)
+                    FROM generate_series(1, b.bins) AS g(bin)
+                    LEFT JOIN binned x ON x.attribute = s.attribute AND x.bin = g.bin
+                )
+            )
+        ) ORDER BY s.attribute), '{}'::json)
+        FROM spread s
+        JOIN landslide_v2.histogram_bins b ON b.attribute = s.attribute
+    )
+);
+$$;
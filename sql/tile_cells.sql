@@ -0,0 +1,324 @@
+-- Dictionary-coded cluster tiles (ls_landslides_q, mode=cluster, z <= 8).
+--
+-- Filtered cluster tiles used to evaluate the categorical predicates
+-- (material / movement / confidence text lists) row by row inside every
+-- tile. Here each landslide is reduced once to a few small integers:
+--
+--   cx, cy            grid cell at level 11 (a z8 tile split 8 x 8, the
+--                     cluster grid of the tile functions), y from the north
+--   mx, my            EPSG:3857 position (centroid for polygons), averaged
+--                     into the cluster position
+--   *_code            dictionary codes from landslide_v2.category_codes
+--
+-- and the B-tree on (cx, cy) INCLUDEs the codes and the position, so a
+-- filtered cluster tile at z0-z8 is one index-only range scan: the tile's
+-- cell range on cx / cy, the code lists checked on the index tuples, the
+-- 8 x 8 clusters a GROUP BY on (cx >> (8 - z), cy >> (8 - z)).
+--
+-- Category values are matched by landslide_v2.category_key(value):
+-- trimmed, lower-case, with the spelling variants the filter panel knows
+-- (landslide-filters-config.js matchValues) folded into one key.
+--
+-- Refresh after loading data, then VACUUM so the index-only scans do not
+-- fall back to heap fetches (VACUUM cannot run inside a function):
+--
+--   SELECT landslide_v2.refresh_tile_cells();
+--   VACUUM (ANALYZE) landslide_v2.tile_cells;
+--
+-- benchmarks/filtered_tiles.py does both with --refresh. After an ingest,
+-- refresh_tile_cells_for(sources, viewer_ids) replaces only the rows of
+-- the landslides loaded (ingest/ingest_inventory.py calls it per batch).
+
+CREATE TABLE IF NOT EXISTS landslide_v2.category_codes (
+    attribute text     NOT NULL,   -- material | movement | confidence
+    key       text     NOT NULL,   -- landslide_v2.category_key(value)
+    code      smallint NOT NULL,
+    PRIMARY KEY (attribute, key),
+    UNIQUE (attribute, code)
+);
+
+CREATE TABLE IF NOT EXISTS landslide_v2.tile_cells (
+    source          text             NOT NULL,
+    viewer_id       text             NOT NULL,
+    is_point        boolean          NOT NULL,
+    cx              integer          NOT NULL,
+    cy              integer          NOT NULL,
+    mx              double precision NOT NULL,
+    my              double precision NOT NULL,
+    material_code   smallint,
+    movement_code   smallint,
+    confidence_code smallint
+);
+
+CREATE INDEX IF NOT EXISTS tile_cells_cell_idx
+    ON landslide_v2.tile_cells (cx, cy)
+    INCLUDE (is_point, material_code, movement_code, confidence_code, mx, my);
+
+-- Rows replaced by refresh_tile_cells_for()
+CREATE INDEX IF NOT EXISTS tile_cells_key_idx
+    ON landslide_v2.tile_cells (source, viewer_id);
+
+
+CREATE OR REPLACE FUNCTION landslide_v2.category_key(value text)
+RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CASE k
+        WHEN 'avalance' THEN 'avalanche'
+        WHEN 'toppple'  THEN 'topple'
+        ELSE k
+    END
+    FROM (SELECT nullif(lower(btrim(value)), '') AS k) AS s;
+$$;
+
+
+-- Codes of a filter list (NULL list = no filter; unknown values match nothing)
+CREATE OR REPLACE FUNCTION landslide_v2.category_codes_for(attribute_name text, vals text[])
+RETURNS smallint[]
+LANGUAGE sql STABLE PARALLEL SAFE AS $$
+    SELECT CASE WHEN vals IS NULL THEN NULL ELSE coalesce(
+        (
+            SELECT array_agg(c.code)
+            FROM landslide_v2.category_codes c
+            WHERE c.attribute = attribute_name
+              AND c.key IN (SELECT landslide_v2.category_key(v) FROM unnest(vals) AS v)
+        ),
+        '{}'::smallint[]
+    ) END;
+$$;
+
+
+CREATE OR REPLACE FUNCTION landslide_v2.refresh_tile_cells()
+RETURNS bigint
+LANGUAGE plpgsql VOLATILE AS $$
+BEGIN
+    CREATE TEMP TABLE tile_cells_src ON COMMIT DROP AS
+    SELECT
+        f.source::text    AS source,
+        f.viewer_id::text AS viewer_id,
+        d.payload -> 'properties' AS props,
+        ST_Transform(ST_SetSRID(ST_GeomFromGeoJSON(d.payload ->> 'geometry'), 4326), 3857) AS g
+    FROM landslide_v2.lsviewer_filtered_ids(
+        NULL, NULL, NULL,
+        NULL, NULL, NULL, NULL,
+        NULL, NULL, NULL, NULL,
+        0, 0, 0, 0,
+        NULL, NULL, 0,
+        NULL
+    ) AS f
+    CROSS JOIN LATERAL (
+        SELECT landslide_v2.get_landslide_props(f.source::text, f.viewer_id::text, true)::jsonb AS payload
+    ) AS d
+    WHERE d.payload ? 'geometry';
+
+    RETURN landslide_v2.load_tile_cells();
+END $$;
+
+
+-- Incremental refresh for the landslides (source, viewer_id) just loaded,
+-- changed or deleted (ingest/ingest_inventory.py): their rows are replaced
+-- and the histograms adjusted, everything else is left as it is. The keys
+-- go to the temp table tile_cells_keys, which tells the refresh functions
+-- to delete those keys instead of truncating.
+CREATE OR REPLACE FUNCTION landslide_v2.refresh_tile_cells_for(sources text[], viewer_ids text[])
+RETURNS bigint
+LANGUAGE plpgsql VOLATILE AS $$
+BEGIN
+    CREATE TEMP TABLE tile_cells_keys ON COMMIT DROP AS
+    SELECT DISTINCT k.source, k.viewer_id
+    FROM unnest(sources, viewer_ids) AS k(source, viewer_id);
+
+    CREATE TEMP TABLE tile_cells_src ON COMMIT DROP AS
+    SELECT
+        k.source,
+        k.viewer_id,
+        d.payload -> 'properties' AS props,
+        ST_Transform(ST_SetSRID(ST_GeomFromGeoJSON(d.payload ->> 'geometry'), 4326), 3857) AS g
+    FROM tile_cells_keys k
+    CROSS JOIN LATERAL (
+        SELECT landslide_v2.get_landslide_props(k.source, k.viewer_id, true)::jsonb AS payload
+    ) AS d
+    WHERE d.payload ? 'geometry';   -- deleted landslides only lose their rows
+
+    RETURN landslide_v2.load_tile_cells();
+END $$;
+
+
+-- tile_cells (and the tables refreshed with it) from tile_cells_src: all
+-- rows, or with tile_cells_keys only those keys; only callable from the
+-- two functions above. Drops both temp tables.
+CREATE OR REPLACE FUNCTION landslide_v2.load_tile_cells()
+RETURNS bigint
+LANGUAGE plpgsql VOLATILE AS $$
+DECLARE
+    half        constant double precision := 20037508.3428;
+    cell_m      constant double precision := 40075016.6856 / 2048;   -- 2^11 cells
+    incremental constant boolean := to_regclass('pg_temp.tile_cells_keys') IS NOT NULL;
+    n           bigint;
+BEGIN
+    -- New values get the next free code; existing codes never change
+    INSERT INTO landslide_v2.category_codes (attribute, key, code)
+    SELECT a.attribute, a.key,
+           (SELECT coalesce(max(c.code), 0) FROM landslide_v2.category_codes c
+            WHERE c.attribute = a.attribute)
+           + row_number() OVER (PARTITION BY a.attribute ORDER BY a.key)
+    FROM (
+        SELECT DISTINCT v.attribute, landslide_v2.category_key(s.props ->> v.attribute) AS key
+        FROM tile_cells_src s
+        CROSS JOIN (VALUES ('material'), ('movement'), ('confidence')) AS v(attribute)
+    ) AS a
+    WHERE a.key IS NOT NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM landslide_v2.category_codes c
+          WHERE c.attribute = a.attribute AND c.key = a.key
+      );
+
+    IF incremental THEN
+        DELETE FROM landslide_v2.tile_cells c
+        USING tile_cells_keys k
+        WHERE c.source = k.source AND c.viewer_id = k.viewer_id;
+    ELSE
+        TRUNCATE landslide_v2.tile_cells;
+    END IF;
+
+    INSERT INTO landslide_v2.tile_cells (
+        source, viewer_id, is_point, cx, cy, mx, my,
+        material_code, movement_code, confidence_code
+    )
+    SELECT
+        s.source, s.viewer_id, ST_Dimension(s.g) = 0,
+        least(2047, greatest(0, floor((ST_X(p.c) + half) / cell_m)))::integer,
+        least(2047, greatest(0, floor((half - ST_Y(p.c)) / cell_m)))::integer,
+        ST_X(p.c), ST_Y(p.c),
+        cm.code, cv.code, cc.code
+    FROM tile_cells_src s
+    CROSS JOIN LATERAL (SELECT ST_Centroid(s.g) AS c) AS p
+    LEFT JOIN landslide_v2.category_codes cm
+        ON cm.attribute = 'material'   AND cm.key = landslide_v2.category_key(s.props ->> 'material')
+    LEFT JOIN landslide_v2.category_codes cv
+        ON cv.attribute = 'movement'   AND cv.key = landslide_v2.category_key(s.props ->> 'movement')
+    LEFT JOIN landslide_v2.category_codes cc
+        ON cc.attribute = 'confidence' AND cc.key = landslide_v2.category_key(s.props ->> 'confidence')
+    WHERE p.c IS NOT NULL AND NOT ST_IsEmpty(p.c)
+    ORDER BY 4, 5;   -- cell order: index and heap in the same order
+
+    GET DIAGNOSTICS n = ROW_COUNT;
+    IF NOT incremental THEN
+        ANALYZE landslide_v2.tile_cells;
+    END IF;
+
+    -- Per-landslide attributes and the slider histograms binned from them
+    -- (sql/summary_stats.sql, sql/attribute_histograms.sql); incrementally,
+    -- the keys' previous values are taken out of the histograms first
+    IF to_regclass('landslide_v2.landslide_attributes') IS NOT NULL THEN
+        IF incremental AND to_regclass('landslide_v2.attribute_histograms') IS NOT NULL THEN
+            PERFORM landslide_v2.refresh_attribute_histograms(-1);
+        END IF;
+        PERFORM landslide_v2.refresh_landslide_attributes();
+    END IF;
+    IF to_regclass('landslide_v2.attribute_histograms') IS NOT NULL THEN
+        PERFORM landslide_v2.refresh_attribute_histograms();
+    END IF;
+
+    -- ON COMMIT DROP only drops them with the transaction: another refresh
+    -- in the same one would fail to create them, and a full refresh would
+    -- find tile_cells_keys and run as an incremental one
+    DROP TABLE tile_cells_src;
+    IF incremental THEN
+        DROP TABLE pg_temp.tile_cells_keys;
+    END IF;
+    RETURN n;
+END $$;
+
+
+-- One-feature layer with the totals of a cluster tile, at the tile centre.
+-- The frontend sums these for the landslides in view without a count
+-- request (frontend/src/maplibre/viewportCount.js).
+CREATE OR REPLACE FUNCTION landslide_v2.ls_tile_summary(
+    z          integer,
+    x          integer,
+    y          integer,
+    pt_count   integer,
+    poly_count integer
+)
+RETURNS bytea
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT ST_AsMVT(s, 'ls_tile_summary', 4096, 'geom')
+    FROM (
+        SELECT ST_AsMVTGeom(ST_Centroid(e.env), e.env, 4096, 0, true) AS geom,
+               z, x, y, pt_count, poly_count
+        FROM (SELECT ST_TileEnvelope(z, x, y) AS env) AS e
+    ) AS s;
+$$;
+
+
+-- Both cluster layers of one tile from tile_cells (z <= 8), and its
+-- ls_tile_summary
+CREATE OR REPLACE FUNCTION landslide_v2.ls_cluster_coded(
+    z           integer,
+    x           integer,
+    y           integer,
+    materials   text[] DEFAULT NULL,
+    movements   text[] DEFAULT NULL,
+    confidences text[] DEFAULT NULL
+)
+RETURNS bytea
+LANGUAGE sql STABLE PARALLEL SAFE AS $$
+WITH
+tile AS (
+    SELECT ST_TileEnvelope(z, x, y) AS env,
+           11 - z AS span,    -- level-11 cells per tile side = 2^span
+           8 - z  AS shift    -- level-11 cell -> cluster cell (8 per tile side)
+),
+codes AS (
+    SELECT landslide_v2.category_codes_for('material', materials)     AS mat,
+           landslide_v2.category_codes_for('movement', movements)     AS mov,
+           landslide_v2.category_codes_for('confidence', confidences) AS conf
+),
+agg AS (
+    SELECT c.is_point,
+           count(*)::int AS n,
+           avg(c.mx) AS mx,
+           avg(c.my) AS my
+    FROM landslide_v2.tile_cells c, tile t, codes k
+    WHERE c.cx BETWEEN x << t.span AND ((x + 1) << t.span) - 1
+      AND c.cy BETWEEN y << t.span AND ((y + 1) << t.span) - 1
+      AND (k.mat  IS NULL OR c.material_code   = ANY (k.mat))
+      AND (k.mov  IS NULL OR c.movement_code   = ANY (k.mov))
+      AND (k.conf IS NULL OR c.confidence_code = ANY (k.conf))
+    GROUP BY c.is_point, c.cx >> t.shift, c.cy >> t.shift
+),
+mvt AS (
+    SELECT a.is_point, a.n,
+           ST_AsMVTGeom(ST_SetSRID(ST_MakePoint(a.mx, a.my), 3857), t.env, 4096, 32, true) AS geom
+    FROM agg a, tile t
+)
+SELECT coalesce((
+           SELECT ST_AsMVT(p, 'ls_points_cluster', 4096, 'geom')
+           FROM (SELECT geom, n AS pt_count FROM mvt WHERE is_point) AS p
+       ), ''::bytea)
+    || coalesce((
+           SELECT ST_AsMVT(p, 'ls_polygons_cluster', 4096, 'geom')
+           FROM (SELECT geom, n AS poly_count FROM mvt WHERE NOT is_point) AS p
+       ), ''::bytea)
+    || landslide_v2.ls_tile_summary(
+           z, x, y,
+           (SELECT coalesce(sum(n), 0)::int FROM agg WHERE is_point),
+           (SELECT coalesce(sum(n), 0)::int FROM agg WHERE NOT is_point)
+       );
+$$;
+
+
+-- Can ls_cluster_coded serve this request? Cluster mode, z <= 8, only
+-- categorical filters (numeric ranges keep the tile functions' semantics)
+-- and a populated tile_cells.
+CREATE OR REPLACE FUNCTION landslide_v2.tile_cells_serves(z integer, query_params json)
+RETURNS boolean
+LANGUAGE sql STABLE PARALLEL SAFE AS $$
+    SELECT z <= 8
+       AND coalesce(query_params ->> 'mode', '') = 'cluster'
+       AND NOT EXISTS (
+           SELECT 1 FROM json_object_keys(coalesce(query_params, '{}'::json)) AS k
+           WHERE k NOT IN ('mode', 'v', 'materials', 'movements', 'confidences')
+       )
+       AND EXISTS (SELECT 1 FROM landslide_v2.tile_cells);
+$$;
@@ -0,0 +1,54 @@
+-- Combined points + polygons tile source (Martin, one request per tile).
+--
+-- The viewer used to load ls_points_q and ls_polygons_q as separate sources,
+-- i.e. two tile requests (and two DB round trips) per tile position. This
+-- function returns both tiles in one response: an MVT tile is a protobuf
+-- message whose only top-level field is the repeated `layers`, so the
+-- concatenation of two tiles is one valid tile holding the layers of both.
+--
+-- Same query params as ls_points_q / ls_polygons_q (mode=cluster|raw plus the
+-- canonical filter params), forwarded unchanged, so filtering stays defined
+-- in one place. Published by Martin's auto_publish as source `ls_landslides_q`
+-- (matched by the CloudFront /ls_* tiles behavior).
+--
+-- Cluster tiles with at most categorical filters are answered from the
+-- dictionary-coded landslide_v2.tile_cells instead (sql/tile_cells.sql);
+-- those tiles also carry an ls_tile_summary layer with the tile's totals,
+-- from which the viewer shows the count in view.
+--
+-- A spatial selection is passed as `selection`, the hash of a prepared
+-- selection (sql/selection_cache.sql), never as GeoJSON. Tiles that don't
+-- touch it are answered empty from the subdivided parts' index; the others
+-- go to ls_points_q / ls_polygons_q with the hash, which test each feature
+-- with selection_intersects(hash, geom).
+
+CREATE OR REPLACE FUNCTION landslide_v2.ls_landslides_q(
+    z            integer,
+    x            integer,
+    y            integer,
+    query_params json
+)
+RETURNS bytea
+LANGUAGE plpgsql STABLE PARALLEL SAFE AS $$
+BEGIN
+    IF NOT landslide_v2.selection_intersects(
+        nullif(query_params ->> 'selection', ''), ST_TileEnvelope(z, x, y)
+    ) THEN
+        RETURN ''::bytea;
+    END IF;
+
+    IF landslide_v2.tile_cells_serves(z, query_params) THEN
+        RETURN landslide_v2.ls_cluster_coded(
+            z, x, y,
+            string_to_array(nullif(query_params ->> 'materials', ''), ','),
+            string_to_array(nullif(query_params ->> 'movements', ''), ','),
+            string_to_array(nullif(query_params ->> 'confidences', ''), ',')
+        );
+    END IF;
+
+    RETURN coalesce(landslide_v2.ls_points_q(z, x, y, query_params), ''::bytea)
+        || coalesce(landslide_v2.ls_polygons_q(z, x, y, query_params), ''::bytea);
+END $$;
+
+COMMENT ON FUNCTION landslide_v2.ls_landslides_q(integer, integer, integer, json) IS
+'{"description":"Landslide points and polygons in one tile (mode=cluster|raw, selection=<prepared selection hash>)","vector_layers":[{"id":"ls_points_cluster","fields":{"pt_count":"Number"}},{"id":"ls_polygons_cluster","fields":{"poly_count":"Number"}},{"id":"ls_tile_summary","fields":{"z":"Number","x":"Number","y":"Number","pt_count":"Number","poly_count":"Number"}},{"id":"ls_points_raw","fields":{"viewer_id":"String","source":"String"}},{"id":"ls_polygons_raw","fields":{"viewer_id":"String","source":"String"}}]}';